@@ -1,3 +1,19 @@
 from django.contrib import admin
+from .models import LoteLiquidacion, TotalLiquidacion
 
-# Register your models here.
+
+class TotalLiquidacionInline(admin.TabularInline):
+    model = TotalLiquidacion
+    extra = 0
+    can_delete = False
+    readonly_fields = ('compania_aseguradora', 'tipo_seguro', 'cantidad_pagos', 'total_comisiones')
+
+
+@admin.register(LoteLiquidacion)
+class LoteLiquidacionAdmin(admin.ModelAdmin):
+    inlines = [TotalLiquidacionInline]
+    list_display = ('pk', 'fecha_creacion', 'creado_por', 'cantidad_pagos', 'total_comisiones', 'fecha_reversion')
+    list_filter = ('fecha_reversion',)
+    readonly_fields = (
+        'fecha_creacion', 'cantidad_pagos', 'total_comisiones', 'fecha_reversion', 'revertido_por', 'fecha_estado_cuenta'
+    )
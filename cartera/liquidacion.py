@@ -0,0 +1,199 @@
+# cartera/liquidacion.py
+"""
+Liquidación de comisiones en bloque.
+
+liquidar_pagos() marca como LIQUIDADA, con un solo UPDATE, cada pago
+pendiente de un queryset de pagos de pólizas activas, y lo asocia a un
+LoteLiquidacion. Los totales del lote por compañía y tipo de seguro salen
+de una consulta agrupada y se guardan en TotalLiquidacion; el estado de
+cuenta por compañía se genera después en segundo plano
+(cartera.tasks.generar_estado_cuenta_lote). revertir_lote() devuelve los
+pagos a PENDIENTE, también con un solo UPDATE, y desmarcar_pago() saca un
+solo pago de su lote recalculando los totales.
+"""
+import csv
+import io
+import logging
+from decimal import Decimal
+from itertools import groupby
+from django.db import transaction
+from django.db.models import CharField, Count, F, Max, Min, Sum, Value
+from django.db.models.functions import Concat
+from django.template.loader import render_to_string
+from django.utils import timezone
+from .models import LoteLiquidacion, Pago, TotalLiquidacion
+from .signals import comisiones_liquidadas_en_bloque
+
+logger = logging.getLogger('cartera')
+
+
+def _pares(pagos):
+    return set(pagos.values_list('poliza__cliente_id', 'fecha_pago').distinct())
+
+
+def _guardar_totales(lote, pagos):
+    """
+    Guarda en TotalLiquidacion y en el lote los totales de `pagos` (los del
+    lote), con una consulta agrupada por compañía y tipo de seguro.
+    """
+    filas = pagos.order_by().values(
+        'poliza__compania_aseguradora_id', 'poliza__tipo_seguro_id'
+    ).annotate(cantidad=Count('pk'), total=Sum('monto_pagado'))
+    totales = TotalLiquidacion.objects.bulk_create([
+        TotalLiquidacion(
+            lote=lote,
+            compania_aseguradora_id=fila['poliza__compania_aseguradora_id'],
+            tipo_seguro_id=fila['poliza__tipo_seguro_id'],
+            cantidad_pagos=fila['cantidad'],
+            total_comisiones=fila['total'],
+        )
+        for fila in filas
+    ])
+    lote.cantidad_pagos = sum(total.cantidad_pagos for total in totales)
+    lote.total_comisiones = sum((total.total_comisiones for total in totales), Decimal('0'))
+    lote.save(update_fields=['cantidad_pagos', 'total_comisiones'])
+
+
+def liquidar_pagos(pagos, usuario=None, descripcion=''):
+    """
+    Liquida los pagos pendientes de `pagos` (pólizas activas, igual que el
+    botón por fila). Devuelve el LoteLiquidacion creado, o None si no había
+    nada pendiente.
+    """
+    with transaction.atomic():
+        lote = LoteLiquidacion.objects.create(creado_por=usuario, descripcion=descripcion[:255])
+        # El filtro exterior repite el estado para que un pago liquidado mientras
+        # tanto por otra petición no se pase a este lote
+        actualizados = Pago.objects.filter(
+            pk__in=pagos.filter(estado_comision='PENDIENTE', poliza__estado='ACTIVA').values('pk'),
+            estado_comision='PENDIENTE'
+        ).update(estado_comision='LIQUIDADA', lote_liquidacion=lote)
+
+        if not actualizados:
+            # Sin pagos no hay lote: se deshace la creación
+            transaction.set_rollback(True)
+            return None
+
+        liquidados = Pago.objects.filter(lote_liquidacion=lote)
+        _guardar_totales(lote, liquidados)
+
+        comisiones_liquidadas_en_bloque.send(sender=LoteLiquidacion, lote=lote, pares=_pares(liquidados))
+        transaction.on_commit(lambda: programar_estado_cuenta(lote.pk))
+
+    logger.info(
+        f"Lote de liquidación {lote.pk}: {lote.cantidad_pagos} pagos por ${lote.total_comisiones:.2f} "
+        f"({descripcion or 'sin filtros'})"
+    )
+    return lote
+
+
+def revertir_lote(lote, usuario=None):
+    """
+    Devuelve a PENDIENTE los pagos del lote que siguen liquidados. Los que se
+    anularon uno por uno después no se tocan. Devuelve cuántos pagos revirtió.
+    """
+    with transaction.atomic():
+        lote = LoteLiquidacion.objects.select_for_update().get(pk=lote.pk)
+        if lote.revertido:
+            return 0
+
+        pagos = Pago.objects.filter(lote_liquidacion=lote, estado_comision='LIQUIDADA')
+        pares = _pares(pagos)
+        revertidos = pagos.update(estado_comision='PENDIENTE')
+
+        lote.fecha_reversion = timezone.now()
+        lote.revertido_por = usuario
+        lote.save(update_fields=['fecha_reversion', 'revertido_por'])
+
+        comisiones_liquidadas_en_bloque.send(sender=LoteLiquidacion, lote=lote, pares=pares)
+        # El estado de cuenta se regenera para que indique la reversión
+        transaction.on_commit(lambda: programar_estado_cuenta(lote.pk))
+
+    logger.info(f"Lote de liquidación {lote.pk} revertido: {revertidos} pagos vuelven a pendiente")
+    return revertidos
+
+
+def desmarcar_pago(pago):
+    """
+    Devuelve a PENDIENTE un pago liquidado y lo saca de su lote. Los totales
+    del lote se recalculan en la misma transacción y su estado de cuenta se
+    regenera, para que el pago deje de aparecer en ellos.
+    """
+    with transaction.atomic():
+        lote = None
+        if pago.lote_liquidacion_id:
+            # Bloquea el lote antes que el pago, en el mismo orden que revertir_lote
+            lote = LoteLiquidacion.objects.select_for_update().get(pk=pago.lote_liquidacion_id)
+        pago.estado_comision = 'PENDIENTE'
+        pago.lote_liquidacion = None
+        pago.save(update_fields=['estado_comision', 'lote_liquidacion'])
+
+        if lote is not None and not lote.revertido:
+            lote.totales.all().delete()
+            _guardar_totales(lote, Pago.objects.filter(lote_liquidacion=lote, estado_comision='LIQUIDADA'))
+            transaction.on_commit(lambda: programar_estado_cuenta(lote.pk))
+            logger.info(f"Pago {pago.pk} desmarcado: sale del lote de liquidación {lote.pk}")
+
+
+def programar_estado_cuenta(lote_id):
+    from .tasks import generar_estado_cuenta_lote
+
+    try:
+        generar_estado_cuenta_lote.delay(lote_id)
+    except Exception as e:
+        logger.warning(
+            f"No se pudo programar el estado de cuenta del lote {lote_id}: {e}. "
+            f"Se puede generar desde la página de liquidaciones."
+        )
+
+
+def construir_estado_cuenta(lote):
+    """
+    Estado de cuenta del lote para conciliar con cada compañía: una línea
+    por póliza (agrupada en una sola consulta) con sus pagos y comisión, y
+    subtotales por compañía. Devuelve (texto CSV, texto HTML).
+    """
+    filas = list(
+        Pago.objects.filter(lote_liquidacion=lote).values(
+            compania=F('poliza__compania_aseguradora__nombre'),
+            tipo_seguro=F('poliza__tipo_seguro__nombre'),
+            numero_poliza=F('poliza__numero_poliza'),
+            cliente=Concat(
+                F('poliza__cliente__first_name'), Value(' '), F('poliza__cliente__last_name'),
+                output_field=CharField()
+            ),
+        ).annotate(
+            cantidad=Count('pk'),
+            total=Sum('monto_pagado'),
+            desde=Min('fecha_pago'),
+            hasta=Max('fecha_pago'),
+        ).order_by('compania', 'tipo_seguro', 'numero_poliza')
+    )
+
+    companias = []
+    for nombre, grupo in groupby(filas, key=lambda fila: fila['compania']):
+        grupo = list(grupo)
+        companias.append({
+            'nombre': nombre,
+            'filas': grupo,
+            'cantidad': sum(fila['cantidad'] for fila in grupo),
+            'total': sum((fila['total'] for fila in grupo), Decimal('0')),
+        })
+
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(['Compañía', 'Tipo de Seguro', 'Póliza', 'Cliente', 'Pagos', 'Desde', 'Hasta', 'Comisión'])
+    for compania in companias:
+        for fila in compania['filas']:
+            escritor.writerow([
+                fila['compania'], fila['tipo_seguro'], fila['numero_poliza'], fila['cliente'].strip(),
+                fila['cantidad'], fila['desde'], fila['hasta'], fila['total'],
+            ])
+        escritor.writerow([f"Subtotal {compania['nombre']}", '', '', '', compania['cantidad'], '', '', compania['total']])
+    escritor.writerow([
+        'Total', '', '', '', sum(c['cantidad'] for c in companias), '', '',
+        sum((c['total'] for c in companias), Decimal('0')),
+    ])
+
+    html = render_to_string('liquidaciones/estado_cuenta_lote.html', {'lote': lote, 'companias': companias})
+    return salida.getvalue(), html
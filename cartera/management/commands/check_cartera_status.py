@@ -1,15 +1,41 @@
-from django.core.management.base import BaseCommand
+import time
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
 from polizas.models import Poliza
 from cartera.models import Cuota
-from django.db.models import Q
+from reportes.cache import invalidar_cartera
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
 
 class Command(BaseCommand):
     help = 'Revisa y actualiza el estado de cartera de todas las pólizas de pago mensual.'
 
-    def handle(self, *args, **kwargs):
-        hoy = timezone.now().date()
-        self.stdout.write(f"--- Iniciando revisión completa de cartera al {hoy} ---")
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--set-based',
+            action='store_true',
+            help='Actualiza toda la cartera con unas pocas sentencias UPDATE en lugar de recorrer póliza por póliza.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo calcula y muestra los cambios, sin guardar nada en la base de datos.'
+        )
+        parser.add_argument(
+            '--as-of',
+            dest='as_of',
+            help='Fecha de corte en formato AAAA-MM-DD (por defecto, hoy).'
+        )
+
+    def handle(self, *args, **options):
+        hoy = self._fecha_de_corte(options.get('as_of'))
+        self.dry_run = options.get('dry_run', False)
+
+        modo = 'por conjuntos' if options.get('set_based') else 'póliza por póliza'
+        self.stdout.write(f"--- Iniciando revisión completa de cartera al {hoy} ({modo}) ---")
+        if self.dry_run:
+            self.stdout.write(self.style.WARNING("Modo simulación (--dry-run): no se guardará ningún cambio."))
 
         polizas_a_revisar = Poliza.objects.filter(
             modo_pago='MENSUAL',
@@ -20,16 +46,54 @@ class Command(BaseCommand):
             self.stdout.write(self.style.SUCCESS("No hay pólizas de pago mensual activas para revisar."))
             return
 
+        inicio = time.perf_counter()
+        if options.get('set_based'):
+            resultado = self._revision_por_conjuntos(polizas_a_revisar, hoy)
+        else:
+            resultado = self._revision_iterativa(polizas_a_revisar, hoy)
+        cuotas_a_mora, polizas_actualizadas_a_mora, polizas_actualizadas_al_dia = resultado
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Revisión completada. Cuotas marcadas 'En Mora': {cuotas_a_mora}. "
+            f"Pólizas actualizadas a 'En Mora': {polizas_actualizadas_a_mora}. "
+            f"Pólizas actualizadas a 'Al día': {polizas_actualizadas_al_dia}."
+        ))
+        self.stdout.write(f"Tiempo total: {time.perf_counter() - inicio:.3f}s")
+
+    def _fecha_de_corte(self, valor):
+        """Interpreta el argumento --as-of; si no viene, usa la fecha actual."""
+        if not valor:
+            return timezone.now().date()
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f"Fecha inválida para --as-of: '{valor}'. Usa el formato AAAA-MM-DD.")
+
+    def _paso(self, descripcion, funcion):
+        """Ejecuta un paso de la revisión y muestra cuánto tardó."""
+        inicio = time.perf_counter()
+        resultado = funcion()
+        self.stdout.write(f"  [{time.perf_counter() - inicio:.3f}s] {descripcion}: {resultado}")
+        return resultado
+
+    def _revision_iterativa(self, polizas_a_revisar, hoy):
+        """Recorre las pólizas una por una (comportamiento original)."""
+        cuotas_a_mora = 0
         polizas_actualizadas_a_mora = 0
         polizas_actualizadas_al_dia = 0
 
         for poliza in polizas_a_revisar:
             # 1. Primero, actualizamos todas las cuotas PENDIENTES que ya se vencieron a EN_MORA.
-            cuotas_actualizadas = Cuota.objects.filter(
+            cuotas_vencidas = Cuota.objects.filter(
                 poliza=poliza,
                 estado='PENDIENTE',
                 fecha_vencimiento__lt=hoy
-            ).update(estado='EN_MORA')
+            )
+            if self.dry_run:
+                cuotas_actualizadas = cuotas_vencidas.count()
+            else:
+                cuotas_actualizadas = cuotas_vencidas.update(estado='EN_MORA')
+            cuotas_a_mora += cuotas_actualizadas
 
             if cuotas_actualizadas > 0:
                 self.stdout.write(self.style.WARNING(
@@ -37,22 +101,65 @@ class Command(BaseCommand):
                 ))
 
             # 2. Ahora, revisamos si la póliza tiene ALGUNA cuota en mora.
-            tiene_cuotas_en_mora = poliza.cuotas.filter(estado='EN_MORA').exists()
+            # (En simulación, las cuotas vencidas del paso 1 cuentan como si ya estuvieran en mora.)
+            tiene_cuotas_en_mora = poliza.cuotas.filter(
+                Q(estado='EN_MORA') | Q(estado='PENDIENTE', fecha_vencimiento__lt=hoy)
+            ).exists()
 
             if tiene_cuotas_en_mora:
                 # Si hay al menos una cuota en mora, la póliza completa está en mora.
                 if poliza.estado_cartera != 'EN_MORA':
                     poliza.estado_cartera = 'EN_MORA'
-                    poliza.save()
+                    if not self.dry_run:
+                        poliza.save(update_fields=['estado_cartera'])
                     polizas_actualizadas_a_mora += 1
             else:
                 # Si no hay ninguna cuota en mora, la póliza está al día.
                 if poliza.estado_cartera != 'AL_DIA':
                     poliza.estado_cartera = 'AL_DIA'
-                    poliza.save()
+                    if not self.dry_run:
+                        poliza.save(update_fields=['estado_cartera'])
                     polizas_actualizadas_al_dia += 1
 
-        self.stdout.write(self.style.SUCCESS(
-            f"Revisión completada. Pólizas actualizadas a 'En Mora': {polizas_actualizadas_a_mora}. "
-            f"Pólizas actualizadas a 'Al día': {polizas_actualizadas_al_dia}."
-        ))
\ No newline at end of file
+        return cuotas_a_mora, polizas_actualizadas_a_mora, polizas_actualizadas_al_dia
+
+    def _revision_por_conjuntos(self, polizas_a_revisar, hoy):
+        """
+        Hace el mismo trabajo que la revisión iterativa con una sentencia por paso:
+        un UPDATE para las cuotas vencidas y un UPDATE por cada estado de cartera,
+        ambos guiados por una subconsulta EXISTS sobre las cuotas en mora.
+        """
+        cuotas_vencidas = Cuota.objects.filter(
+            poliza__in=polizas_a_revisar,
+            estado='PENDIENTE',
+            fecha_vencimiento__lt=hoy
+        )
+
+        # Una cuota vencida y aún pendiente cuenta como mora: así el mismo filtro
+        # sirve antes y después del paso 1 (y por tanto también en --dry-run).
+        cuotas_en_mora = Cuota.objects.filter(
+            Q(estado='EN_MORA') | Q(estado='PENDIENTE', fecha_vencimiento__lt=hoy),
+            poliza=OuterRef('pk')
+        )
+        polizas_con_mora = polizas_a_revisar.filter(Exists(cuotas_en_mora))
+        polizas_sin_mora = polizas_a_revisar.filter(~Exists(cuotas_en_mora))
+
+        pasos = [
+            ("Cuotas vencidas marcadas 'En Mora'", cuotas_vencidas, {'estado': 'EN_MORA'}),
+            ("Pólizas actualizadas a 'En Mora'", polizas_con_mora.exclude(estado_cartera='EN_MORA'), {'estado_cartera': 'EN_MORA'}),
+            ("Pólizas actualizadas a 'Al día'", polizas_sin_mora.exclude(estado_cartera='AL_DIA'), {'estado_cartera': 'AL_DIA'}),
+        ]
+
+        resultados = []
+        with transaction.atomic():
+            for descripcion, queryset, cambios in pasos:
+                if self.dry_run:
+                    resultados.append(self._paso(descripcion, queryset.count))
+                else:
+                    resultados.append(self._paso(descripcion, lambda: queryset.update(**cambios)))
+
+        # Los UPDATE masivos no disparan señales: invalidamos a mano los reportes de cartera
+        if not self.dry_run and any(resultados):
+            invalidar_cartera()
+
+        return tuple(resultados)
@@ -1,6 +1,7 @@
 # cartera/models.py
+from django.contrib.auth.models import User
 from django.db import models
-from polizas.models import Poliza
+from polizas.models import CompaniaAseguradora, Poliza, TipoSeguro
 
 class Cuota(models.Model):
     ESTADO_CUOTA_CHOICES = [
@@ -17,10 +18,72 @@ class Cuota(models.Model):
     class Meta:
         unique_together = ('poliza', 'numero_cuota') # No puede haber dos "cuota 1" para la misma póliza
         ordering = ['numero_cuota']
+        indexes = [
+            # Sirve a la detección de mora: estado='PENDIENTE' y rango de fecha_vencimiento
+            models.Index(fields=['estado', 'fecha_vencimiento'], name='cuota_estado_venc_idx'),
+        ]
 
     def __str__(self):
         return f"Cuota {self.numero_cuota} de {self.poliza.numero_poliza}"
 
+class LoteLiquidacion(models.Model):
+    """
+    Liquidación de comisiones hecha en bloque desde el dashboard: todos los
+    pagos pendientes de un filtro (o de una selección) en un solo UPDATE.
+    Guarda los totales de ese momento y se puede revertir completo.
+    """
+    creado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    descripcion = models.CharField(max_length=255, blank=True, help_text="Filtros o selección con que se liquidó.")
+    cantidad_pagos = models.PositiveIntegerField(default=0)
+    total_comisiones = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    fecha_reversion = models.DateTimeField(null=True, blank=True)
+    revertido_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    # Estado de cuenta por compañía, generado en segundo plano por generar_estado_cuenta_lote
+    estado_cuenta_csv = models.FileField(upload_to='liquidaciones/estados_cuenta/', blank=True, null=True)
+    estado_cuenta_html = models.FileField(upload_to='liquidaciones/estados_cuenta/', blank=True, null=True)
+    fecha_estado_cuenta = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Lote de Liquidación"
+        verbose_name_plural = "Lotes de Liquidación"
+        ordering = ['-fecha_creacion']
+
+    def __str__(self):
+        return f"Lote {self.pk}: {self.cantidad_pagos} pagos por {self.total_comisiones}"
+
+    @property
+    def revertido(self):
+        return self.fecha_reversion is not None
+
+
+class TotalLiquidacion(models.Model):
+    """
+    Totales de un lote por compañía y tipo de seguro, calculados al liquidar
+    con una consulta agrupada. La página de liquidaciones y los estados de
+    cuenta los leen de aquí en vez de volver a sumar los pagos.
+    """
+    lote = models.ForeignKey(LoteLiquidacion, on_delete=models.CASCADE, related_name='totales')
+    compania_aseguradora = models.ForeignKey(CompaniaAseguradora, on_delete=models.CASCADE, related_name='+')
+    tipo_seguro = models.ForeignKey(TipoSeguro, on_delete=models.CASCADE, related_name='+')
+    cantidad_pagos = models.PositiveIntegerField(default=0)
+    total_comisiones = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Total de Liquidación"
+        verbose_name_plural = "Totales de Liquidación"
+        ordering = ['compania_aseguradora__nombre', 'tipo_seguro__nombre']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['lote', 'compania_aseguradora', 'tipo_seguro'], name='total_liquidacion_unico'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Lote {self.lote_id} - {self.compania_aseguradora} / {self.tipo_seguro}: {self.total_comisiones}"
+
+
 class Pago(models.Model):
 
     ESTADO_COMISION_CHOICES = [
@@ -41,9 +104,38 @@ class Pago(models.Model):
         choices=ESTADO_COMISION_CHOICES,
         default='PENDIENTE'
     )
+    # Porcentaje de comisión con el que se generó este registro (el de la póliza)
+    comision_porcentaje = models.DecimalField('Porcentaje de Comisión (%)', max_digits=5, decimal_places=2, null=True, blank=True)
+    # Lote con el que se liquidó en bloque; se conserva aunque el lote se revierta
+    lote_liquidacion = models.ForeignKey(
+        LoteLiquidacion, on_delete=models.SET_NULL, null=True, blank=True, related_name='pagos'
+    )
 
     class Meta:
         ordering = ['-fecha_pago']
+        indexes = [
+            # KPIs de liquidaciones: rango de fecha_pago del mes, separado por estado
+            models.Index(fields=['fecha_pago', 'estado_comision'], name='pago_fecha_estado_idx'),
+            # Paginación por cursor de liquidaciones: ORDER BY fecha_pago DESC, id DESC
+            models.Index(fields=['-fecha_pago', '-id'], name='pago_fecha_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"Pago de {self.monto_pagado} para {self.poliza.numero_poliza} el {self.fecha_pago}"
+
+
+class MarcaProcesoCartera(models.Model):
+    """
+    Guarda hasta qué fecha se procesó un trabajo incremental de cartera
+    (high-water mark), para que la siguiente ejecución solo revise lo nuevo.
+    """
+    proceso = models.CharField(max_length=50, unique=True)
+    fecha_corte = models.DateField(help_text="Las cuotas con vencimiento anterior a esta fecha ya fueron procesadas.")
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Marca de Proceso de Cartera"
+        verbose_name_plural = "Marcas de Procesos de Cartera"
 
     def __str__(self):
-        return f"Pago de {self.monto_pagado} para {self.poliza.numero_poliza} el {self.fecha_pago}"
\ No newline at end of file
+        return f"{self.proceso} (hasta {self.fecha_corte})"
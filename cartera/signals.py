@@ -0,0 +1,7 @@
+# cartera/signals.py
+from django.dispatch import Signal
+
+# La liquidación en bloque (y su reversión) cambia estado_comision con un
+# UPDATE, que no dispara post_save. Se envía con pares=[(cliente_id, fecha_pago)]
+# de los pagos afectados para que las demás apps (resumen mensual) se pongan al día.
+comisiones_liquidadas_en_bloque = Signal()
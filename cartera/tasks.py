@@ -0,0 +1,95 @@
+import logging
+from celery import shared_task
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from polizas.models import Poliza
+from reportes.cache import invalidar_cartera
+from .liquidacion import construir_estado_cuenta
+from .models import Cuota, LoteLiquidacion, MarcaProcesoCartera
+
+logger = logging.getLogger('cartera')
+
+PROCESO_DETECCION_MORA = 'deteccion_mora'
+
+
+@shared_task
+def detectar_mora_incremental(completo=False):
+    """
+    Tarea de Celery que marca como EN_MORA las cuotas que vencieron desde la
+    última ejecución y pone en mora solo las pólizas afectadas.
+
+    Guarda la fecha de corte en MarcaProcesoCartera: la siguiente ejecución
+    solo revisa cuotas con fecha_vencimiento entre esa marca y hoy, usando el
+    índice (estado, fecha_vencimiento). Así el costo depende de cuántas cuotas
+    vencieron ese día y no del tamaño de la cartera.
+
+    Con completo=True (o en la primera ejecución) revisa todas las cuotas
+    vencidas; sirve para conciliar cuotas que volvieron a PENDIENTE con fecha
+    ya pasada, por ejemplo al revertir un pago.
+    """
+    hoy = timezone.now().date()
+
+    with transaction.atomic():
+        marca, creada = MarcaProcesoCartera.objects.select_for_update().get_or_create(
+            proceso=PROCESO_DETECCION_MORA,
+            defaults={'fecha_corte': hoy}
+        )
+
+        cuotas_vencidas = Cuota.objects.filter(
+            estado='PENDIENTE',
+            fecha_vencimiento__lt=hoy,
+            poliza__modo_pago='MENSUAL',
+            poliza__estado='ACTIVA'
+        )
+        if not (creada or completo):
+            cuotas_vencidas = cuotas_vencidas.filter(fecha_vencimiento__gte=marca.fecha_corte)
+
+        polizas_afectadas = set(cuotas_vencidas.values_list('poliza_id', flat=True))
+        cuotas_a_mora = cuotas_vencidas.update(estado='EN_MORA')
+
+        polizas_a_mora = 0
+        if polizas_afectadas:
+            polizas_a_mora = Poliza.objects.filter(
+                pk__in=polizas_afectadas
+            ).exclude(estado_cartera='EN_MORA').update(estado_cartera='EN_MORA')
+
+        marca.fecha_corte = hoy
+        marca.save()
+
+    # Los UPDATE masivos no disparan señales: invalidamos a mano los reportes de cartera
+    if cuotas_a_mora or polizas_a_mora:
+        invalidar_cartera()
+
+    resultado = (
+        f"Detección de mora completada al {hoy}. Cuotas marcadas en mora: {cuotas_a_mora}. "
+        f"Pólizas afectadas: {len(polizas_afectadas)}. Pólizas pasadas a 'En Mora': {polizas_a_mora}."
+    )
+    logger.info(resultado)
+    return resultado
+
+
+@shared_task
+def generar_estado_cuenta_lote(lote_id):
+    """
+    Genera y guarda los estados de cuenta (CSV y HTML) de un lote de
+    liquidación. Se puede volver a ejecutar: reemplaza los archivos anteriores.
+    """
+    lote = LoteLiquidacion.objects.filter(pk=lote_id).first()
+    if lote is None:
+        return f"El lote de liquidación {lote_id} no existe."
+
+    texto_csv, html = construir_estado_cuenta(lote)
+    nombre = f'lote_{lote.pk}_{lote.fecha_creacion:%Y%m%d}'
+    for campo in (lote.estado_cuenta_csv, lote.estado_cuenta_html):
+        if campo:
+            campo.delete(save=False)
+    # BOM para que Excel abra el CSV como UTF-8
+    lote.estado_cuenta_csv.save(f'{nombre}.csv', ContentFile(texto_csv.encode('utf-8-sig')), save=False)
+    lote.estado_cuenta_html.save(f'{nombre}.html', ContentFile(html.encode('utf-8')), save=False)
+    lote.fecha_estado_cuenta = timezone.now()
+    lote.save(update_fields=['estado_cuenta_csv', 'estado_cuenta_html', 'fecha_estado_cuenta'])
+
+    resultado = f"Estado de cuenta del lote {lote.pk} generado: {lote.cantidad_pagos} pagos."
+    logger.info(resultado)
+    return resultado
@@ -9,7 +9,10 @@ def calcular_comision(pago):
     Recibe un objeto 'pago' y devuelve el valor de la comisión.
     """
     try:
-        comision = pago.monto_pagado * (pago.poliza.tipo_seguro.comision_porcentaje / 100)
+        porcentaje = pago.comision_porcentaje
+        if porcentaje is None:
+            porcentaje = pago.poliza.tarifa_comision
+        comision = pago.monto_pagado * (porcentaje / 100)
         return comision
     except (TypeError, AttributeError):
         # En caso de que falte algún dato, devuelve 0
@@ -1,10 +1,19 @@
 # cartera/tests.py
+import shutil
+import tempfile
 from decimal import Decimal
 from datetime import date, timedelta
-from django.test import TestCase
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from unittest.mock import patch
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
 from polizas.models import TipoSeguro, CompaniaAseguradora, Poliza
-from .models import Cuota, Pago
+from reportes.models import ResumenMensual
+from .liquidacion import desmarcar_pago, liquidar_pagos, revertir_lote
+from .models import Cuota, LoteLiquidacion, MarcaProcesoCartera, Pago, TotalLiquidacion
+from .tasks import PROCESO_DETECCION_MORA, detectar_mora_incremental, generar_estado_cuenta_lote
 
 
 class CuotaModelTest(TestCase):
@@ -379,3 +388,375 @@ class CuotaPagoIntegrationTest(TestCase):
         # Verificar total
         # Prima: 1,000,000, Comisión total: 1,000,000 * 10% = 100,000
         self.assertEqual(total_comisiones, Decimal('100000.00'))
+
+
+class CheckCarteraStatusCommandTest(TestCase):
+    """Tests para el comando check_cartera_status en sus dos modos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user(
+            username='cliente_comando',
+            email='comando@test.com',
+            password='testpass123'
+        )
+
+        cls.tipo_seguro = TipoSeguro.objects.create(
+            nombre='Seguro Comando',
+            comision_porcentaje=Decimal('10.00'),
+            porcentaje_iva=Decimal('19.00')
+        )
+
+        cls.compania = CompaniaAseguradora.objects.create(
+            nombre='Compañía Comando'
+        )
+
+    def setUp(self):
+        hoy = date.today()
+        # Póliza con cuotas ya vencidas: debe pasar a EN_MORA
+        self.poliza_vencida = self.crear_poliza('POL-CMD-001', hoy - timedelta(days=100))
+        # Póliza nueva marcada en mora por error: debe volver a AL_DIA
+        self.poliza_al_dia = self.crear_poliza('POL-CMD-002', hoy, estado_cartera='EN_MORA')
+        # Póliza con una cuota ya en mora: no cambia
+        self.poliza_en_mora = self.crear_poliza('POL-CMD-003', hoy, estado_cartera='EN_MORA')
+        self.poliza_en_mora.cuotas.filter(numero_cuota=1).update(estado='EN_MORA')
+
+    def crear_poliza(self, numero_poliza, fecha_inicio, **kwargs):
+        return Poliza.objects.create(
+            cliente=self.cliente,
+            tipo_seguro=self.tipo_seguro,
+            compania_aseguradora=self.compania,
+            numero_poliza=numero_poliza,
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_inicio + timedelta(days=365),
+            valor_prima_sin_iva=Decimal('1200000.00'),
+            modo_pago='MENSUAL',
+            plazo_meses=12,
+            **kwargs
+        )
+
+    def ejecutar(self, *args):
+        salida = StringIO()
+        call_command('check_cartera_status', *args, stdout=salida)
+        return salida.getvalue()
+
+    def verificar_resultado_final(self):
+        estados = dict(Poliza.objects.values_list('numero_poliza', 'estado_cartera'))
+        self.assertEqual(estados['POL-CMD-001'], 'EN_MORA')
+        self.assertEqual(estados['POL-CMD-002'], 'AL_DIA')
+        self.assertEqual(estados['POL-CMD-003'], 'EN_MORA')
+        # Cuotas con vencimiento a 1, 2 y 3 meses desde el inicio (hace 100 días)
+        self.assertEqual(self.poliza_vencida.cuotas.filter(estado='EN_MORA').count(), 3)
+
+    def test_modo_iterativo(self):
+        """Verifica el recorrido póliza por póliza."""
+        salida = self.ejecutar()
+        self.assertIn("Cuotas marcadas 'En Mora': 3", salida)
+        self.assertIn("Pólizas actualizadas a 'En Mora': 1", salida)
+        self.assertIn("Pólizas actualizadas a 'Al día': 1", salida)
+        self.verificar_resultado_final()
+
+    def test_modo_por_conjuntos_mismos_conteos(self):
+        """Verifica que --set-based produce los mismos conteos que el recorrido iterativo."""
+        salida = self.ejecutar('--set-based')
+        self.assertIn("Cuotas marcadas 'En Mora': 3", salida)
+        self.assertIn("Pólizas actualizadas a 'En Mora': 1", salida)
+        self.assertIn("Pólizas actualizadas a 'Al día': 1", salida)
+        self.verificar_resultado_final()
+
+    def test_modo_por_conjuntos_pocas_consultas(self):
+        """Verifica que el número de consultas no depende del número de pólizas."""
+        for i in range(5):
+            self.crear_poliza(f'POL-CMD-EXTRA-{i}', date.today() - timedelta(days=100))
+        # exists() + transacción (savepoint) + 3 UPDATE
+        with self.assertNumQueries(6):
+            self.ejecutar('--set-based')
+
+    def test_dry_run_no_modifica(self):
+        """Verifica que --dry-run reporta los cambios sin guardarlos."""
+        for args in (['--dry-run'], ['--set-based', '--dry-run']):
+            salida = self.ejecutar(*args)
+            self.assertIn("Cuotas marcadas 'En Mora': 3", salida)
+            self.assertIn("Pólizas actualizadas a 'En Mora': 1", salida)
+            self.assertIn("Pólizas actualizadas a 'Al día': 1", salida)
+
+        self.assertFalse(Cuota.objects.filter(poliza=self.poliza_vencida, estado='EN_MORA').exists())
+        self.poliza_al_dia.refresh_from_db()
+        self.assertEqual(self.poliza_al_dia.estado_cartera, 'EN_MORA')
+
+    def test_as_of(self):
+        """Verifica que --as-of usa la fecha de corte indicada."""
+        fecha_corte = (date.today() - timedelta(days=50)).isoformat()
+        salida = self.ejecutar('--set-based', '--as-of', fecha_corte)
+        # A esa fecha solo había vencido la primera cuota
+        self.assertIn("Cuotas marcadas 'En Mora': 1", salida)
+
+    def test_as_of_invalido(self):
+        """Verifica que una fecha mal formada produce un error claro."""
+        with self.assertRaises(CommandError):
+            self.ejecutar('--as-of', '31/12/2024')
+
+
+class DetectarMoraIncrementalTaskTest(TestCase):
+    """Tests para la tarea detectar_mora_incremental."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user(
+            username='cliente_mora',
+            email='mora@test.com',
+            password='testpass123'
+        )
+
+        cls.tipo_seguro = TipoSeguro.objects.create(
+            nombre='Seguro Mora',
+            comision_porcentaje=Decimal('10.00'),
+            porcentaje_iva=Decimal('19.00')
+        )
+
+        cls.compania = CompaniaAseguradora.objects.create(
+            nombre='Compañía Mora'
+        )
+
+    def setUp(self):
+        self.poliza = Poliza.objects.create(
+            cliente=self.cliente,
+            tipo_seguro=self.tipo_seguro,
+            compania_aseguradora=self.compania,
+            numero_poliza='POL-MORA-001',
+            fecha_inicio=date.today() - timedelta(days=100),
+            fecha_fin=date.today() + timedelta(days=265),
+            valor_prima_sin_iva=Decimal('1200000.00'),
+            modo_pago='MENSUAL',
+            plazo_meses=12
+        )
+
+    def test_primera_ejecucion_revisa_todo(self):
+        """Verifica que sin marca previa se revisan todas las cuotas vencidas."""
+        detectar_mora_incremental()
+
+        self.assertEqual(self.poliza.cuotas.filter(estado='EN_MORA').count(), 3)
+        self.poliza.refresh_from_db()
+        self.assertEqual(self.poliza.estado_cartera, 'EN_MORA')
+        marca = MarcaProcesoCartera.objects.get(proceso=PROCESO_DETECCION_MORA)
+        self.assertEqual(marca.fecha_corte, date.today())
+
+    def test_solo_revisa_cuotas_desde_la_marca(self):
+        """Verifica que solo se procesan cuotas vencidas desde la última ejecución."""
+        MarcaProcesoCartera.objects.create(
+            proceso=PROCESO_DETECCION_MORA,
+            fecha_corte=date.today() - timedelta(days=20)
+        )
+
+        detectar_mora_incremental()
+
+        # Solo la tercera cuota (hace ~9 días) cae dentro de la ventana
+        self.assertEqual(
+            list(self.poliza.cuotas.filter(estado='EN_MORA').values_list('numero_cuota', flat=True)),
+            [3]
+        )
+        self.poliza.refresh_from_db()
+        self.assertEqual(self.poliza.estado_cartera, 'EN_MORA')
+
+    def test_completo_ignora_la_marca(self):
+        """Verifica que completo=True revisa todas las cuotas vencidas."""
+        MarcaProcesoCartera.objects.create(
+            proceso=PROCESO_DETECCION_MORA,
+            fecha_corte=date.today()
+        )
+
+        detectar_mora_incremental(completo=True)
+
+        self.assertEqual(self.poliza.cuotas.filter(estado='EN_MORA').count(), 3)
+
+    def test_no_toca_polizas_sin_cuotas_nuevas(self):
+        """Verifica que una póliza sin cuotas vencidas en la ventana no cambia."""
+        MarcaProcesoCartera.objects.create(
+            proceso=PROCESO_DETECCION_MORA,
+            fecha_corte=date.today()
+        )
+
+        detectar_mora_incremental()
+
+        self.assertFalse(self.poliza.cuotas.filter(estado='EN_MORA').exists())
+        self.poliza.refresh_from_db()
+        self.assertEqual(self.poliza.estado_cartera, 'AL_DIA')
+
+
+class LiquidacionEnBloqueTest(TestCase):
+    """Tests para la liquidación de comisiones en bloque y su reversión."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user(username='admin_lote', is_staff=True)
+        cls.cliente = User.objects.create_user(username='cliente_lote')
+        tipo = TipoSeguro.objects.create(
+            nombre='Seguro Lote', comision_porcentaje=Decimal('10.00'), porcentaje_iva=Decimal('19.00')
+        )
+        compania = CompaniaAseguradora.objects.create(nombre='Compañía Lote')
+        cls.activa = Poliza.objects.create(
+            cliente=cls.cliente, tipo_seguro=tipo, compania_aseguradora=compania,
+            numero_poliza='LOTE-001', fecha_inicio=date(2025, 1, 1), fecha_fin=date(2026, 1, 1),
+            valor_prima_sin_iva=Decimal('1000000.00'), modo_pago='MENSUAL', plazo_meses=12
+        )
+        cls.cancelada = Poliza.objects.create(
+            cliente=cls.cliente, tipo_seguro=tipo, compania_aseguradora=compania,
+            numero_poliza='LOTE-002', fecha_inicio=date(2025, 1, 1), fecha_fin=date(2026, 1, 1),
+            valor_prima_sin_iva=Decimal('1000000.00'), modo_pago='MENSUAL', plazo_meses=12,
+            estado='CANCELADA'
+        )
+
+    def setUp(self):
+        self.pendientes = [
+            Pago.objects.create(poliza=self.activa, fecha_pago=date(2025, 3, dia), monto_pagado=Decimal('5000.00'))
+            for dia in (1, 2, 3)
+        ]
+        self.ya_liquidado = Pago.objects.create(
+            poliza=self.activa, fecha_pago=date(2025, 3, 4), monto_pagado=Decimal('7000.00'), estado_comision='LIQUIDADA'
+        )
+        self.de_cancelada = Pago.objects.create(
+            poliza=self.cancelada, fecha_pago=date(2025, 3, 5), monto_pagado=Decimal('9000.00')
+        )
+
+    def test_liquida_solo_pendientes_de_polizas_activas_en_un_update(self):
+        """Verifica que el lote toma los pendientes de pólizas activas y guarda sus totales."""
+        with self.assertNumQueries(8):
+            lote = liquidar_pagos(Pago.objects.all(), usuario=self.usuario, descripcion='Marzo')
+
+        self.assertEqual(lote.cantidad_pagos, 3)
+        self.assertEqual(lote.total_comisiones, Decimal('15000.00'))
+        self.assertEqual(
+            set(lote.pagos.values_list('pk', flat=True)), {pago.pk for pago in self.pendientes}
+        )
+        self.assertFalse(Pago.objects.filter(pk__in=[p.pk for p in self.pendientes], estado_comision='PENDIENTE').exists())
+        self.de_cancelada.refresh_from_db()
+        self.assertEqual(self.de_cancelada.estado_comision, 'PENDIENTE')
+
+    def test_sin_pendientes_no_crea_lote(self):
+        """Verifica que un filtro sin pagos pendientes no deja un lote vacío."""
+        self.assertIsNone(liquidar_pagos(Pago.objects.filter(pk=self.ya_liquidado.pk)))
+        self.assertFalse(LoteLiquidacion.objects.exists())
+
+    def test_revertir_devuelve_el_lote_a_pendiente(self):
+        """Verifica que revertir solo afecta a los pagos del lote y no se aplica dos veces."""
+        lote = liquidar_pagos(Pago.objects.all(), usuario=self.usuario)
+
+        self.assertEqual(revertir_lote(lote, usuario=self.usuario), 3)
+        lote.refresh_from_db()
+        self.assertTrue(lote.revertido)
+        self.assertEqual(lote.revertido_por, self.usuario)
+        self.assertEqual(Pago.objects.filter(estado_comision='PENDIENTE').count(), 4)
+        self.ya_liquidado.refresh_from_db()
+        self.assertEqual(self.ya_liquidado.estado_comision, 'LIQUIDADA')
+
+        self.assertEqual(revertir_lote(lote), 0)
+
+    def test_desmarcar_un_pago_recalcula_los_totales_del_lote(self):
+        """Verifica que desmarcar un pago lo saca del lote y descuenta su comisión de los totales."""
+        lote = liquidar_pagos(Pago.objects.all(), usuario=self.usuario)
+        pago = self.pendientes[0]
+        pago.refresh_from_db()
+
+        with patch('cartera.tasks.generar_estado_cuenta_lote.delay') as delay_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                desmarcar_pago(pago)
+        delay_mock.assert_called_once_with(lote.pk)
+
+        pago.refresh_from_db()
+        self.assertEqual(pago.estado_comision, 'PENDIENTE')
+        self.assertIsNone(pago.lote_liquidacion)
+        lote.refresh_from_db()
+        self.assertEqual((lote.cantidad_pagos, lote.total_comisiones), (2, Decimal('10000.00')))
+        self.assertEqual(
+            list(TotalLiquidacion.objects.filter(lote=lote).values_list('cantidad_pagos', 'total_comisiones')),
+            [(2, Decimal('10000.00'))]
+        )
+
+    def test_actualiza_el_resumen_mensual(self):
+        """Verifica que el resumen mensual refleja la liquidación y la reversión."""
+        with patch('cartera.tasks.generar_estado_cuenta_lote.delay'):
+            with self.captureOnCommitCallbacks(execute=True):
+                lote = liquidar_pagos(Pago.objects.all())
+        resumen = ResumenMensual.objects.get(cliente=self.cliente, mes=date(2025, 3, 1))
+        self.assertEqual(resumen.comisiones_liquidadas, Decimal('22000.00'))
+
+        with patch('cartera.tasks.generar_estado_cuenta_lote.delay'):
+            with self.captureOnCommitCallbacks(execute=True):
+                revertir_lote(lote)
+        resumen = ResumenMensual.objects.get(cliente=self.cliente, mes=date(2025, 3, 1))
+        self.assertEqual(resumen.comisiones_liquidadas, Decimal('7000.00'))
+
+
+class EstadoCuentaLoteTest(TestCase):
+    """Tests para los totales por compañía y el estado de cuenta de un lote."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cliente = User.objects.create_user(username='cliente_estado_cuenta', first_name='Pedro', last_name='Páez')
+        cls.vida = TipoSeguro.objects.create(nombre='Vida EC', comision_porcentaje=Decimal('10.00'))
+        cls.autos = TipoSeguro.objects.create(nombre='Autos EC', comision_porcentaje=Decimal('10.00'))
+        cls.sura = CompaniaAseguradora.objects.create(nombre='Sura EC')
+        cls.bolivar = CompaniaAseguradora.objects.create(nombre='Bolívar EC')
+        combinaciones = [(cls.sura, cls.vida), (cls.sura, cls.autos), (cls.bolivar, cls.vida)]
+        for indice, (compania, tipo) in enumerate(combinaciones):
+            poliza = Poliza.objects.create(
+                cliente=cliente, tipo_seguro=tipo, compania_aseguradora=compania,
+                numero_poliza=f'EC-{indice}', fecha_inicio=date(2025, 1, 1), fecha_fin=date(2026, 1, 1),
+                valor_prima_sin_iva=Decimal('1000000.00'), modo_pago='MENSUAL', plazo_meses=12
+            )
+            for dia in (1, 2):
+                Pago.objects.create(poliza=poliza, fecha_pago=date(2025, 5, dia), monto_pagado=Decimal('1000.00') * (indice + 1))
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+
+    def test_totales_por_compania_y_tipo(self):
+        """Verifica que el lote guarda una fila de totales por compañía y tipo de seguro."""
+        with self.captureOnCommitCallbacks() as callbacks:
+            lote = liquidar_pagos(Pago.objects.all())
+
+        # Una fila por compañía y tipo, en el orden del modelo (por nombres)
+        totales = list(TotalLiquidacion.objects.filter(lote=lote).values_list(
+            'compania_aseguradora_id', 'tipo_seguro_id', 'cantidad_pagos', 'total_comisiones'
+        ))
+        self.assertEqual(totales, [
+            (self.bolivar.pk, self.vida.pk, 2, Decimal('6000.00')),
+            (self.sura.pk, self.autos.pk, 2, Decimal('4000.00')),
+            (self.sura.pk, self.vida.pk, 2, Decimal('2000.00')),
+        ])
+        self.assertEqual(lote.cantidad_pagos, 6)
+        self.assertEqual(lote.total_comisiones, Decimal('12000.00'))
+
+        # El estado de cuenta se programa al confirmar la transacción
+        with patch('cartera.tasks.generar_estado_cuenta_lote.delay') as delay_mock:
+            for callback in callbacks:
+                callback()
+        delay_mock.assert_called_once_with(lote.pk)
+
+    def test_genera_estado_cuenta_csv_y_html(self):
+        """Verifica que la tarea guarda el CSV y el HTML con subtotales por compañía."""
+        with self.captureOnCommitCallbacks():
+            lote = liquidar_pagos(Pago.objects.all())
+
+        with override_settings(MEDIA_ROOT=self.media):
+            resultado = generar_estado_cuenta_lote(lote.pk)
+            lote.refresh_from_db()
+
+            self.assertIn('generado', resultado)
+            self.assertIsNotNone(lote.fecha_estado_cuenta)
+            with lote.estado_cuenta_csv.open('rb') as archivo:
+                lineas = archivo.read().decode('utf-8-sig').splitlines()
+            with lote.estado_cuenta_html.open('rb') as archivo:
+                html = archivo.read().decode('utf-8')
+
+        self.assertEqual(lineas[0].split(',')[0], 'Compañía')
+        self.assertIn('Bolívar EC,Vida EC,EC-2,Pedro Páez,2,2025-05-01,2025-05-02,6000.00', lineas)
+        self.assertIn('Subtotal Sura EC,,,,4,,,6000.00', lineas)
+        self.assertEqual(lineas[-1], 'Total,,,,6,,,12000.00')
+        self.assertIn('Subtotal Bolívar EC', html)
+        self.assertIn('EC-1', html)
+
+    def test_lote_inexistente(self):
+        """Verifica que la tarea no falla si el lote ya no existe."""
+        self.assertIn('no existe', generar_estado_cuenta_lote(999999))
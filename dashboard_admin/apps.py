@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class DashboardAdminConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dashboard_admin'
+
+    def ready(self):
+        # Importa las señales que mantienen los vectores de la búsqueda global
+        import dashboard_admin.signals
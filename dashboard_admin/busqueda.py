@@ -0,0 +1,181 @@
+# dashboard_admin/busqueda.py
+"""
+Búsqueda global del dashboard sobre clientes, pólizas, vehículos y siniestros.
+
+Cada modelo guarda su vector de búsqueda en la columna `busqueda`
+(SearchVectorField con índice GIN). Los vectores se calculan aquí a partir de
+la instancia y se actualizan con señales (dashboard_admin/signals.py) cada vez
+que cambia alguno de los campos de los que salen; el comando
+`actualizar_busqueda` los reconstruye para los registros existentes.
+
+La consulta es un solo UNION ALL de las cuatro tablas, cada rama limitada a
+sus mejores resultados por SearchRank, así que es un único viaje a la base.
+"""
+import re
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db.models import CharField, F, Q, TextField, Value
+from django.db.models.functions import Concat, Greatest
+from django.urls import reverse
+from polizas.models import Poliza, Vehiculo
+from siniestros.models import Siniestro
+from usuarios.models import PerfilCliente
+
+# 'simple' no quita tildes ni aplica raíces: sirve para nombres, placas y números
+CONFIGURACION = 'simple'
+RESULTADOS_POR_TIPO = 10
+LONGITUD_MINIMA_TERMINO = 2
+
+
+# --- Vectores ---
+
+def _vector(*partes):
+    """Combina (texto, peso) en un SearchVector calculado con valores, no columnas."""
+    vector = None
+    for texto, peso in partes:
+        parte = SearchVector(Value(texto or '', output_field=TextField()), weight=peso, config=CONFIGURACION)
+        vector = parte if vector is None else vector + parte
+    return vector
+
+
+def _codigo(texto):
+    """
+    Números de póliza, placas y cédulas: 'BUS-7788' se indexa como 'BUS 7788
+    BUS7788'. Sin esto el parser de Postgres lee '-7788' como un entero con
+    signo y la búsqueda por '7788' no lo encuentra.
+    """
+    partes = re.sub(r'[\W_]+', ' ', texto or '').strip()
+    return f"{partes} {partes.replace(' ', '')}" if ' ' in partes else partes
+
+
+def vector_perfil(perfil):
+    usuario = perfil.usuario
+    return _vector(
+        (usuario.first_name, 'A'), (usuario.last_name, 'A'), (_codigo(perfil.cedula), 'A'),
+        (usuario.username, 'B'), (usuario.email, 'B'), (perfil.telefono, 'C'),
+    )
+
+
+def vector_poliza(poliza):
+    placa = poliza.vehiculo.placa if poliza.vehiculo_id else ''
+    return _vector((_codigo(poliza.numero_poliza), 'A'), (_codigo(placa), 'A'))
+
+
+def vector_vehiculo(vehiculo):
+    return _vector((_codigo(vehiculo.placa), 'A'), (vehiculo.marca, 'B'), (vehiculo.modelo, 'B'))
+
+
+def vector_siniestro(siniestro):
+    return _vector((_codigo(siniestro.numero_siniestro), 'A'), (siniestro.descripcion, 'B'))
+
+
+VECTORES = {
+    PerfilCliente: vector_perfil,
+    Poliza: vector_poliza,
+    Vehiculo: vector_vehiculo,
+    Siniestro: vector_siniestro,
+}
+
+
+def actualizar_vector(instancia):
+    """Guarda el vector de una instancia con un UPDATE (sin disparar señales)."""
+    vector = VECTORES[type(instancia)](instancia)
+    type(instancia).objects.filter(pk=instancia.pk).update(busqueda=vector)
+
+
+def reconstruir_vectores(objetos):
+    """Recalcula los vectores de un lote de objetos del mismo modelo en un solo UPDATE."""
+    if not objetos:
+        return 0
+    modelo = type(objetos[0])
+    calcular = VECTORES[modelo]
+    for objeto in objetos:
+        objeto.busqueda = calcular(objeto)
+    return modelo.objects.bulk_update(objetos, ['busqueda'])
+
+
+# --- Consulta ---
+
+def construir_consulta(texto):
+    """
+    Convierte lo escrito en una consulta de prefijos: 'ana rest' busca
+    lexemas que empiecen por 'ana' y por 'rest'. Solo se usan letras y
+    números, así que el texto no puede romper la sintaxis de tsquery.
+    """
+    terminos = [
+        termino for termino in re.findall(r'[^\W_]+', texto.lower())
+        if len(termino) >= LONGITUD_MINIMA_TERMINO
+    ][:8]
+    if not terminos:
+        return None
+    return SearchQuery(' & '.join(f'{termino}:*' for termino in terminos), search_type='raw', config=CONFIGURACION)
+
+
+def _rama(queryset, tipo, objeto_id, titulo, detalle, consulta, limite, campo_trigramas=None, texto=''):
+    rango = SearchRank(F('busqueda'), consulta)
+    filtro = Q(busqueda=consulta)
+    if campo_trigramas and settings.BUSQUEDA_TRIGRAMAS:
+        # Tolera errores de digitación en placas y números (requiere pg_trgm)
+        filtro |= Q(**{f'{campo_trigramas}__trigram_similar': texto})
+        rango = Greatest(rango, TrigramSimilarity(campo_trigramas, texto))
+    return queryset.filter(filtro).annotate(
+        r_tipo=Value(tipo, output_field=CharField()),
+        r_id=objeto_id,
+        r_titulo=titulo,
+        r_detalle=detalle,
+        r_rango=rango,
+    ).order_by('-r_rango').values_list('r_tipo', 'r_id', 'r_titulo', 'r_detalle', 'r_rango')[:limite]
+
+
+def _nombre(prefijo=''):
+    return Concat(F(f'{prefijo}first_name'), Value(' '), F(f'{prefijo}last_name'), output_field=CharField())
+
+
+def buscar(texto, limite=RESULTADOS_POR_TIPO):
+    """
+    Devuelve hasta `limite` resultados por tipo, ordenados por relevancia:
+    [{'tipo', 'id', 'titulo', 'detalle', 'rango', 'url'}].
+    """
+    consulta = construir_consulta(texto)
+    if consulta is None:
+        return []
+    texto = texto.strip()
+
+    clientes = _rama(
+        PerfilCliente.objects.filter(usuario__is_staff=False), 'cliente', F('usuario_id'),
+        _nombre('usuario__'), F('usuario__email'), consulta, limite
+    )
+    polizas = _rama(
+        Poliza.objects.all(), 'poliza', F('pk'),
+        F('numero_poliza'), _nombre('cliente__'), consulta, limite,
+        campo_trigramas='numero_poliza', texto=texto
+    )
+    vehiculos = _rama(
+        Vehiculo.objects.all(), 'vehiculo', F('pk'),
+        F('placa'), Concat(F('marca'), Value(' '), F('modelo'), output_field=CharField()), consulta, limite,
+        campo_trigramas='placa', texto=texto
+    )
+    siniestros = _rama(
+        Siniestro.objects.all(), 'siniestro', F('pk'),
+        F('numero_siniestro'), F('poliza__numero_poliza'), consulta, limite
+    )
+
+    filas = clientes.union(polizas, vehiculos, siniestros, all=True).order_by('-r_rango')
+
+    urls = {
+        'cliente': 'dashboard_admin:lista_polizas_cliente',
+        'poliza': 'dashboard_admin:editar_poliza',
+        'vehiculo': 'dashboard_admin:editar_vehiculo',
+        'siniestro': 'dashboard_admin:detalle_siniestro',
+    }
+    return [
+        {
+            'tipo': tipo,
+            'id': objeto_id,
+            'titulo': (titulo or '').strip(),
+            'detalle': (detalle or '').strip(),
+            'rango': round(float(rango), 4),
+            'url': reverse(urls[tipo], kwargs={'pk': objeto_id}),
+        }
+        for tipo, objeto_id, titulo, detalle, rango in filas
+    ]
@@ -1,10 +1,39 @@
 # dashboard_admin/forms.py
 from django import forms
 from django.contrib.auth.models import User
+from django.urls import reverse_lazy
 from polizas.models import Asesor, TipoSeguro, CompaniaAseguradora, Poliza, Vehiculo
 from siniestros.models import Siniestro, SubtipoSiniestro
 from siniestros.models import DocumentoSiniestro, FotoSiniestro
 
+class SelectAutocompletar(forms.Select):
+    """
+    <select> de Select2 que busca las opciones por AJAX en `url`. Solo pinta
+    la opción seleccionada, así el formulario no carga la tabla completa; la
+    validación sigue siendo la del queryset del campo.
+    """
+
+    def __init__(self, url, placeholder='', attrs=None):
+        attrs = {
+            'data-autocompletar-url': url,
+            'data-placeholder': placeholder,
+            **(attrs or {}),
+        }
+        super().__init__(attrs=attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        seleccionados = [v for v in value if v]
+        todas = self.choices
+        queryset = getattr(todas, 'queryset', None)
+        if queryset is not None:
+            objetos = queryset.filter(pk__in=seleccionados) if seleccionados else queryset.none()
+            self.choices = [('', '')] + [todas.choice(obj) for obj in objetos]
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = todas
+
+
 class ClientCreationForm(forms.ModelForm):
   
     cedula = forms.CharField(max_length=20, required=False)
@@ -158,6 +187,10 @@ class VehiculoForm(forms.ModelForm):
         widgets = {
             # Usamos el nombre correcto aquí también
             'soat_vencimiento_recordatorio': forms.DateInput(attrs={'type': 'date'}),
+            'cliente': SelectAutocompletar(
+                reverse_lazy('dashboard_admin:autocompletar_clientes'),
+                placeholder='Busca un cliente por nombre, cédula o email'
+            ),
         }
 
     def __init__(self, *args, **kwargs):
@@ -186,6 +219,10 @@ class SiniestroForm(forms.ModelForm):
         widgets = {
             'fecha_siniestro': forms.DateInput(attrs={'type': 'date'}),
             'descripcion': forms.Textarea(attrs={'rows': 4}),
+            'poliza': SelectAutocompletar(
+                reverse_lazy('dashboard_admin:autocompletar_polizas'),
+                placeholder='Busca una póliza por número o placa'
+            ),
         }
 
     def __init__(self, *args, **kwargs):
@@ -226,4 +263,90 @@ class AsesorForm(forms.ModelForm):
         self.fields['nombre_completo'].widget.attrs.update({
             'class': 'form-control',
             'placeholder': 'Ej: Juan David Pérez'
-        })
\ No newline at end of file
+        })
+
+
+class ImportacionPolizasForm(forms.Form):
+    archivo = forms.FileField(
+        label="Archivo CSV",
+        help_text="Codificado en UTF-8, con una póliza por fila."
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['archivo'].widget.attrs.update({'class': 'form-control', 'accept': '.csv,text/csv'})
+
+    def clean_archivo(self):
+        archivo = self.cleaned_data['archivo']
+        if not archivo.name.lower().endswith('.csv'):
+            raise forms.ValidationError("El archivo debe tener extensión .csv.")
+        return archivo
+
+
+class CancelacionEnBloqueForm(forms.Form):
+    """Filtro (compañía, tipo, asesor) y/o lista de números de póliza a cancelar."""
+    compania_aseguradora = forms.ModelChoiceField(
+        queryset=CompaniaAseguradora.objects.all(), required=False, label="Compañía", empty_label="Todas las compañías"
+    )
+    tipo_seguro = forms.ModelChoiceField(
+        queryset=TipoSeguro.objects.all(), required=False, label="Tipo de seguro", empty_label="Todos los tipos"
+    )
+    asesor = forms.ModelChoiceField(
+        queryset=Asesor.objects.all(), required=False, label="Asesor", empty_label="Todos los asesores"
+    )
+    numeros_poliza = forms.CharField(
+        label="Números de póliza",
+        required=False,
+        widget=forms.Textarea(attrs={'rows': 3}),
+        help_text="Opcional. Separados por comas, espacios o saltos de línea."
+    )
+    fecha_cancelacion = forms.DateField(
+        label="Fecha de cancelación",
+        widget=forms.DateInput(attrs={'type': 'date'}, format='%Y-%m-%d')
+    )
+    motivo_cancelacion = forms.CharField(
+        label="Motivo",
+        widget=forms.Textarea(attrs={'rows': 3, 'placeholder': 'Describe el motivo por el cual se cancelan las pólizas...'})
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for campo in self.fields.values():
+            clase = 'form-control form-select' if isinstance(campo, forms.ModelChoiceField) else 'form-control'
+            campo.widget.attrs.setdefault('class', clase)
+
+    def clean_numeros_poliza(self):
+        texto = self.cleaned_data['numeros_poliza'].replace(',', ' ')
+        numeros = list(dict.fromkeys(texto.split()))
+        existentes = set(Poliza.objects.filter(numero_poliza__in=numeros).values_list('numero_poliza', flat=True))
+        faltantes = [numero for numero in numeros if numero not in existentes]
+        if faltantes:
+            raise forms.ValidationError(f"No existen las pólizas: {', '.join(faltantes[:20])}")
+        return numeros
+
+    def clean(self):
+        datos = super().clean()
+        criterios = ('compania_aseguradora', 'tipo_seguro', 'asesor', 'numeros_poliza')
+        if not self.errors and not any(datos.get(campo) for campo in criterios):
+            # Sin ningún criterio se cancelaría toda la cartera
+            raise forms.ValidationError("Elige al menos una compañía, un tipo de seguro, un asesor o una lista de pólizas.")
+        return datos
+
+    def polizas(self):
+        """Pólizas que cumplen todos los criterios indicados."""
+        polizas = Poliza.objects.all()
+        for campo in ('compania_aseguradora', 'tipo_seguro', 'asesor'):
+            if self.cleaned_data.get(campo):
+                polizas = polizas.filter(**{campo: self.cleaned_data[campo]})
+        if self.cleaned_data.get('numeros_poliza'):
+            polizas = polizas.filter(numero_poliza__in=self.cleaned_data['numeros_poliza'])
+        return polizas
+
+    def descripcion(self):
+        partes = [
+            f"{self.fields[campo].label}: {self.cleaned_data[campo]}"
+            for campo in ('compania_aseguradora', 'tipo_seguro', 'asesor') if self.cleaned_data.get(campo)
+        ]
+        if self.cleaned_data.get('numeros_poliza'):
+            partes.append(f"{len(self.cleaned_data['numeros_poliza'])} pólizas por número")
+        return ', '.join(partes)
@@ -0,0 +1,91 @@
+# dashboard_admin/management/commands/actualizar_busqueda.py
+from django.core.management.base import BaseCommand
+from django.db import connection
+from dashboard_admin.busqueda import reconstruir_vectores
+from polizas.models import Poliza, Vehiculo
+from siniestros.models import Siniestro
+from usuarios.models import PerfilCliente
+
+# Índices de trigramas para la búsqueda tolerante a errores (BUSQUEDA_TRIGRAMAS).
+# Van aquí y no en Meta.indexes porque dependen de la extensión pg_trgm.
+INDICES_TRIGRAMAS = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS poliza_numero_trgm_idx ON polizas_poliza USING gin (numero_poliza gin_trgm_ops)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS vehiculo_placa_trgm_idx ON polizas_vehiculo USING gin (placa gin_trgm_ops)",
+]
+
+# Índices de prefijo para filtrar_clientes (directorio y autocompletar): __istartswith
+# genera UPPER(col::text) LIKE 'X%'. auth_user es de Django, así que no pueden ir
+# en Meta.indexes; la cédula ya tiene el suyo en PerfilCliente.
+INDICES_PREFIJO_USUARIOS = [
+    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS usuario_{columna}_prefijo_idx ON auth_user (UPPER({columna}) text_pattern_ops)"
+    for columna in ('first_name', 'last_name', 'username', 'email')
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Calcula los vectores de la búsqueda global para los clientes, pólizas, '
+        'vehículos y siniestros existentes. Con --trigramas crea además la extensión '
+        'pg_trgm y los índices de trigramas de placas y números de póliza, y con '
+        '--indices-usuarios los índices de prefijo del directorio de clientes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--solo-vacios',
+            action='store_true',
+            help='Solo calcula los vectores de los registros que aún no lo tienen.'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=2000,
+            help='Registros por UPDATE (por defecto 2000).'
+        )
+        parser.add_argument(
+            '--trigramas',
+            action='store_true',
+            help='Crea la extensión pg_trgm y los índices de trigramas.'
+        )
+        parser.add_argument(
+            '--indices-usuarios',
+            action='store_true',
+            help='Crea los índices de prefijo de nombre, apellido, usuario y email de auth_user.'
+        )
+
+    def handle(self, *args, **options):
+        if options['indices_usuarios']:
+            with connection.cursor() as cursor:
+                for sql in INDICES_PREFIJO_USUARIOS:
+                    cursor.execute(sql)
+            self.stdout.write(self.style.SUCCESS("Índices de prefijo de usuarios listos."))
+
+        if options['trigramas']:
+            with connection.cursor() as cursor:
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                for sql in INDICES_TRIGRAMAS:
+                    cursor.execute(sql)
+            self.stdout.write(self.style.SUCCESS("Extensión pg_trgm e índices de trigramas listos."))
+
+        querysets = [
+            PerfilCliente.objects.select_related('usuario'),
+            Poliza.objects.select_related('vehiculo'),
+            Vehiculo.objects.all(),
+            Siniestro.objects.all(),
+        ]
+        for queryset in querysets:
+            if options['solo_vacios']:
+                queryset = queryset.filter(busqueda__isnull=True)
+            total = 0
+            ultimo_id = 0
+            # Por rangos de id para no cargar toda la tabla en memoria
+            while True:
+                lote = list(queryset.filter(pk__gt=ultimo_id).order_by('pk')[:options['lote']])
+                if not lote:
+                    break
+                reconstruir_vectores(lote)
+                total += len(lote)
+                ultimo_id = lote[-1].pk
+            self.stdout.write(f"{queryset.model._meta.verbose_name_plural}: {total} vectores actualizados.")
+
+        self.stdout.write(self.style.SUCCESS("Búsqueda global actualizada."))
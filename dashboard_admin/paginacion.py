@@ -0,0 +1,153 @@
+# dashboard_admin/paginacion.py
+import base64
+import json
+import logging
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+
+logger = logging.getLogger('dashboard_admin')
+
+
+class PaginaKeyset:
+    """
+    Página de resultados paginados por cursor. Expone lo mismo que usan las
+    plantillas del Paginator de Django (object_list, has_next, has_previous)
+    más las query strings de los enlaces y el conteo (estimado o con tope).
+    """
+
+    def __init__(self, object_list, has_next, has_previous, query_siguiente, query_anterior, conteo, conteo_es_estimado, conteo_es_tope):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.query_siguiente = query_siguiente
+        self.query_anterior = query_anterior
+        self.conteo = conteo
+        self.conteo_es_estimado = conteo_es_estimado
+        self.conteo_es_tope = conteo_es_tope
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginationMixin:
+    """
+    Reemplaza la paginación por OFFSET de ListView por paginación por cursor
+    (keyset) sobre `orden_keyset`, por ejemplo ('-fecha_pago', '-id').
+
+    Cada página se lee con un WHERE sobre la última fila de la anterior, así
+    que ir a la página 500 cuesta lo mismo que ir a la 2. Los enlaces llevan
+    el cursor en ?despues= o ?antes= y conservan los demás filtros del GET.
+
+    En lugar del COUNT(*) exacto, el total se estima con pg_class.reltuples
+    cuando no hay filtros, o se cuenta hasta `conteo_maximo` filas.
+    """
+    orden_keyset = ('-id',)
+    conteo_maximo = 1000
+
+    # --- Cursores ---
+
+    @staticmethod
+    def codificar_cursor(valores):
+        datos = json.dumps(valores, default=str).encode()
+        return base64.urlsafe_b64encode(datos).decode().rstrip('=')
+
+    def decodificar_cursor(self, cursor, modelo):
+        """Devuelve los valores del cursor ya validados, o None si no es válido."""
+        try:
+            relleno = '=' * (-len(cursor) % 4)
+            valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+            if len(valores) != len(self.orden_keyset):
+                return None
+            return [
+                modelo._meta.get_field(campo.lstrip('-')).to_python(valor)
+                for campo, valor in zip(self.orden_keyset, valores)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            logger.warning(f"Cursor de paginación inválido: {cursor!r}")
+            return None
+
+    def _valores_de(self, objeto):
+        return [getattr(objeto, campo.lstrip('-')) for campo in self.orden_keyset]
+
+    def _filtro_posterior(self, valores, invertir=False):
+        """
+        Q de las filas que van después de `valores` en el orden de la página
+        (o antes, si invertir=True). Para (a, b) descendente: a < x OR (a = x AND b < y).
+        """
+        filtro = Q()
+        iguales = {}
+        for campo, valor in zip(self.orden_keyset, valores):
+            nombre = campo.lstrip('-')
+            descendente = campo.startswith('-') != invertir
+            filtro |= Q(**iguales, **{f"{nombre}__{'lt' if descendente else 'gt'}": valor})
+            iguales[nombre] = valor
+        return filtro
+
+    # --- Conteo ---
+
+    def contar(self, queryset):
+        """Devuelve (conteo, es_estimado, es_tope) sin hacer un COUNT(*) completo."""
+        if not queryset.query.has_filters() and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table]
+                )
+                fila = cursor.fetchone()
+            # reltuples es -1 si la tabla nunca se ha analizado
+            if fila and fila[0] >= 0:
+                return fila[0], True, False
+
+        conteo = queryset.order_by()[:self.conteo_maximo + 1].count()
+        if conteo > self.conteo_maximo:
+            return self.conteo_maximo, False, True
+        return conteo, False, False
+
+    # --- Integración con ListView ---
+
+    def _query_con_cursor(self, parametro, valores):
+        query = self.request.GET.copy()
+        for clave in ('despues', 'antes', 'page'):
+            query.pop(clave, None)
+        query[parametro] = self.codificar_cursor(valores)
+        return query.urlencode()
+
+    def paginate_queryset(self, queryset, page_size):
+        despues = self.request.GET.get('despues')
+        antes = self.request.GET.get('antes')
+        conteo, conteo_es_estimado, conteo_es_tope = self.contar(queryset)
+
+        ordenado = queryset.order_by(*self.orden_keyset)
+        valores_despues = self.decodificar_cursor(despues, queryset.model) if despues else None
+        valores_antes = self.decodificar_cursor(antes, queryset.model) if antes else None
+
+        if valores_antes:
+            # Página anterior: se lee en orden inverso y se da vuelta
+            invertido = [campo[1:] if campo.startswith('-') else f'-{campo}' for campo in self.orden_keyset]
+            filas = list(queryset.filter(self._filtro_posterior(valores_antes, invertir=True)).order_by(*invertido)[:page_size + 1])
+            has_previous = len(filas) > page_size
+            filas = filas[:page_size][::-1]
+            has_next = True
+        else:
+            if valores_despues:
+                ordenado = ordenado.filter(self._filtro_posterior(valores_despues))
+            filas = list(ordenado[:page_size + 1])
+            has_next = len(filas) > page_size
+            filas = filas[:page_size]
+            has_previous = valores_despues is not None
+
+        pagina = PaginaKeyset(
+            filas,
+            has_next=has_next and bool(filas),
+            has_previous=has_previous and bool(filas),
+            query_siguiente=self._query_con_cursor('despues', self._valores_de(filas[-1])) if filas else '',
+            query_anterior=self._query_con_cursor('antes', self._valores_de(filas[0])) if filas else '',
+            conteo=conteo,
+            conteo_es_estimado=conteo_es_estimado,
+            conteo_es_tope=conteo_es_tope,
+        )
+        return None, pagina, filas, pagina.has_next or pagina.has_previous
@@ -0,0 +1,63 @@
+# dashboard_admin/signals.py
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from polizas.models import Poliza, Vehiculo
+from polizas.signals import polizas_importadas
+from siniestros.models import Siniestro
+from usuarios.models import PerfilCliente
+from .busqueda import actualizar_vector, reconstruir_vectores
+
+# Campos de los que sale cada vector de búsqueda. Si un save() trae
+# update_fields sin ninguno de ellos, el vector no cambia y no se toca.
+# Poliza no aparece: su seguimiento de cambios ya dice qué campos cambiaron.
+CAMPOS_BUSQUEDA = {
+    User: {'first_name', 'last_name', 'username', 'email'},
+    PerfilCliente: {'cedula', 'telefono', 'usuario', 'usuario_id'},
+    Vehiculo: {'placa', 'marca', 'modelo'},
+    Siniestro: {'numero_siniestro', 'descripcion'},
+}
+
+
+def _afecta_busqueda(sender, update_fields):
+    return update_fields is None or bool(CAMPOS_BUSQUEDA[sender] & set(update_fields))
+
+
+@receiver(post_save, sender=PerfilCliente)
+@receiver(post_save, sender=Siniestro)
+def actualizar_busqueda(sender, instance, update_fields=None, **kwargs):
+    if _afecta_busqueda(sender, update_fields):
+        actualizar_vector(instance)
+
+
+@receiver(post_save, sender=Poliza)
+def actualizar_busqueda_poliza(sender, instance, **kwargs):
+    # La póliza sabe qué campos cambió el save(), con o sin update_fields
+    if instance.guardado_cambio('numero_poliza', 'vehiculo_id'):
+        actualizar_vector(instance)
+
+
+@receiver(post_save, sender=Vehiculo)
+def actualizar_busqueda_vehiculo(sender, instance, update_fields=None, **kwargs):
+    """El vector de las pólizas del vehículo incluye su placa."""
+    if _afecta_busqueda(sender, update_fields):
+        actualizar_vector(instance)
+        reconstruir_vectores(list(instance.polizas.select_related('vehiculo')))
+
+
+@receiver(post_save, sender=User)
+def actualizar_busqueda_usuario(sender, instance, created, update_fields=None, **kwargs):
+    """El vector del perfil incluye el nombre y el email del usuario."""
+    # Al crear el usuario, el perfil se crea después y calcula su propio vector
+    if created or not _afecta_busqueda(sender, update_fields):
+        return
+    perfil = PerfilCliente.objects.filter(usuario=instance).first()
+    if perfil:
+        perfil.usuario = instance
+        actualizar_vector(perfil)
+
+
+@receiver(polizas_importadas)
+def actualizar_busqueda_importacion(sender, polizas, **kwargs):
+    """Vectores de las pólizas creadas por la importación masiva, en un UPDATE por lote."""
+    reconstruir_vectores(polizas)
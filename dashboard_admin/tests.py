@@ -1,3 +1,800 @@
-from django.test import TestCase
+import csv
+import shutil
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import skipUnless
+from io import StringIO
+from unittest.mock import patch
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from polizas.models import CompaniaAseguradora, CorreoSaliente, ImportacionPolizas, Poliza, TipoSeguro, Vehiculo
+from cartera.models import Cuota, LoteLiquidacion, Pago
+from reportes.fechas import filtro_mes
+from siniestros.models import Siniestro
+from usuarios.models import PerfilCliente
+from dashboard_admin.busqueda import buscar, construir_consulta
+from dashboard_admin.management.commands.actualizar_busqueda import INDICES_PREFIJO_USUARIOS
+from dashboard_admin.views import filtrar_clientes
 
-# Create your tests here.
+
+@override_settings(ADMIN_EMAIL='admin@test.com')
+class PolicyCancelViewTest(TestCase):
+    """Tests para la vista de cancelación de pólizas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='testpass123', is_staff=True)
+        cls.cliente = User.objects.create_user(
+            username='cliente_cancelacion',
+            email='cancelacion@test.com',
+            password='testpass123'
+        )
+        cls.poliza = Poliza.objects.create(
+            cliente=cls.cliente,
+            tipo_seguro=TipoSeguro.objects.create(
+                nombre='Seguro Cancelación',
+                comision_porcentaje=Decimal('10.00'),
+                porcentaje_iva=Decimal('19.00')
+            ),
+            compania_aseguradora=CompaniaAseguradora.objects.create(nombre='Compañía Cancelación'),
+            numero_poliza='POL-CANCEL-001',
+            fecha_inicio=date.today() - timedelta(days=100),
+            fecha_fin=date.today() + timedelta(days=265),
+            valor_prima_sin_iva=Decimal('1000000.00'),
+            modo_pago='CONTADO'
+        )
+
+    def test_cancelacion_solo_encola_los_correos(self):
+        """Verifica que la cancelación encola los correos en lugar de enviarlos."""
+        self.client.force_login(self.admin)
+        with patch('polizas.tasks.despachar_bandeja_salida.delay') as delay_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse('dashboard_admin:cancelar_poliza', args=[self.poliza.pk]),
+                    {'motivo_cancelacion': 'Venta del vehículo'}
+                )
+
+        self.assertEqual(response.status_code, 302)
+        self.poliza.refresh_from_db()
+        self.assertEqual(self.poliza.estado, 'CANCELADA')
+
+        self.assertEqual(len(mail.outbox), 0)
+        destinatarios = sorted(CorreoSaliente.objects.values_list('destinatarios', flat=True))
+        self.assertEqual(destinatarios, [['admin@test.com'], ['cancelacion@test.com']])
+        self.assertTrue(delay_mock.called)
+
+    def test_error_al_ajustar_el_pago_no_impide_cancelar(self):
+        """Verifica que un error de base de datos en el ajuste del pago no aborta la cancelación."""
+        def falla_en_la_base(*args, **kwargs):
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1 / 0')
+
+        self.client.force_login(self.admin)
+        with patch.object(Pago, 'save', falla_en_la_base), patch('polizas.tasks.despachar_bandeja_salida.delay'):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse('dashboard_admin:cancelar_poliza', args=[self.poliza.pk]),
+                    {'motivo_cancelacion': 'Venta del vehículo'}
+                )
+
+        self.assertEqual(response.status_code, 302)
+        self.poliza.refresh_from_db()
+        self.assertEqual(self.poliza.estado, 'CANCELADA')
+        self.assertIsNotNone(self.poliza.monto_devolucion)
+
+
+
+@override_settings(ADMIN_EMAIL='admin@test.com')
+class CancelacionEnBloqueViewTest(TestCase):
+    """Tests para la vista de cancelación en bloque."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin_bloque', password='testpass123', is_staff=True)
+        cliente = User.objects.create_user(username='cliente_bloque', email='bloque@test.com')
+        tipo = TipoSeguro.objects.create(
+            nombre='Seguro Bloque', comision_porcentaje=Decimal('10.00'), porcentaje_iva=Decimal('19.00')
+        )
+        cls.compania = CompaniaAseguradora.objects.create(nombre='Compañía Bloque')
+        for numero in range(3):
+            Poliza.objects.create(
+                cliente=cliente, tipo_seguro=tipo, compania_aseguradora=cls.compania,
+                numero_poliza=f'VISTA-BLOQUE-{numero}', fecha_inicio=date.today() - timedelta(days=100),
+                fecha_fin=date.today() + timedelta(days=265), valor_prima_sin_iva=Decimal('1000000.00'),
+                modo_pago='CONTADO'
+            )
+        cls.url = reverse('dashboard_admin:cancelar_polizas_lote')
+
+    def datos(self, **extra):
+        datos = {
+            'compania_aseguradora': self.compania.pk,
+            'fecha_cancelacion': date.today().isoformat(),
+            'motivo_cancelacion': 'La compañía retira el producto',
+        }
+        datos.update(extra)
+        return datos
+
+    def test_previsualizar_no_cancela(self):
+        """Verifica que calcular muestra el resumen sin cancelar nada."""
+        self.client.force_login(self.admin)
+        respuesta = self.client.post(self.url, self.datos(accion='previsualizar'))
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['resumen']['cantidad'], 3)
+        self.assertContains(respuesta, 'Cancelar 3 pólizas')
+        self.assertEqual(Poliza.objects.filter(estado='ACTIVA').count(), 3)
+
+    def test_confirmar_cancela_y_encola_correos(self):
+        """Verifica que confirmar cancela las pólizas del filtro y solo encola los correos."""
+        self.client.force_login(self.admin)
+        with patch('polizas.tasks.despachar_bandeja_salida.delay'):
+            with self.captureOnCommitCallbacks(execute=True):
+                respuesta = self.client.post(self.url, self.datos(
+                    accion='confirmar', numeros_poliza='VISTA-BLOQUE-0, VISTA-BLOQUE-1'
+                ))
+
+        self.assertRedirects(respuesta, self.url)
+        self.assertEqual(
+            set(Poliza.objects.filter(estado='CANCELADA').values_list('numero_poliza', flat=True)),
+            {'VISTA-BLOQUE-0', 'VISTA-BLOQUE-1'}
+        )
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(CorreoSaliente.objects.count(), 3)
+
+    def test_requiere_algun_criterio_y_numeros_existentes(self):
+        """Verifica que no se puede cancelar toda la cartera ni pólizas inexistentes."""
+        self.client.force_login(self.admin)
+        respuesta = self.client.post(self.url, self.datos(compania_aseguradora='', accion='confirmar'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.context['form'].non_field_errors())
+
+        respuesta = self.client.post(self.url, self.datos(numeros_poliza='NO-EXISTE', accion='confirmar'))
+        self.assertIn('numeros_poliza', respuesta.context['form'].errors)
+        self.assertEqual(Poliza.objects.filter(estado='ACTIVA').count(), 3)
+
+
+class PaginacionKeysetTest(TestCase):
+    """Tests para la paginación por cursor de la vista de liquidaciones."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin_paginacion', password='testpass123', is_staff=True)
+        cliente = User.objects.create_user(username='cliente_paginacion', password='testpass123')
+        cls.poliza = Poliza.objects.create(
+            cliente=cliente,
+            tipo_seguro=TipoSeguro.objects.create(
+                nombre='Seguro Paginación',
+                comision_porcentaje=Decimal('10.00'),
+                porcentaje_iva=Decimal('19.00')
+            ),
+            compania_aseguradora=CompaniaAseguradora.objects.create(nombre='Compañía Paginación'),
+            numero_poliza='POL-PAG-001',
+            fecha_inicio=date(2025, 1, 1),
+            fecha_fin=date(2026, 1, 1),
+            valor_prima_sin_iva=Decimal('1000000.00'),
+            modo_pago='CONTADO'
+        )
+        # Dos pagos por día para que el desempate por id importe
+        Pago.objects.bulk_create([
+            Pago(poliza=cls.poliza, fecha_pago=date(2025, 1, 1) + timedelta(days=i // 2), monto_pagado=Decimal('1000.00'))
+            for i in range(40)
+        ])
+        cls.orden_esperado = list(Pago.objects.order_by('-fecha_pago', '-id').values_list('id', flat=True))
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _ids(self, response):
+        return [pago.id for pago in response.context['pagos_list']]
+
+    def test_recorre_todas_las_paginas_sin_repetir(self):
+        """Verifica que avanzar con el cursor recorre todos los pagos en orden."""
+        url = reverse('dashboard_admin:liquidacion_comisiones')
+        response = self.client.get(url)
+        vistos = self._ids(response)
+        while response.context['page_obj'].has_next:
+            response = self.client.get(f"{url}?{response.context['page_obj'].query_siguiente}")
+            vistos += self._ids(response)
+        self.assertEqual(vistos, self.orden_esperado)
+
+    def test_volver_a_la_pagina_anterior_conserva_los_filtros(self):
+        """Verifica que el cursor 'antes' devuelve la página previa y mantiene los filtros del GET."""
+        url = reverse('dashboard_admin:liquidacion_comisiones')
+        primera = self.client.get(url, {'compania_id': self.poliza.compania_aseguradora_id})
+        query_siguiente = primera.context['page_obj'].query_siguiente
+        self.assertIn(f'compania_id={self.poliza.compania_aseguradora_id}', query_siguiente)
+
+        segunda = self.client.get(f'{url}?{query_siguiente}')
+        self.assertTrue(segunda.context['page_obj'].has_previous)
+        query_anterior = segunda.context['page_obj'].query_anterior
+        self.assertIn(f'compania_id={self.poliza.compania_aseguradora_id}', query_anterior)
+
+        de_vuelta = self.client.get(f'{url}?{query_anterior}')
+        self.assertEqual(self._ids(de_vuelta), self._ids(primera))
+        self.assertFalse(de_vuelta.context['page_obj'].has_previous)
+
+    def test_cursor_invalido_muestra_la_primera_pagina(self):
+        """Verifica que un cursor manipulado no rompe la vista."""
+        response = self.client.get(reverse('dashboard_admin:liquidacion_comisiones'), {'despues': 'no-es-un-cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._ids(response), self.orden_esperado[:15])
+
+    def test_conteo_con_tope(self):
+        """Verifica que con filtros el total se cuenta solo hasta conteo_maximo."""
+        from dashboard_admin.views import LiquidacionComisionesView
+        with patch.object(LiquidacionComisionesView, 'conteo_maximo', 25):
+            response = self.client.get(
+                reverse('dashboard_admin:liquidacion_comisiones'),
+                {'cliente_id': self.poliza.cliente_id}
+            )
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.conteo, 25)
+        self.assertTrue(page_obj.conteo_es_tope)
+        self.assertContains(response, 'Más de 25 registros')
+
+
+class AutocompletarTest(TestCase):
+    """Tests para los endpoints de autocompletar de Select2."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin_autocompletar', password='testpass123', is_staff=True)
+        cls.ana = User.objects.create_user(
+            username='ana', first_name='Ana', last_name='Restrepo', email='ana@test.com', password='testpass123'
+        )
+        cls.ana.perfilcliente.cedula = '1036987'
+        cls.ana.perfilcliente.save()
+        cls.andres = User.objects.create_user(
+            username='andres', first_name='Andrés', last_name='Gómez', email='andres@test.com', password='testpass123'
+        )
+        cls.vehiculo = Vehiculo.objects.create(cliente=cls.ana, placa='ABC123')
+        cls.poliza = Poliza.objects.create(
+            cliente=cls.ana,
+            tipo_seguro=TipoSeguro.objects.create(
+                nombre='Seguro Autocompletar',
+                comision_porcentaje=Decimal('10.00'),
+                porcentaje_iva=Decimal('19.00')
+            ),
+            compania_aseguradora=CompaniaAseguradora.objects.create(nombre='Compañía Autocompletar'),
+            numero_poliza='AUTO-001',
+            vehiculo=cls.vehiculo,
+            fecha_inicio=date(2025, 1, 1),
+            fecha_fin=date(2026, 1, 1),
+            valor_prima_sin_iva=Decimal('1000000.00'),
+            modo_pago='CONTADO'
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _buscar(self, nombre_url, **params):
+        response = self.client.get(reverse(f'dashboard_admin:{nombre_url}'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_clientes_por_nombre_cedula_y_email(self):
+        """Verifica que los clientes se encuentran por prefijo de nombre, cédula o email."""
+        por_nombre = self._buscar('autocompletar_clientes', term='an')
+        self.assertEqual({r['id'] for r in por_nombre['results']}, {self.ana.pk, self.andres.pk})
+        self.assertNotIn(self.admin.pk, [r['id'] for r in por_nombre['results']])
+
+        por_cedula = self._buscar('autocompletar_clientes', term='10369')
+        self.assertEqual(por_cedula['results'], [{'id': self.ana.pk, 'text': 'Ana Restrepo (1036987)'}])
+
+        varios_terminos = self._buscar('autocompletar_clientes', term='andres@ g')
+        self.assertEqual([r['id'] for r in varios_terminos['results']], [self.andres.pk])
+
+    def test_polizas_por_numero_o_placa(self):
+        """Verifica que las pólizas se encuentran por número o por la placa de un vehículo del cliente."""
+        por_numero = self._buscar('autocompletar_polizas', term='auto')
+        por_placa = self._buscar('autocompletar_polizas', term='abc')
+        self.assertEqual([r['id'] for r in por_numero['results']], [self.poliza.pk])
+        self.assertEqual([r['id'] for r in por_placa['results']], [self.poliza.pk])
+
+    def test_vehiculos_paginados(self):
+        """Verifica la paginación de resultados en el formato de Select2."""
+        Vehiculo.objects.bulk_create([
+            Vehiculo(cliente=self.andres, placa=f'ABD{i:03d}') for i in range(25)
+        ])
+        primera = self._buscar('autocompletar_vehiculos', term='AB')
+        segunda = self._buscar('autocompletar_vehiculos', term='AB', page=2)
+        self.assertEqual(len(primera['results']), 20)
+        self.assertTrue(primera['pagination']['more'])
+        self.assertEqual(len(segunda['results']), 6)
+        self.assertFalse(segunda['pagination']['more'])
+
+    def test_sin_termino_no_devuelve_resultados(self):
+        """Verifica que sin término de búsqueda no se recorre la tabla."""
+        self.assertEqual(self._buscar('autocompletar_clientes')['results'], [])
+
+    def test_formulario_solo_pinta_la_opcion_seleccionada(self):
+        """Verifica que el formulario de vehículo no carga todos los clientes."""
+        response = self.client.get(reverse('dashboard_admin:editar_vehiculo', args=[self.vehiculo.pk]))
+        self.assertContains(response, f'<option value="{self.ana.pk}" selected>')
+        self.assertNotContains(response, f'<option value="{self.andres.pk}"')
+        self.assertContains(response, reverse('dashboard_admin:autocompletar_clientes'))
+
+    def test_solo_para_staff(self):
+        """Verifica que un cliente no puede consultar el autocompletar."""
+        self.client.force_login(self.ana)
+        response = self.client.get(reverse('dashboard_admin:autocompletar_clientes'), {'term': 'an'})
+        self.assertEqual(response.status_code, 302)
+
+
+class DirectorioClientesTest(TestCase):
+    """Tests para el directorio de clientes (búsqueda, paginación y columnas anotadas)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin_directorio', password='testpass123', is_staff=True)
+        cls.clientes = [
+            User.objects.create_user(
+                username=f'cliente{i:02d}', first_name=f'Nombre{i:02d}', email=f'cliente{i:02d}@test.com',
+                password='testpass123'
+            )
+            for i in range(30)
+        ]
+        cls.clientes[0].perfilcliente.cedula = '71234567'
+        cls.clientes[0].perfilcliente.save()
+
+        tipo = TipoSeguro.objects.create(
+            nombre='Seguro Directorio', comision_porcentaje=Decimal('10.00'), porcentaje_iva=Decimal('19.00')
+        )
+        compania = CompaniaAseguradora.objects.create(nombre='Compañía Directorio')
+        for i, estado_cartera in enumerate(['AL_DIA', 'EN_MORA']):
+            Poliza.objects.create(
+                cliente=cls.clientes[0], tipo_seguro=tipo, compania_aseguradora=compania,
+                numero_poliza=f'DIR-{i}', fecha_inicio=date(2025, 1, 1), fecha_fin=date(2026, 1, 1),
+                valor_prima_sin_iva=Decimal('1000000.00'), modo_pago='CONTADO', estado_cartera=estado_cartera
+            )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_pagina_con_consultas_constantes(self):
+        """Verifica que la página no hace una consulta por cliente para el perfil ni las pólizas."""
+        url = reverse('dashboard_admin:lista_clientes')
+        self.client.get(url)  # Sesión y usuario ya en caché de la prueba
+        with self.assertNumQueries(4):
+            # sesión, usuario, conteo con tope y la página de clientes
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['clientes']), 25)
+        self.assertTrue(response.context['page_obj'].has_next)
+
+        primero = response.context['clientes'][0]
+        self.assertEqual(primero.pk, self.clientes[0].pk)
+        self.assertEqual(primero.polizas_activas, 2)
+        self.assertTrue(primero.en_mora)
+        self.assertEqual(response.context['clientes'][1].polizas_activas, 0)
+        self.assertContains(response, '71234567')
+
+    def test_mora_solo_de_polizas_activas(self):
+        """Verifica que una póliza cancelada en mora no marca al cliente como en mora."""
+        Poliza.objects.filter(estado_cartera='EN_MORA').update(estado='CANCELADA')
+        response = self.client.get(reverse('dashboard_admin:lista_clientes'))
+
+        primero = response.context['clientes'][0]
+        self.assertEqual(primero.polizas_activas, 1)
+        self.assertFalse(primero.en_mora)
+
+    def test_busqueda_por_cedula_y_email(self):
+        """Verifica la búsqueda del directorio por prefijo de cédula o de email."""
+        url = reverse('dashboard_admin:lista_clientes')
+        por_cedula = self.client.get(url, {'q': '7123'})
+        por_email = self.client.get(url, {'q': 'cliente1'})
+        self.assertEqual([c.pk for c in por_cedula.context['clientes']], [self.clientes[0].pk])
+        self.assertEqual(
+            [c.pk for c in por_email.context['clientes']],
+            [c.pk for c in self.clientes[10:20]]
+        )
+
+    def test_segunda_pagina_conserva_la_busqueda(self):
+        """Verifica que el cursor de la página siguiente mantiene el término buscado."""
+        url = reverse('dashboard_admin:lista_clientes')
+        primera = self.client.get(url, {'q': 'nombre'})
+        segunda = self.client.get(f"{url}?{primera.context['page_obj'].query_siguiente}")
+        self.assertEqual(segunda.context['busqueda'], 'nombre')
+        self.assertEqual([c.pk for c in segunda.context['clientes']], [c.pk for c in self.clientes[25:]])
+
+
+class BusquedaGlobalTest(TestCase):
+    """Tests para la búsqueda global con vectores de texto completo."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin_busqueda', first_name='Carolina', password='testpass123', is_staff=True)
+        cls.cliente = User.objects.create_user(
+            username='crodriguez', first_name='Carolina', last_name='Rodríguez',
+            email='carolina@test.com', password='testpass123'
+        )
+        cls.cliente.perfilcliente.cedula = '43210987'
+        cls.cliente.perfilcliente.save()
+        cls.vehiculo = Vehiculo.objects.create(cliente=cls.cliente, placa='KLM456', marca='Mazda', modelo='CX-5')
+        cls.poliza = Poliza.objects.create(
+            cliente=cls.cliente,
+            tipo_seguro=TipoSeguro.objects.create(
+                nombre='Seguro Búsqueda', comision_porcentaje=Decimal('10.00'), porcentaje_iva=Decimal('19.00')
+            ),
+            compania_aseguradora=CompaniaAseguradora.objects.create(nombre='Compañía Búsqueda'),
+            numero_poliza='BUS-7788',
+            vehiculo=cls.vehiculo,
+            fecha_inicio=date(2025, 1, 1),
+            fecha_fin=date(2026, 1, 1),
+            valor_prima_sin_iva=Decimal('1000000.00'),
+            modo_pago='CONTADO'
+        )
+        cls.siniestro = Siniestro.objects.create(
+            poliza=cls.poliza, numero_siniestro='SIN-55', fecha_siniestro=date(2025, 6, 1),
+            descripcion='Choque trasero en la autopista, daños en el parachoques'
+        )
+
+    def _tipos(self, texto):
+        return [(r['tipo'], r['id']) for r in buscar(texto)]
+
+    def test_encuentra_cada_tipo(self):
+        """Verifica que se encuentran clientes, pólizas, vehículos y siniestros por prefijo."""
+        self.assertEqual(self._tipos('carol rodr'), [('cliente', self.cliente.pk)])
+        self.assertEqual(self._tipos('4321'), [('cliente', self.cliente.pk)])
+        self.assertEqual(self._tipos('bus 7788'), [('poliza', self.poliza.pk)])
+        self.assertEqual(self._tipos('parachoques'), [('siniestro', self.siniestro.pk)])
+        self.assertCountEqual(
+            self._tipos('klm456'),
+            [('vehiculo', self.vehiculo.pk), ('poliza', self.poliza.pk)]
+        )
+
+    def test_no_incluye_administradores(self):
+        """Verifica que los usuarios staff no aparecen como clientes."""
+        self.assertNotIn(('cliente', self.admin.pk), self._tipos('carolina'))
+
+    def test_una_sola_consulta(self):
+        """Verifica que las cuatro tablas se consultan en un solo viaje a la base."""
+        with self.assertNumQueries(1):
+            buscar('carolina')
+
+    def test_vectores_se_actualizan_al_guardar(self):
+        """Verifica que editar un usuario o la placa del vehículo actualiza los vectores."""
+        self.cliente.last_name = 'Montoya'
+        self.cliente.save()
+        self.assertEqual(self._tipos('montoya'), [('cliente', self.cliente.pk)])
+
+        self.vehiculo.placa = 'XYZ999'
+        self.vehiculo.save()
+        self.assertCountEqual(
+            self._tipos('xyz999'),
+            [('vehiculo', self.vehiculo.pk), ('poliza', self.poliza.pk)]
+        )
+        self.assertEqual(self._tipos('klm456'), [])
+
+    def test_update_fields_sin_campos_de_busqueda_no_recalcula(self):
+        """Verifica que un save() con update_fields ajenos a la búsqueda no toca el vector."""
+        Poliza.objects.filter(pk=self.poliza.pk).update(busqueda=None)
+        self.poliza.estado_cartera = 'EN_MORA'
+        self.poliza.save(update_fields=['estado_cartera'])
+        self.assertIsNone(Poliza.objects.get(pk=self.poliza.pk).busqueda)
+
+    def test_comando_reconstruye_vectores(self):
+        """Verifica que actualizar_busqueda calcula los vectores que faltan."""
+        Siniestro.objects.update(busqueda=None)
+        self.assertEqual(self._tipos('parachoques'), [])
+        call_command('actualizar_busqueda', '--solo-vacios', stdout=StringIO())
+        self.assertEqual(self._tipos('parachoques'), [('siniestro', self.siniestro.pk)])
+
+    def test_texto_sin_terminos_validos(self):
+        """Verifica que la sintaxis de tsquery en el texto no rompe la búsqueda."""
+        self.assertEqual(buscar("a & | ! ' :*"), [])
+
+    def test_endpoint(self):
+        """Verifica la respuesta JSON del endpoint con la URL de cada resultado."""
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('dashboard_admin:busqueda_global'), {'q': 'SIN-55'})
+        self.assertEqual(response.status_code, 200)
+        resultado = response.json()['results'][0]
+        self.assertEqual(resultado['tipo'], 'siniestro')
+        self.assertEqual(resultado['url'], reverse('dashboard_admin:detalle_siniestro', args=[self.siniestro.pk]))
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN con enable_seqscan solo aplica a PostgreSQL')
+class ExportacionCSVTest(TestCase):
+    """Tests para la exportación a CSV de cartera, liquidaciones y cuotas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin_exportacion', password='testpass123', is_staff=True)
+        cls.cliente = User.objects.create_user(
+            username='cliente_exportacion', first_name='Carmen', last_name='Núñez', password='testpass123'
+        )
+        otro = User.objects.create_user(username='otro_exportacion', password='testpass123')
+        tipo = TipoSeguro.objects.create(
+            nombre='Seguro Exportación', comision_porcentaje=Decimal('10.00'), porcentaje_iva=Decimal('19.00')
+        )
+        compania = CompaniaAseguradora.objects.create(nombre='Compañía Exportación')
+        cls.poliza = Poliza.objects.create(
+            cliente=cls.cliente, tipo_seguro=tipo, compania_aseguradora=compania,
+            numero_poliza='EXP-001', fecha_inicio=date(2025, 1, 1), fecha_fin=date(2026, 1, 1),
+            valor_prima_sin_iva=Decimal('1200000.00'), modo_pago='MENSUAL', plazo_meses=12
+        )
+        Poliza.objects.create(
+            cliente=otro, tipo_seguro=tipo, compania_aseguradora=compania,
+            numero_poliza='EXP-002', fecha_inicio=date(2025, 2, 1), fecha_fin=date(2026, 2, 1),
+            valor_prima_sin_iva=Decimal('500000.00'), modo_pago='CONTADO'
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _leer(self, response):
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertTrue(response.streaming)
+        contenido = b''.join(response.streaming_content).decode('utf-8-sig')
+        return list(csv.DictReader(contenido.splitlines()))
+
+    def test_cartera_respeta_filtro_y_calcula_en_sql(self):
+        """Verifica que la cartera exporta solo el cliente filtrado, con IVA, total y comisión."""
+        response = self.client.get(
+            reverse('dashboard_admin:cartera_general'), {'cliente': self.cliente.pk, 'exportar': 'csv'}
+        )
+        self.assertIn('attachment; filename="cartera_', response['Content-Disposition'])
+        filas = self._leer(response)
+
+        self.assertEqual(len(filas), 1)
+        fila = filas[0]
+        self.assertEqual(fila['Póliza'], 'EXP-001')
+        self.assertEqual(fila['Cliente'], 'Carmen Núñez')
+        self.assertEqual(fila['Modalidad'], 'Pago Mensual')
+        self.assertEqual(Decimal(fila['IVA']), Decimal('228000.00'))
+        self.assertEqual(Decimal(fila['Total a Pagar']), Decimal('1428000.00'))
+        self.assertEqual(Decimal(fila['Comisión']), Decimal('120000.00'))
+
+    def test_liquidaciones_respeta_filtros(self):
+        """Verifica que las liquidaciones exportan los pagos del rango de fechas pedido."""
+        Pago.objects.create(poliza=self.poliza, fecha_pago=date(2025, 1, 15), monto_pagado=Decimal('10000.00'))
+        Pago.objects.create(poliza=self.poliza, fecha_pago=date(2025, 2, 15), monto_pagado=Decimal('10000.00'))
+        response = self.client.get(reverse('dashboard_admin:liquidacion_comisiones'), {
+            'fecha_inicio': '2025-01-01', 'fecha_fin': '2025-01-31', 'exportar': 'csv'
+        })
+        filas = self._leer(response)
+        self.assertEqual(len(filas), 1)
+        self.assertEqual(filas[0]['Estado'], 'Pendiente de Liquidar')
+        self.assertEqual(Decimal(filas[0]['Total a Pagar']), Decimal('1428000.00'))
+
+    def test_cuotas_de_la_poliza(self):
+        """Verifica que el detalle de cartera exporta las cuotas de la póliza con su comisión."""
+        response = self.client.get(
+            reverse('dashboard_admin:detalle_cartera_poliza', kwargs={'pk': self.poliza.pk}), {'exportar': 'csv'}
+        )
+        filas = self._leer(response)
+
+        self.assertEqual([fila['# Cuota'] for fila in filas], [str(i) for i in range(1, 13)])
+        self.assertEqual(Decimal(filas[0]['Monto']), Decimal('100000.00'))
+        self.assertEqual(Decimal(filas[0]['Comisión']), Decimal('10000.00'))
+        self.assertEqual(filas[0]['Estado'], 'Pendiente')
+
+    def test_cuotas_sin_tarifa_congelada_usan_la_del_tipo(self):
+        """Verifica que la comisión de las cuotas usa la tarifa del tipo si la póliza no la tiene congelada."""
+        Poliza.objects.filter(pk=self.poliza.pk).update(comision_porcentaje=None)
+        response = self.client.get(
+            reverse('dashboard_admin:detalle_cartera_poliza', kwargs={'pk': self.poliza.pk}), {'exportar': 'csv'}
+        )
+        self.assertEqual(Decimal(self._leer(response)[0]['Comisión']), Decimal('10000.00'))
+
+    def test_solo_staff(self):
+        """Verifica que un cliente no puede exportar."""
+        self.client.force_login(self.cliente)
+        response = self.client.get(reverse('dashboard_admin:cartera_general'), {'exportar': 'csv'})
+        self.assertEqual(response.status_code, 403)
+
+
+class LiquidacionEnBloqueViewTest(TestCase):
+    """Tests para la liquidación en bloque desde la vista de liquidaciones."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin_lote_vista', password='testpass123', is_staff=True)
+        cliente = User.objects.create_user(username='cliente_lote_vista', password='testpass123')
+        tipo = TipoSeguro.objects.create(
+            nombre='Seguro Lote Vista', comision_porcentaje=Decimal('10.00'), porcentaje_iva=Decimal('19.00')
+        )
+        cls.sura = CompaniaAseguradora.objects.create(nombre='Sura Lote')
+        cls.bolivar = CompaniaAseguradora.objects.create(nombre='Bolívar Lote')
+        polizas = [
+            Poliza.objects.create(
+                cliente=cliente, tipo_seguro=tipo, compania_aseguradora=compania,
+                numero_poliza=f'LV-{indice}', fecha_inicio=date(2025, 1, 1), fecha_fin=date(2026, 1, 1),
+                valor_prima_sin_iva=Decimal('1000000.00'), modo_pago='MENSUAL', plazo_meses=12
+            )
+            for indice, compania in enumerate([cls.sura, cls.bolivar])
+        ]
+        cls.pagos_sura = [
+            Pago.objects.create(poliza=polizas[0], fecha_pago=date(2025, 4, dia), monto_pagado=Decimal('1000.00'))
+            for dia in (1, 2)
+        ]
+        cls.pago_bolivar = Pago.objects.create(poliza=polizas[1], fecha_pago=date(2025, 4, 3), monto_pagado=Decimal('1000.00'))
+        cls.url = reverse('dashboard_admin:liquidar_comisiones_lote')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_liquida_el_filtro_actual(self):
+        """Verifica que se liquidan los pagos de la compañía filtrada y se vuelve al mismo filtro."""
+        response = self.client.post(self.url, {'alcance': 'filtro', 'compania_id': self.sura.pk})
+
+        self.assertRedirects(
+            response, f"{reverse('dashboard_admin:liquidacion_comisiones')}?compania_id={self.sura.pk}"
+        )
+        self.assertEqual(Pago.objects.filter(estado_comision='LIQUIDADA').count(), 2)
+        self.pago_bolivar.refresh_from_db()
+        self.assertEqual(self.pago_bolivar.estado_comision, 'PENDIENTE')
+
+        response = self.client.get(response.url)
+        self.assertContains(response, 'Compañía: Sura Lote')
+        self.assertContains(response, 'Revertir lote')
+
+    def test_liquida_solo_la_seleccion(self):
+        """Verifica que con alcance=seleccion solo se liquidan los pagos marcados."""
+        self.client.post(self.url, {'alcance': 'seleccion', 'pagos': [self.pagos_sura[0].pk, 'x']})
+
+        self.assertEqual(
+            list(Pago.objects.filter(estado_comision='LIQUIDADA').values_list('pk', flat=True)),
+            [self.pagos_sura[0].pk]
+        )
+
+    def test_revertir_lote(self):
+        """Verifica que el lote se revierte desde la vista."""
+        self.client.post(self.url, {'alcance': 'filtro'})
+        lote = LoteLiquidacion.objects.get()
+
+        self.client.post(reverse('dashboard_admin:revertir_lote_liquidacion', kwargs={'pk': lote.pk}))
+
+        self.assertFalse(Pago.objects.filter(estado_comision='LIQUIDADA').exists())
+        lote.refresh_from_db()
+        self.assertTrue(lote.revertido)
+
+    def test_desmarcar_saca_el_pago_del_lote(self):
+        """Verifica que un pago desmarcado a mano deja de pertenecer a su lote."""
+        self.client.post(self.url, {'alcance': 'filtro'})
+        pago = self.pagos_sura[0]
+
+        self.client.post(reverse('dashboard_admin:desmarcar_comision_liquidada', kwargs={'pk': pago.pk}))
+
+        pago.refresh_from_db()
+        self.assertEqual(pago.estado_comision, 'PENDIENTE')
+        self.assertIsNone(pago.lote_liquidacion)
+
+    def test_generar_estado_cuenta(self):
+        """Verifica que el botón de estado de cuenta encola la tarea del lote."""
+        self.client.post(self.url, {'alcance': 'filtro'})
+        lote = LoteLiquidacion.objects.get()
+
+        with patch('cartera.tasks.generar_estado_cuenta_lote.delay') as delay_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('dashboard_admin:generar_estado_cuenta_lote', kwargs={'pk': lote.pk}))
+        delay_mock.assert_called_once_with(lote.pk)
+
+        response = self.client.get(reverse('dashboard_admin:liquidacion_comisiones'))
+        self.assertContains(response, 'Sura Lote / Seguro Lote Vista:')
+
+    def test_filtro_invalido(self):
+        """Verifica que una fecha inválida no liquida nada."""
+        self.client.post(self.url, {'alcance': 'filtro', 'fecha_inicio': 'no-es-fecha'})
+        self.assertFalse(LoteLiquidacion.objects.exists())
+
+
+class ImportarPolizasViewTest(TestCase):
+    """Tests para la página de importación masiva de pólizas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin_importacion', password='testpass123', is_staff=True)
+        cls.cliente = User.objects.create_user(username='cliente_importacion', password='testpass123')
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def test_solo_staff(self):
+        """Verifica que un cliente no puede entrar a la página de importación."""
+        self.client.force_login(self.cliente)
+        response = self.client.get(reverse('dashboard_admin:importar_polizas'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_subir_archivo_programa_la_tarea_al_confirmar(self):
+        """Verifica que subir un CSV crea la importación y encola la tarea tras el commit."""
+        self.client.force_login(self.admin)
+        archivo = SimpleUploadedFile('polizas.csv', b'numero_poliza\n', content_type='text/csv')
+
+        with patch('polizas.tasks.importar_polizas_task.delay') as delay_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('dashboard_admin:importar_polizas'), {'archivo': archivo})
+
+        self.assertRedirects(response, reverse('dashboard_admin:importar_polizas'))
+        importacion = ImportacionPolizas.objects.get()
+        self.assertEqual(importacion.estado, 'PENDIENTE')
+        self.assertEqual(importacion.creado_por, self.admin)
+        delay_mock.assert_called_once_with(importacion.pk)
+
+        response = self.client.get(reverse('dashboard_admin:importar_polizas'))
+        self.assertContains(response, 'Pendiente')
+
+    def test_rechaza_archivos_que_no_son_csv(self):
+        """Verifica que solo se aceptan archivos .csv."""
+        self.client.force_login(self.admin)
+        archivo = SimpleUploadedFile('polizas.xlsx', b'x')
+        response = self.client.post(reverse('dashboard_admin:importar_polizas'), {'archivo': archivo})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '.csv')
+        self.assertFalse(ImportacionPolizas.objects.exists())
+
+
+class PlanesDeConsultaTest(TestCase):
+    """
+    Verifica con EXPLAIN que las consultas de los dashboards pueden usar un
+    índice. Con enable_seqscan=off, Postgres solo hace un Seq Scan si no
+    tiene ningún índice que sirva para el WHERE.
+    """
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertSinSeqScan(self, queryset):
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan, plan)
+
+    def test_polizas_por_vencer(self):
+        hoy = date.today()
+        self.assertSinSeqScan(Poliza.objects.filter(
+            estado='ACTIVA', fecha_fin__gte=hoy, fecha_fin__lte=hoy + timedelta(days=30)
+        ).order_by('fecha_fin'))
+
+    def test_soat_por_vencer(self):
+        hoy = date.today()
+        self.assertSinSeqScan(Vehiculo.objects.filter(
+            soat_vencimiento_recordatorio__gte=hoy,
+            soat_vencimiento_recordatorio__lte=hoy + timedelta(days=15)
+        ))
+
+    def test_kpis_de_liquidaciones(self):
+        self.assertSinSeqScan(Pago.objects.filter(
+            estado_comision='PENDIENTE', **filtro_mes('fecha_pago', 2025, 3)
+        ))
+
+    def test_reporte_por_asesor(self):
+        self.assertSinSeqScan(Poliza.objects.filter(asesor_id=1, **filtro_mes('fecha_inicio', 2025, 3)))
+
+    def test_paginacion_por_cursor(self):
+        self.assertSinSeqScan(Pago.objects.filter(
+            fecha_pago__lt=date(2025, 3, 1)
+        ).order_by('-fecha_pago', '-id')[:16])
+
+    def test_autocompletar_por_prefijo(self):
+        self.assertSinSeqScan(Vehiculo.objects.filter(placa__istartswith='ABC'))
+        self.assertSinSeqScan(Poliza.objects.filter(numero_poliza__istartswith='AUTO'))
+
+    def test_directorio_de_clientes(self):
+        with connection.cursor() as cursor:
+            for sql in INDICES_PREFIJO_USUARIOS:
+                # CONCURRENTLY no se permite dentro de la transacción de la prueba
+                cursor.execute(sql.replace(' CONCURRENTLY', ''))
+        plan = filtrar_clientes(User.objects.all(), ['car']).explain()
+        self.assertNotIn('Seq Scan', plan, plan)
+        for indice in ('usuario_first_name_prefijo_idx', 'usuario_email_prefijo_idx', 'perfil_cedula_prefijo_idx'):
+            self.assertIn(indice, plan)
+
+    def test_busqueda_global(self):
+        consulta = construir_consulta('carolina')
+        self.assertSinSeqScan(PerfilCliente.objects.filter(busqueda=consulta))
+        self.assertSinSeqScan(Siniestro.objects.filter(busqueda=consulta))
+
+    def test_deteccion_de_mora(self):
+        self.assertSinSeqScan(Cuota.objects.filter(
+            estado='PENDIENTE', fecha_vencimiento__lt=date.today()
+        ))
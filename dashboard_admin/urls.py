@@ -32,13 +32,22 @@ from .views import (
     VehiculoUpdateView,
     add_documento_view,
     add_foto_view, 
+    autocompletar_clientes_view,
+    autocompletar_polizas_view,
+    autocompletar_vehiculos_view,
+    busqueda_global_view,
+    cancelar_polizas_lote_view,
     dashboard_home_view,
     delete_documento_view,
     delete_foto_view,
     desmarcar_comision_liquidada_view,
+    generar_estado_cuenta_lote_view,
+    importar_polizas_view,
+    liquidar_comisiones_lote_view,
     marcar_comision_liquidada_view,
     marcar_cuota_mora_view,
     marcar_cuota_pagada_view,
+    revertir_lote_liquidacion_view,
     revertir_pago_cuota_view,
     test_select2_view
 )
@@ -56,6 +65,8 @@ urlpatterns = [
     path('clientes/<int:pk>/polizas/', ClientPolicyListView.as_view(), name='lista_polizas_cliente'),
     path('clientes/<int:pk>/polizas/nueva/', PolicyCreateView.as_view(), name='crear_poliza_cliente'),
     path('polizas/editar/<int:pk>/', PolicyUpdateView.as_view(), name='editar_poliza'),
+    path('polizas/importar/', importar_polizas_view, name='importar_polizas'),
+    path('polizas/cancelar-en-bloque/', cancelar_polizas_lote_view, name='cancelar_polizas_lote'),
     path('tipos-de-seguro/', TipoSeguroListView.as_view(), name='lista_tipos_seguro'),
     path('tipos-de-seguro/nuevo/', TipoSeguroCreateView.as_view(), name='crear_tipo_seguro'),
     path('companias/', CompaniaAseguradoraListView.as_view(), name='lista_companias'),
@@ -76,11 +87,18 @@ urlpatterns = [
     path('vehiculos/eliminar/<int:pk>/', VehiculoDeleteView.as_view(), name='eliminar_vehiculo'),
     
     path('test-select2/', test_select2_view, name='test_select2'),
+    path('autocompletar/clientes/', autocompletar_clientes_view, name='autocompletar_clientes'),
+    path('autocompletar/polizas/', autocompletar_polizas_view, name='autocompletar_polizas'),
+    path('autocompletar/vehiculos/', autocompletar_vehiculos_view, name='autocompletar_vehiculos'),
+    path('buscar/', busqueda_global_view, name='busqueda_global'),
 
 
     path('liquidaciones/', LiquidacionComisionesView.as_view(), name='liquidacion_comisiones'),
     path('pagos/<int:pk>/marcar-liquidada/', marcar_comision_liquidada_view, name='marcar_comision_liquidada'),
     path('pagos/<int:pk>/desmarcar-liquidada/', desmarcar_comision_liquidada_view, name='desmarcar_comision_liquidada'),
+    path('liquidaciones/liquidar-lote/', liquidar_comisiones_lote_view, name='liquidar_comisiones_lote'),
+    path('liquidaciones/lotes/<int:pk>/revertir/', revertir_lote_liquidacion_view, name='revertir_lote_liquidacion'),
+    path('liquidaciones/lotes/<int:pk>/estado-cuenta/', generar_estado_cuenta_lote_view, name='generar_estado_cuenta_lote'),
 
 
     path('siniestros/', SiniestroListView.as_view(), name='lista_siniestros'),
@@ -1,30 +1,42 @@
 # dashboard_admin/views.py
 import logging
-from django.http import Http404
+from django.http import Http404, JsonResponse
 from django.shortcuts import render
 from django.views.generic import ListView,  CreateView, UpdateView, UpdateView, DeleteView, DetailView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.utils.http import urlencode
+from django.contrib import messages
+from django.core.exceptions import ValidationError
 from django.shortcuts import redirect, get_object_or_404
 from django.views.decorators.http import require_POST
-from polizas.models import Asesor, Poliza, TipoSeguro, CompaniaAseguradora, Vehiculo
+from polizas.models import Asesor, ImportacionPolizas, Poliza, PolizaQuerySet, TipoSeguro, CompaniaAseguradora, Vehiculo
+from usuarios.models import PerfilCliente
+from polizas.cancelacion import cancelar_polizas, resumir_cancelacion
+from polizas.importacion import COLUMNAS_OBLIGATORIAS, COLUMNAS_OPCIONALES
 from polizas.forms import PolicyForm
-from .forms import AsesorForm, CancelPolicyForm, DocumentoSiniestroForm, FotoSiniestroForm, VehiculoForm
+from polizas.correo import encolar_correo
+from .forms import AsesorForm, CancelacionEnBloqueForm, CancelPolicyForm, DocumentoSiniestroForm, FotoSiniestroForm, ImportacionPolizasForm, VehiculoForm
 from .forms import ClientCreationForm, ClientUpdateForm, TipoSeguroForm, CompaniaAseguradoraForm
 from datetime import date, datetime, timedelta
 from django.utils import timezone
-from django.core.mail import EmailMessage
-from django.template.loader import render_to_string
 from django.conf import settings
-from django.db.models import Sum, Q
+from django.db import transaction
+from django.db.models import CharField, DecimalField, Exists, ExpressionWrapper, F, OuterRef, Subquery, Sum, Q, Value
+from django.db.models.functions import Coalesce, Concat
 import json
 from django.db.models.functions import TruncMonth
 from django.db.models import Count
-from cartera.models import Cuota, Pago
+from cartera.liquidacion import desmarcar_pago, liquidar_pagos, programar_estado_cuenta, revertir_lote
+from cartera.models import Cuota, LoteLiquidacion, Pago
+from reportes.fechas import filtro_mes
 from siniestros.models import Siniestro, TipoSiniestro
 from .forms import SiniestroForm
+from .busqueda import buscar
+from .exportacion import ExportarCSVMixin, etiqueta
+from .paginacion import KeysetPaginationMixin
 from siniestros.models import DocumentoSiniestro, FotoSiniestro
 
 logger = logging.getLogger('dashboard_admin')
@@ -78,10 +90,31 @@ def dashboard_home_view(request):
 
 
 
-class ClientListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
+def filtrar_clientes(queryset, terminos):
+    """
+    Cada término debe ser prefijo del nombre, apellido, usuario, email o
+    cédula. Lo usan el directorio de clientes y el autocompletar.
+    """
+    for termino in terminos:
+        # Un OR entre auth_user y el perfil unido no puede usar índices: se buscan
+        # los ids en cada tabla (índices de prefijo) y se unen con UNION
+        por_usuario = User.objects.filter(
+            Q(first_name__istartswith=termino) |
+            Q(last_name__istartswith=termino) |
+            Q(username__istartswith=termino) |
+            Q(email__istartswith=termino)
+        ).values('pk')
+        por_cedula = PerfilCliente.objects.filter(cedula__istartswith=termino).values('usuario_id')
+        queryset = queryset.filter(pk__in=por_usuario.union(por_cedula))
+    return queryset
+
+
+class ClientListView(LoginRequiredMixin, UserPassesTestMixin, KeysetPaginationMixin, ListView):
     model = User
     template_name = 'dashboard_admin/client_list.html'
     context_object_name = 'clientes'
+    paginate_by = 25
+    orden_keyset = ('first_name', 'last_name', 'id')
 
     def test_func(self):
         """
@@ -93,9 +126,25 @@ class ClientListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
     def get_queryset(self):
         """
         Sobrescribimos el queryset para excluir a otros administradores
-        de la lista de "clientes".
+        de la lista de "clientes". El perfil viene en el mismo JOIN y las
+        columnas de pólizas activas y mora son subconsultas por fila, así la
+        página cuesta las mismas consultas sin importar cuántos clientes haya.
         """
-        return User.objects.filter(is_staff=False).order_by('first_name', 'last_name')
+        # Subconsultas correlacionadas y no un JOIN agrupado: con la paginación por
+        # cursor solo se evalúan para los clientes de la página
+        polizas_activas = Poliza.objects.filter(cliente=OuterRef('pk'), estado='ACTIVA')
+        total_activas = polizas_activas.order_by().values('cliente').annotate(total=Count('id')).values('total')
+
+        queryset = User.objects.filter(is_staff=False).select_related('perfilcliente').annotate(
+            polizas_activas=Coalesce(Subquery(total_activas), 0),
+            en_mora=Exists(polizas_activas.filter(estado_cartera='EN_MORA'))
+        )
+        return filtrar_clientes(queryset, self.request.GET.get('q', '').split()[:5])
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['busqueda'] = self.request.GET.get('q', '')
+        return context
 
 
 class ClientCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
@@ -394,105 +443,213 @@ class PolicyCancelView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
     
 
     def form_valid(self, form):
-        poliza = form.save(commit=False)
-        poliza.estado = 'CANCELADA'
-        poliza.fecha_cancelacion = timezone.now().date()
-
-        if poliza.modo_pago == 'CONTADO':
-            devolucion, comision_devuelta = poliza.calcular_prorrateo_cancelacion()
-            if devolucion is not None:
-                poliza.monto_devolucion = devolucion
-                poliza.comision_devuelta = comision_devuelta
-
-                try:
-                    # Buscamos el registro de Pago original
-                    pago_a_modificar = Pago.objects.get(poliza=poliza, cuota__isnull=True)
-                    
-                    # Calculamos la comisión que realmente se ganó
-                    comision_real_ganada = poliza.valor_comision - comision_devuelta
-                    
-                    # Actualizamos el monto del pago para que refleje la comisión real
-                    pago_a_modificar.monto_pagado = comision_real_ganada
-                    pago_a_modificar.save()
-
-                except Pago.DoesNotExist:
-                    logger.warning(
-                        f"No se encontró registro de Pago para ajustar en cancelación "
-                        f"de póliza #{poliza.numero_poliza}"
-                    )
-                except Exception as e:
-                    logger.exception(
-                        f"Error al ajustar pago tras cancelación de póliza "
-                        f"#{poliza.numero_poliza}: {e}"
-                    )
+        # La cancelación, el ajuste del pago y los correos en la bandeja de
+        # salida se guardan juntos: si algo falla, no queda nada a medias.
+        with transaction.atomic():
+            poliza = form.save(commit=False)
+            poliza.estado = 'CANCELADA'
+            poliza.fecha_cancelacion = timezone.now().date()
 
-        # Guardamos la póliza con todos los cambios (estado, fecha, montos de devolución)
-        poliza.save()
-        
-        # --- LÓGICA DE ENVÍO DE CORREOS DE CANCELACIÓN ---
+            if poliza.modo_pago == 'CONTADO':
+                devolucion, comision_devuelta = poliza.calcular_prorrateo_cancelacion()
+                if devolucion is not None:
+                    poliza.monto_devolucion = devolucion
+                    poliza.comision_devuelta = comision_devuelta
+
+                    try:
+                        # Savepoint propio: si el ajuste falla, la transacción sigue
+                        # utilizable y la cancelación se guarda igual
+                        with transaction.atomic():
+                            # Buscamos el registro de Pago original
+                            pago_a_modificar = Pago.objects.get(poliza=poliza, cuota__isnull=True)
+
+                            # Calculamos la comisión que realmente se ganó
+                            comision_real_ganada = poliza.valor_comision - comision_devuelta
+
+                            # Actualizamos el monto del pago para que refleje la comisión real
+                            pago_a_modificar.monto_pagado = comision_real_ganada
+                            pago_a_modificar.save()
+
+                    except Pago.DoesNotExist:
+                        logger.warning(
+                            f"No se encontró registro de Pago para ajustar en cancelación "
+                            f"de póliza #{poliza.numero_poliza}"
+                        )
+                    except Exception as e:
+                        logger.exception(
+                            f"Error al ajustar pago tras cancelación de póliza "
+                            f"#{poliza.numero_poliza}: {e}"
+                        )
+
+            # Guardamos la póliza con todos los cambios (estado, fecha, montos de devolución)
+            poliza.save()
+
+            # --- CORREOS DE CANCELACIÓN ---
+            # Solo se encolan; despachar_bandeja_salida los envía en segundo
+            # plano, así la cancelación no espera al servidor SMTP.
+            self._encolar_correos_cancelacion(poliza)
+
+            # El super().form_valid() llama al .save() del formulario original
+            return super().form_valid(form)
+
+    def _encolar_correos_cancelacion(self, poliza):
+        contexto_email = {'poliza': poliza}
         try:
-            contexto_email = {'poliza': poliza}
-
-            # Correo para el Cliente
-            cuerpo_html_cliente = render_to_string('emails/cancelacion_poliza_cliente.html', contexto_email)
-            asunto_cliente = f"Confirmación de Cancelación de tu Póliza #{poliza.numero_poliza}"
-            email_cliente = EmailMessage(
-                asunto_cliente,
-                cuerpo_html_cliente,
-                settings.DEFAULT_FROM_EMAIL,
-                [poliza.cliente.email]
-            )
-            email_cliente.content_subtype = "html"
-            email_cliente.send()
-            logger.info(
-                f"Correo de cancelación enviado a cliente {poliza.cliente.email} "
-                f"para póliza #{poliza.numero_poliza}"
-            )
-
-            # Correo para el Admin
-            if settings.ADMIN_EMAIL:
-                cuerpo_html_admin = render_to_string('emails/cancelacion_poliza_admin.html', contexto_email)
-                asunto_admin = f"Notificación: Póliza Cancelada - {poliza.cliente.get_full_name()}"
-                email_admin = EmailMessage(
-                    asunto_admin,
-                    cuerpo_html_admin,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [settings.ADMIN_EMAIL]
+            # Savepoint propio: un error al encolar no debe revertir la cancelación
+            with transaction.atomic():
+                # Correo para el Cliente
+                encolar_correo(
+                    f"Confirmación de Cancelación de tu Póliza #{poliza.numero_poliza}",
+                    'emails/cancelacion_poliza_cliente.html',
+                    contexto_email,
+                    [poliza.cliente.email]
                 )
-                email_admin.content_subtype = "html"
-                email_admin.send()
-                logger.info(f"Notificación de cancelación enviada a admin para póliza #{poliza.numero_poliza}")
+
+                # Correo para el Admin
+                if settings.ADMIN_EMAIL:
+                    encolar_correo(
+                        f"Notificación: Póliza Cancelada - {poliza.cliente.get_full_name()}",
+                        'emails/cancelacion_poliza_admin.html',
+                        contexto_email,
+                        [settings.ADMIN_EMAIL]
+                    )
+
+            logger.info(f"Correos de cancelación encolados para póliza #{poliza.numero_poliza}")
 
         except Exception as e:
             logger.exception(
-                f"Error al enviar correos de cancelación para póliza #{poliza.numero_poliza} "
+                f"Error al encolar correos de cancelación para póliza #{poliza.numero_poliza} "
                 f"(cliente: {poliza.cliente.email}): {e}"
             )
             # No re-lanzamos la excepción para no interrumpir el flujo de cancelación
-            # ya que la póliza ya fue cancelada correctamente
-
-        # El super().form_valid() llama al .save() del formulario original
-        return super().form_valid(form)
 
     def get_success_url(self):
         cliente_pk = self.object.cliente.pk
         return reverse_lazy('dashboard_admin:lista_polizas_cliente', kwargs={'pk': cliente_pk})
 
 
+def _cliente_seleccionado(cliente_id):
+    """Cliente elegido en un filtro, para pintar su única <option>."""
+    if not cliente_id or not str(cliente_id).isdigit():
+        return None
+    return User.objects.filter(pk=cliente_id, is_staff=False).first()
+
+
+#IMPORTACIÓN MASIVA
+
+@login_required
+@user_passes_test(es_admin)
+def importar_polizas_view(request):
+    """
+    Sube un CSV de pólizas y lo deja en cola; la tarea importar_polizas_task
+    lo procesa en segundo plano. La página muestra las últimas importaciones.
+    """
+    if request.method == 'POST':
+        form = ImportacionPolizasForm(request.POST, request.FILES)
+        if form.is_valid():
+            with transaction.atomic():
+                importacion = ImportacionPolizas.objects.create(
+                    archivo=form.cleaned_data['archivo'],
+                    creado_por=request.user
+                )
+                transaction.on_commit(lambda: _programar_importacion(importacion.pk))
+            return redirect('dashboard_admin:importar_polizas')
+    else:
+        form = ImportacionPolizasForm()
+
+    context = {
+        'form': form,
+        'importaciones': ImportacionPolizas.objects.select_related('creado_por')[:10],
+        'columnas_obligatorias': COLUMNAS_OBLIGATORIAS,
+        'columnas_opcionales': COLUMNAS_OPCIONALES,
+    }
+    return render(request, 'dashboard_admin/importar_polizas.html', context)
+
+
+def _programar_importacion(importacion_id):
+    from polizas.tasks import importar_polizas_task
+
+    try:
+        importar_polizas_task.delay(importacion_id)
+    except Exception as e:
+        logger.error(
+            f"No se pudo encolar la importación de pólizas {importacion_id}: {e}. "
+            f"Se puede procesar con manage.py import_polizas."
+        )
+
+
+@login_required
+@user_passes_test(es_admin)
+def cancelar_polizas_lote_view(request):
+    """
+    Cancela en bloque las pólizas activas de un filtro o de una lista de
+    números. Primero muestra cuántas son y cuánto se devolvería; al
+    confirmar, las cancela en una transacción y encola los correos.
+    """
+    resumen = None
+    if request.method == 'POST':
+        form = CancelacionEnBloqueForm(request.POST)
+        if form.is_valid():
+            polizas = form.polizas()
+            fecha = form.cleaned_data['fecha_cancelacion']
+            if request.POST.get('accion') == 'confirmar':
+                canceladas = cancelar_polizas(polizas, form.cleaned_data['motivo_cancelacion'], fecha)
+                if canceladas:
+                    messages.success(
+                        request,
+                        f"Se cancelaron {len(canceladas)} pólizas ({form.descripcion()}). "
+                        f"Los correos a los clientes se enviarán en segundo plano."
+                    )
+                else:
+                    messages.info(request, "No había pólizas activas con esos criterios.")
+                return redirect('dashboard_admin:cancelar_polizas_lote')
+            resumen = resumir_cancelacion(polizas, fecha)
+    else:
+        form = CancelacionEnBloqueForm(initial={'fecha_cancelacion': timezone.localdate()})
+
+    return render(request, 'dashboard_admin/cancelar_polizas_lote.html', {'form': form, 'resumen': resumen})
+
+
 #CARTERA 
 
-class CarteraGeneralView(LoginRequiredMixin, UserPassesTestMixin, ListView):
+def _nombre_cliente(prefijo=''):
+    return Concat(
+        F(f'{prefijo}first_name'), Value(' '), F(f'{prefijo}last_name'), output_field=CharField()
+    )
+
+
+class CarteraGeneralView(LoginRequiredMixin, UserPassesTestMixin, ExportarCSVMixin, KeysetPaginationMixin, ListView):
     model = Poliza
     template_name = 'dashboard_admin/cartera_general.html'
     context_object_name = 'polizas'
     paginate_by = 25
+    orden_keyset = ('-fecha_fin', '-id')
+    nombre_csv = 'cartera'
+    # Las columnas financieras salen de with_financials(), calculadas en SQL
+    columnas_csv = [
+        ('Póliza', 'numero_poliza'),
+        ('Cliente', _nombre_cliente('cliente__')),
+        ('Cédula', 'cliente__perfilcliente__cedula'),
+        ('Compañía', 'compania_aseguradora__nombre'),
+        ('Tipo de Seguro', 'tipo_seguro__nombre'),
+        ('Asesor', 'asesor__nombre_completo'),
+        ('Fecha Inicio', 'fecha_inicio'),
+        ('Fecha Fin', 'fecha_fin'),
+        ('Modalidad', etiqueta('modo_pago', Poliza.MODO_PAGO_CHOICES)),
+        ('Estado', etiqueta('estado', Poliza.ESTADO_POLIZA_CHOICES)),
+        ('Estado Cartera', etiqueta('estado_cartera', Poliza.ESTADO_CARTERA_CHOICES)),
+        ('Prima sin IVA', 'valor_prima_sin_iva'),
+        ('IVA', 'iva_calculado'),
+        ('Total a Pagar', 'total_calculado'),
+        ('Comisión', 'comision_calculada'),
+    ]
 
     def test_func(self):
         return self.request.user.is_staff
 
     def get_queryset(self):
         # Primero, obtenemos el queryset base de las pólizas
-        queryset = Poliza.objects.select_related('cliente', 'tipo_seguro').all()
+        queryset = Poliza.objects.select_related('cliente', 'tipo_seguro').with_financials()
         
         # Luego, aplicamos el filtro si se seleccionó un cliente
         cliente_id = self.request.GET.get('cliente')
@@ -507,18 +664,18 @@ class CarteraGeneralView(LoginRequiredMixin, UserPassesTestMixin, ListView):
 
         queryset = self.get_queryset()
 
-        # CAMBIO CLAVE: Sumamos 'valor_prima_sin_iva' en lugar de 'prima_total'
-        total_ventas = queryset.aggregate(total=Sum('valor_prima_sin_iva'))['total'] or 0
-
-        # El cálculo de comisiones usa la @property del modelo, que ya está actualizada
-        total_comisiones = sum(p.valor_comision for p in queryset)
+        # Ventas (prima sin IVA) y comisiones de todo el filtro en una sola consulta
+        totales = queryset.totals()
+        total_ventas = totales['total_primas']
+        total_comisiones = totales['total_comisiones']
 
         polizas_en_mora = Poliza.objects.filter(estado_cartera='EN_MORA')
 
         context['total_ventas'] = total_ventas
         context['total_comisiones'] = total_comisiones
         context['polizas_en_mora'] = polizas_en_mora
-        context['todos_los_clientes'] = User.objects.filter(is_staff=False)
+        # Solo el cliente seleccionado; el resto se busca con el autocompletar
+        context['cliente_filtro'] = _cliente_seleccionado(self.request.GET.get('cliente'))
         context['cliente_seleccionado'] = self.request.GET.get('cliente')
 
         return context
@@ -526,13 +683,30 @@ class CarteraGeneralView(LoginRequiredMixin, UserPassesTestMixin, ListView):
 
 
 
-class PolicyPortfolioDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
+class PolicyPortfolioDetailView(LoginRequiredMixin, UserPassesTestMixin, ExportarCSVMixin, DetailView):
     model = Poliza
     template_name = 'dashboard_admin/policy_portfolio_detail.html'
     context_object_name = 'poliza'
+    nombre_csv = 'cuotas'
+    columnas_csv = [
+        ('Póliza', 'poliza__numero_poliza'),
+        ('# Cuota', 'numero_cuota'),
+        ('Fecha Vencimiento', 'fecha_vencimiento'),
+        ('Monto', 'monto_cuota'),
+        ('Estado', etiqueta('estado', Cuota.ESTADO_CUOTA_CHOICES)),
+        # Misma fórmula que la comisión que se genera al marcar la cuota como pagada
+        ('Comisión', ExpressionWrapper(
+            F('monto_cuota') * Coalesce('poliza__comision_porcentaje', 'poliza__tipo_seguro__comision_porcentaje') / 100,
+            output_field=DecimalField(max_digits=14, decimal_places=2)
+        )),
+    ]
 
     def test_func(self):
         return self.request.user.is_staff
+
+    def get_queryset_csv(self):
+        # Las cuotas de la póliza del detalle, en orden
+        return Cuota.objects.filter(poliza=self.get_object()).order_by('numero_cuota')
     
 
     def get_context_data(self, **kwargs):
@@ -556,13 +730,13 @@ def marcar_cuota_pagada_view(request, pk):
 
     # Actualizamos el estado de la cuota del cliente
     cuota.estado = 'PAGADA'
-    cuota.save()
+    cuota.save(update_fields=['estado'])
 
     # --- LÓGICA DE COMISIÓN CORREGIDA ---
 
     # 1. Calculamos la porción de comisión para esta cuota específica
-    porcentaje_comision = poliza.tipo_seguro.comision_porcentaje / 100
-    comision_de_la_cuota = cuota.monto_cuota * porcentaje_comision
+    # (con el porcentaje congelado en la póliza, no el actual del tipo de seguro)
+    comision_de_la_cuota = cuota.monto_cuota * poliza.tarifa_comision / 100
 
     # 2. Creamos un registro de Pago por el valor de la COMISIÓN de la cuota
     Pago.objects.create(
@@ -570,6 +744,7 @@ def marcar_cuota_pagada_view(request, pk):
         cuota=cuota,
         fecha_pago=timezone.now().date(),
         monto_pagado=comision_de_la_cuota, # <-- CAMBIO CLAVE
+        comision_porcentaje=poliza.tarifa_comision,
         estado_comision='PENDIENTE',
         notas=f"Comisión generada por el pago de la cuota #{cuota.numero_cuota}."
     )
@@ -580,7 +755,7 @@ def marcar_cuota_pagada_view(request, pk):
     if not otras_cuotas_en_mora:
         # Si ya no hay cuotas en mora, la póliza vuelve a estar al día
         poliza.estado_cartera = 'AL_DIA'
-        poliza.save()
+        poliza.save(update_fields=['estado_cartera'])
 
     return redirect('dashboard_admin:detalle_cartera_poliza', pk=poliza.pk)
 
@@ -594,12 +769,12 @@ def marcar_cuota_mora_view(request, pk):
 
     # Actualizamos el estado de la cuota individual
     cuota.estado = 'EN_MORA'
-    cuota.save()
+    cuota.save(update_fields=['estado'])
 
     # 👇 MEJORA: Actualizamos también el estado general de la póliza 👇
     if poliza.estado_cartera != 'EN_MORA':
         poliza.estado_cartera = 'EN_MORA'
-        poliza.save()
+        poliza.save(update_fields=['estado_cartera'])
 
     # Redirigimos de vuelta a la misma página
     return redirect('dashboard_admin:detalle_cartera_poliza', pk=poliza.pk)
@@ -654,14 +829,143 @@ class VehiculoDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
 def test_select2_view(request):
     return render(request, 'dashboard_admin/debug_select2.html')
 
+
+#AUTOCOMPLETAR (Select2)
+
+RESULTADOS_POR_PAGINA_AUTOCOMPLETAR = 20
+
+
+def _terminos_busqueda(request):
+    return request.GET.get('term', '').split()[:5]
+
+
+def _respuesta_autocompletar(request, queryset, etiqueta):
+    """
+    Responde en el formato que espera Select2 con `ajax`: una página de
+    resultados {id, text} y si hay más. Sin término no se devuelve nada, para
+    no recorrer la tabla completa.
+    """
+    if not _terminos_busqueda(request):
+        return JsonResponse({'results': [], 'pagination': {'more': False}})
+
+    try:
+        pagina = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        pagina = 1
+    inicio = (pagina - 1) * RESULTADOS_POR_PAGINA_AUTOCOMPLETAR
+    filas = list(queryset[inicio:inicio + RESULTADOS_POR_PAGINA_AUTOCOMPLETAR + 1])
+
+    return JsonResponse({
+        'results': [
+            {'id': obj.pk, 'text': etiqueta(obj)}
+            for obj in filas[:RESULTADOS_POR_PAGINA_AUTOCOMPLETAR]
+        ],
+        'pagination': {'more': len(filas) > RESULTADOS_POR_PAGINA_AUTOCOMPLETAR},
+    })
+
+
+def etiqueta_cliente(cliente):
+    nombre = cliente.get_full_name() or cliente.username
+    cedula = getattr(getattr(cliente, 'perfilcliente', None), 'cedula', None)
+    return f"{nombre} ({cedula})" if cedula else nombre
+
+
+def etiqueta_poliza(poliza):
+    return f"{poliza.numero_poliza} - {etiqueta_cliente(poliza.cliente)}"
+
+
+@login_required
+@user_passes_test(es_admin)
+def autocompletar_clientes_view(request):
+    """Clientes cuyo nombre, apellido, usuario, email o cédula empiezan por cada término."""
+    clientes = filtrar_clientes(
+        User.objects.filter(is_staff=False).select_related('perfilcliente'),
+        _terminos_busqueda(request)
+    )
+    return _respuesta_autocompletar(
+        request, clientes.order_by('first_name', 'last_name', 'id'), etiqueta_cliente
+    )
+
+
+@login_required
+@user_passes_test(es_admin)
+def autocompletar_polizas_view(request):
+    """Pólizas por prefijo del número o de la placa del vehículo asegurado."""
+    polizas = Poliza.objects.select_related('cliente__perfilcliente')
+    for termino in _terminos_busqueda(request):
+        polizas = polizas.filter(
+            Q(numero_poliza__istartswith=termino) |
+            Q(vehiculo__placa__istartswith=termino)
+        )
+    return _respuesta_autocompletar(request, polizas.order_by('numero_poliza'), etiqueta_poliza)
+
+
+@login_required
+@user_passes_test(es_admin)
+def autocompletar_vehiculos_view(request):
+    """Vehículos por prefijo de la placa."""
+    vehiculos = Vehiculo.objects.all()
+    for termino in _terminos_busqueda(request):
+        vehiculos = vehiculos.filter(placa__istartswith=termino)
+    return _respuesta_autocompletar(request, vehiculos.order_by('placa'), str)
+
+
+@login_required
+@user_passes_test(es_admin)
+def busqueda_global_view(request):
+    """Búsqueda del encabezado: clientes, pólizas, vehículos y siniestros por relevancia."""
+    return JsonResponse({'results': buscar(request.GET.get('q', ''))})
+
 #VISTAS PARA COMISIONES 
 
 
-class LiquidacionComisionesView(LoginRequiredMixin, UserPassesTestMixin, ListView):
+FILTROS_LIQUIDACION = ('cliente_id', 'compania_id', 'fecha_inicio', 'fecha_fin')
+
+
+def filtrar_pagos(queryset, datos):
+    """
+    Filtros de la vista de liquidaciones. `datos` es el GET de la vista o el
+    POST de la liquidación en bloque, que reenvía los mismos filtros.
+    """
+    cliente_id = datos.get('cliente_id')
+    compania_id = datos.get('compania_id')
+    fecha_inicio = datos.get('fecha_inicio')
+    fecha_fin = datos.get('fecha_fin')
+
+    if cliente_id:
+        queryset = queryset.filter(poliza__cliente_id=cliente_id)
+    if compania_id:
+        queryset = queryset.filter(poliza__compania_aseguradora_id=compania_id)
+    if fecha_inicio:
+        queryset = queryset.filter(fecha_pago__gte=fecha_inicio)
+    if fecha_fin:
+        queryset = queryset.filter(fecha_pago__lte=fecha_fin)
+
+    return queryset
+
+
+class LiquidacionComisionesView(LoginRequiredMixin, UserPassesTestMixin, ExportarCSVMixin, KeysetPaginationMixin, ListView):
     model = Pago
     template_name = 'dashboard_admin/liquidacion_comisiones.html'
     context_object_name = 'pagos_list' # Usaremos este nombre en la plantilla
     paginate_by = 15
+    orden_keyset = ('-fecha_pago', '-id')
+    nombre_csv = 'liquidaciones'
+    columnas_csv = [
+        ('Fecha Pago', 'fecha_pago'),
+        ('Póliza', 'poliza__numero_poliza'),
+        ('Cliente', _nombre_cliente('poliza__cliente__')),
+        ('Cédula', 'poliza__cliente__perfilcliente__cedula'),
+        ('Compañía', 'poliza__compania_aseguradora__nombre'),
+        ('Tipo de Seguro', 'poliza__tipo_seguro__nombre'),
+        ('# Cuota', 'cuota__numero_cuota'),
+        ('Prima sin IVA', 'poliza__valor_prima_sin_iva'),
+        ('IVA', PolizaQuerySet.expresiones_financieras('poliza__')['iva_calculado']),
+        ('Total a Pagar', PolizaQuerySet.expresiones_financieras('poliza__')['total_calculado']),
+        ('% Comisión', 'comision_porcentaje'),
+        ('Comisión', 'monto_pagado'),
+        ('Estado', etiqueta('estado_comision', Pago.ESTADO_COMISION_CHOICES)),
+    ]
 
     def test_func(self):
         return self.request.user.is_staff
@@ -674,21 +978,7 @@ class LiquidacionComisionesView(LoginRequiredMixin, UserPassesTestMixin, ListVie
         ).all()
 
         # Lógica de Filtros para la Tabla
-        cliente_id = self.request.GET.get('cliente_id')
-        compania_id = self.request.GET.get('compania_id')
-        fecha_inicio = self.request.GET.get('fecha_inicio')
-        fecha_fin = self.request.GET.get('fecha_fin')
-
-        if cliente_id:
-            queryset = queryset.filter(poliza__cliente_id=cliente_id)
-        if compania_id:
-            queryset = queryset.filter(poliza__compania_aseguradora_id=compania_id)
-        if fecha_inicio:
-            queryset = queryset.filter(fecha_pago__gte=fecha_inicio)
-        if fecha_fin:
-            queryset = queryset.filter(fecha_pago__lte=fecha_fin)
-
-        return queryset
+        return filtrar_pagos(queryset, self.request.GET)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -698,23 +988,33 @@ class LiquidacionComisionesView(LoginRequiredMixin, UserPassesTestMixin, ListVie
         ano_kpi = int(self.request.GET.get('ano_kpi', hoy.year))
         mes_kpi = int(self.request.GET.get('mes_kpi', hoy.month))
 
-        pagos_para_kpi = Pago.objects.filter(fecha_pago__year=ano_kpi, fecha_pago__month=mes_kpi)
+        # Rango de fechas (no __year/__month) para aprovechar el índice (fecha_pago, estado_comision)
+        totales_kpi = Pago.objects.filter(**filtro_mes('fecha_pago', ano_kpi, mes_kpi)).aggregate(
+            liquidado=Sum('monto_pagado', filter=Q(estado_comision='LIQUIDADA')),
+            pendiente=Sum('monto_pagado', filter=Q(estado_comision='PENDIENTE'))
+        )
+        total_liquidado = totales_kpi['liquidado'] or 0
+        total_pendiente = totales_kpi['pendiente'] or 0
 
-        total_liquidado = pagos_para_kpi.filter(estado_comision='LIQUIDADA').aggregate(total=Sum('monto_pagado'))['total'] or 0
-        total_pendiente = pagos_para_kpi.filter(estado_comision='PENDIENTE').aggregate(total=Sum('monto_pagado'))['total'] or 0
-        
 
         context['total_pendiente'] = total_pendiente
         context['total_liquidado'] = total_liquidado
 
         # --- Pasamos datos adicionales para los filtros ---
-        context['todos_los_clientes'] = User.objects.filter(is_staff=False)
+        context['cliente_filtro'] = _cliente_seleccionado(self.request.GET.get('cliente_id'))
         context['todas_las_companias'] = CompaniaAseguradora.objects.all()
         context['rango_anos'] = range(hoy.year, hoy.year - 5, -1)
         context['meses'] = [(i, datetime(2000, i, 1).strftime('%B').capitalize()) for i in range(1, 13)]
         context['mes_seleccionado_kpi'] = mes_kpi
         context['ano_seleccionado_kpi'] = ano_kpi
         context['filtros_aplicados'] = self.request.GET.urlencode()
+        context['filtros_liquidacion'] = {
+            campo: self.request.GET[campo] for campo in FILTROS_LIQUIDACION if self.request.GET.get(campo)
+        }
+        # Totales guardados al liquidar: no se vuelven a sumar los pagos
+        context['lotes_liquidacion'] = LoteLiquidacion.objects.select_related(
+            'creado_por', 'revertido_por'
+        ).prefetch_related('totales__compania_aseguradora', 'totales__tipo_seguro')[:5]
 
         return context
 
@@ -725,7 +1025,9 @@ class LiquidacionComisionesView(LoginRequiredMixin, UserPassesTestMixin, ListVie
 def marcar_comision_liquidada_view(request, pk):
     pago = get_object_or_404(Pago, pk=pk)
     pago.estado_comision = 'LIQUIDADA'
-    pago.save()
+    # Liquidado a mano: ya no pertenece a un lote que se pueda revertir
+    pago.lote_liquidacion = None
+    pago.save(update_fields=['estado_comision', 'lote_liquidacion'])
     return redirect('dashboard_admin:liquidacion_comisiones')
 
 
@@ -734,9 +1036,85 @@ def marcar_comision_liquidada_view(request, pk):
 @require_POST
 def desmarcar_comision_liquidada_view(request, pk):
     pago = get_object_or_404(Pago, pk=pk)
-    # Simplemente revertimos el estado a PENDIENTE
-    pago.estado_comision = 'PENDIENTE'
-    pago.save()
+    # Vuelve a PENDIENTE, sale de su lote y los totales del lote se recalculan
+    desmarcar_pago(pago)
+    return redirect('dashboard_admin:liquidacion_comisiones')
+
+
+def _descripcion_filtros(datos):
+    partes = []
+    if datos.get('cliente_id'):
+        cliente = _cliente_seleccionado(datos['cliente_id'])
+        partes.append(f"Cliente: {cliente.get_full_name() or cliente.username}" if cliente else f"Cliente #{datos['cliente_id']}")
+    if datos.get('compania_id'):
+        compania = CompaniaAseguradora.objects.filter(pk=datos['compania_id']).first() if datos['compania_id'].isdigit() else None
+        partes.append(f"Compañía: {compania.nombre if compania else datos['compania_id']}")
+    if datos.get('fecha_inicio'):
+        partes.append(f"Desde {datos['fecha_inicio']}")
+    if datos.get('fecha_fin'):
+        partes.append(f"Hasta {datos['fecha_fin']}")
+    return ', '.join(partes) or 'Todos los pagos pendientes'
+
+
+def _redirigir_a_liquidaciones(datos):
+    filtros = urlencode({campo: datos[campo] for campo in FILTROS_LIQUIDACION if datos.get(campo)})
+    url = reverse('dashboard_admin:liquidacion_comisiones')
+    return redirect(f'{url}?{filtros}' if filtros else url)
+
+
+@login_required
+@user_passes_test(es_admin)
+@require_POST
+def liquidar_comisiones_lote_view(request):
+    """
+    Liquida en un solo UPDATE los pagos pendientes del filtro actual de la
+    vista de liquidaciones, o solo los seleccionados si alcance=seleccion.
+    """
+    try:
+        pagos = filtrar_pagos(Pago.objects.all(), request.POST)
+        descripcion = _descripcion_filtros(request.POST)
+        if request.POST.get('alcance') == 'seleccion':
+            ids = [pk for pk in request.POST.getlist('pagos') if pk.isdigit()]
+            if not ids:
+                messages.warning(request, "No seleccionaste ningún pago para liquidar.")
+                return _redirigir_a_liquidaciones(request.POST)
+            pagos = pagos.filter(pk__in=ids)
+            descripcion = f"Selección de {len(ids)} pagos ({descripcion})"
+        lote = liquidar_pagos(pagos, usuario=request.user, descripcion=descripcion)
+    except (ValidationError, ValueError):
+        messages.error(request, "Los filtros de la liquidación no son válidos.")
+        return _redirigir_a_liquidaciones(request.POST)
+
+    if lote:
+        messages.success(
+            request,
+            f"Se liquidaron {lote.cantidad_pagos} comisiones por ${lote.total_comisiones:,.0f} (lote #{lote.pk})."
+        )
+    else:
+        messages.info(request, "No había comisiones pendientes con esos filtros.")
+    return _redirigir_a_liquidaciones(request.POST)
+
+
+@login_required
+@user_passes_test(es_admin)
+@require_POST
+def revertir_lote_liquidacion_view(request, pk):
+    lote = get_object_or_404(LoteLiquidacion, pk=pk)
+    if lote.revertido:
+        messages.warning(request, f"El lote #{lote.pk} ya había sido revertido.")
+    else:
+        revertidos = revertir_lote(lote, usuario=request.user)
+        messages.success(request, f"Lote #{lote.pk} revertido: {revertidos} comisiones vuelven a pendiente.")
+    return redirect('dashboard_admin:liquidacion_comisiones')
+
+
+@login_required
+@user_passes_test(es_admin)
+@require_POST
+def generar_estado_cuenta_lote_view(request, pk):
+    lote = get_object_or_404(LoteLiquidacion, pk=pk)
+    transaction.on_commit(lambda: programar_estado_cuenta(lote.pk))
+    messages.info(request, f"El estado de cuenta del lote #{lote.pk} se está generando. Recarga la página en unos momentos.")
     return redirect('dashboard_admin:liquidacion_comisiones')
 
 
@@ -839,7 +1217,7 @@ def revertir_pago_cuota_view(request, pk):
 
     # 1. Revertimos el estado de la cuota a Pendiente
     cuota.estado = 'PENDIENTE'
-    cuota.save()
+    cuota.save(update_fields=['estado'])
 
     # 2. Buscamos y eliminamos el registro de Pago asociado a esta cuota
     Pago.objects.filter(cuota=cuota).delete()
@@ -856,7 +1234,7 @@ def revertir_pago_cuota_view(request, pk):
         poliza.estado_cartera = 'EN_MORA'
     else:
         poliza.estado_cartera = 'AL_DIA'
-    poliza.save()
+    poliza.save(update_fields=['estado_cartera'])
 
     # Redirigimos de vuelta a la página de detalle de cartera
     return redirect('dashboard_admin:detalle_cartera_poliza', pk=poliza.pk)
@@ -905,4 +1283,4 @@ class AsesorDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
     success_url = reverse_lazy('dashboard_admin:lista_asesores')
 
     def test_func(self):
-        return self.request.user.is_staff
\ No newline at end of file
+        return self.request.user.is_staff
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import TipoSeguro, Poliza, CompaniaAseguradora
+from .models import TipoSeguro, Poliza, CompaniaAseguradora, CorreoSaliente, ImportacionPolizas
 
 @admin.register(CompaniaAseguradora)
 class CompaniaAseguradoraAdmin(admin.ModelAdmin):
@@ -38,4 +38,22 @@ class PolizaAdmin(admin.ModelAdmin):
             'fields': ('prima_total', 'modo_pago', 'plazo_meses')
         }),
         
-    )
\ No newline at end of file
+    )
+
+
+@admin.register(CorreoSaliente)
+class CorreoSalienteAdmin(admin.ModelAdmin):
+    """Permite revisar la bandeja de salida y los correos que quedaron FALLIDOS."""
+    list_display = ('asunto', 'estado', 'intentos', 'proximo_intento', 'fecha_creacion', 'fecha_envio')
+    list_filter = ('estado',)
+    search_fields = ('asunto', 'ultimo_error')
+    readonly_fields = ('fecha_creacion', 'fecha_envio')
+    ordering = ('-fecha_creacion',)
+
+
+@admin.register(ImportacionPolizas)
+class ImportacionPolizasAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'estado', 'filas_procesadas', 'filas_importadas', 'filas_con_error', 'creado_por', 'fecha_creacion', 'fecha_fin')
+    list_filter = ('estado',)
+    readonly_fields = ('fecha_creacion', 'fecha_fin')
+    ordering = ('-fecha_creacion',)
@@ -0,0 +1,167 @@
+# polizas/cancelacion.py
+"""
+Cancelación en bloque de pólizas, por ejemplo cuando una aseguradora deja
+de ofrecer un producto.
+
+Hace lo mismo que PolicyCancelView para cada póliza, pero para todas a la vez:
+
+1. Bloquea las pólizas activas del filtro (select_for_update).
+2. Calcula el prorrateo de las de contado con polizas.finance, en arreglos
+   y no póliza por póliza.
+3. Guarda las pólizas y ajusta sus pagos de comisión con bulk_update, en la
+   misma transacción.
+4. Envía la señal polizas_canceladas, porque bulk_update no dispara post_save.
+5. Encola en la bandeja de salida el correo de cada cliente y un resumen
+   para el administrador; despachar_bandeja_salida los envía en segundo plano.
+"""
+import logging
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from cartera.models import Pago
+from . import finance
+from .correo import encolar_correos
+from .models import Poliza
+from .signals import polizas_canceladas
+
+logger = logging.getLogger('polizas')
+
+TAMANO_LOTE = 500
+
+CAMPOS_CANCELACION = ['estado', 'fecha_cancelacion', 'motivo_cancelacion', 'monto_devolucion', 'comision_devuelta']
+
+
+def _prorratear_al(columnas, fecha):
+    """
+    Prorrateo de cancelar en `fecha` las pólizas de `columnas` (como las de
+    finance.cargar_cartera). La fecha se acota a la vigencia de cada póliza:
+    una que aún no empieza se devuelve completa y una ya vencida no devuelve nada.
+    """
+    inicios, fines = columnas['fecha_inicio'], columnas['fecha_fin']
+    cancelaciones = np.minimum(np.maximum(np.datetime64(fecha, 'D'), inicios), fines)
+    return finance.calcular_prorrateo(
+        columnas['prima'], columnas['tarifa_comision'], columnas['modo_pago'], inicios, fines, cancelaciones
+    )
+
+
+def calcular_cancelaciones(polizas, fecha):
+    """
+    Prorrateo de cancelar `polizas` (instancias) en `fecha`. Devuelve, en el
+    orden de `polizas`, tuplas (devolucion, comision_devuelta, comision_ganada)
+    en Decimal, o None para las que no son de contado.
+    """
+    columnas = {
+        'prima': finance.a_enteros([poliza.valor_prima_sin_iva for poliza in polizas]),
+        'tarifa_comision': finance.a_enteros([poliza.tarifa_comision for poliza in polizas]),
+        'modo_pago': [poliza.modo_pago for poliza in polizas],
+        'fecha_inicio': finance.a_fechas([poliza.fecha_inicio for poliza in polizas]),
+        'fecha_fin': finance.a_fechas([poliza.fecha_fin for poliza in polizas]),
+    }
+    devoluciones, comisiones_devueltas, aplica = _prorratear_al(columnas, fecha)
+    comisiones_ganadas = finance.calcular_comision(columnas['prima'], columnas['tarifa_comision']) - comisiones_devueltas
+
+    return [
+        (devolucion, comision_devuelta, comision_ganada) if aplica_poliza else None
+        for devolucion, comision_devuelta, comision_ganada, aplica_poliza in zip(
+            finance.a_decimales(devoluciones),
+            finance.a_decimales(comisiones_devueltas),
+            finance.a_decimales(comisiones_ganadas),
+            aplica.tolist()
+        )
+    ]
+
+
+def resumir_cancelacion(polizas, fecha):
+    """
+    Lo que costaría cancelar las pólizas activas del queryset `polizas` en
+    `fecha`, para confirmar antes de hacerlo. Una consulta values_list, sin
+    instanciar pólizas.
+    """
+    columnas = finance.cargar_cartera(polizas.filter(estado='ACTIVA'))
+    devoluciones, comisiones_devueltas, aplica = _prorratear_al(columnas, fecha)
+    return {
+        'cantidad': len(columnas['pk']),
+        'contado': int(aplica.sum()),
+        'devolucion': finance.a_decimales([devoluciones.sum()])[0],
+        'comision_devuelta': finance.a_decimales([comisiones_devueltas.sum()])[0],
+    }
+
+
+def cancelar_polizas(polizas, motivo, fecha=None, tamano_lote=TAMANO_LOTE):
+    """
+    Cancela las pólizas ACTIVAS del queryset `polizas` con `motivo` en `fecha`
+    (hoy por defecto). Devuelve la lista de pólizas canceladas.
+    """
+    fecha = fecha or timezone.localdate()
+    with transaction.atomic():
+        # of=('self',): solo se bloquean las pólizas, no las tablas unidas
+        canceladas = list(
+            polizas.filter(estado='ACTIVA')
+            .select_related('cliente', 'tipo_seguro', 'vehiculo')
+            .select_for_update(of=('self',))
+            .order_by('pk')
+        )
+        if not canceladas:
+            return []
+
+        comisiones_ganadas = {}
+        for poliza, prorrateo in zip(canceladas, calcular_cancelaciones(canceladas, fecha)):
+            poliza.estado = 'CANCELADA'
+            poliza.fecha_cancelacion = fecha
+            poliza.motivo_cancelacion = motivo
+            if prorrateo:
+                poliza.monto_devolucion, poliza.comision_devuelta, comisiones_ganadas[poliza.pk] = prorrateo
+        Poliza.objects.bulk_update(canceladas, CAMPOS_CANCELACION, batch_size=tamano_lote)
+
+        # El pago de comisión de las de contado queda con la comisión realmente ganada
+        pagos = list(Pago.objects.filter(poliza_id__in=comisiones_ganadas, cuota__isnull=True))
+        for pago in pagos:
+            pago.monto_pagado = comisiones_ganadas[pago.poliza_id]
+        Pago.objects.bulk_update(pagos, ['monto_pagado'], batch_size=tamano_lote)
+
+        sin_pago = len(comisiones_ganadas) - len({pago.poliza_id for pago in pagos})
+        if sin_pago:
+            logger.warning(f"{sin_pago} pólizas de contado canceladas en bloque no tenían Pago de comisión para ajustar")
+
+        polizas_canceladas.send(sender=Poliza, polizas=canceladas, pagos=pagos)
+        _encolar_correos_cancelacion(canceladas, fecha, motivo)
+
+    logger.info(f"Cancelación en bloque: {len(canceladas)} pólizas canceladas al {fecha}, motivo: {motivo}")
+    return canceladas
+
+
+def _encolar_correos_cancelacion(polizas, fecha, motivo):
+    """Un correo por cliente con su póliza y un resumen para el administrador."""
+    mensajes = [
+        (
+            f"Confirmación de Cancelación de tu Póliza #{poliza.numero_poliza}",
+            'emails/cancelacion_poliza_cliente.html',
+            {'poliza': poliza},
+            [poliza.cliente.email]
+        )
+        for poliza in polizas if poliza.cliente.email
+    ]
+    if settings.ADMIN_EMAIL:
+        filas = Poliza.objects.filter(pk__in=[poliza.pk for poliza in polizas]).values(
+            'compania_aseguradora__nombre', 'tipo_seguro__nombre'
+        ).annotate(
+            cantidad=Count('pk'),
+            devolucion=Sum('monto_devolucion'),
+            comision_devuelta=Sum('comision_devuelta'),
+        ).order_by('compania_aseguradora__nombre', 'tipo_seguro__nombre')
+        mensajes.append((
+            f"Cancelación en bloque: {len(polizas)} póliza(s) canceladas",
+            'emails/cancelacion_masiva_admin.html',
+            {'fecha': fecha, 'motivo': motivo, 'filas': list(filas), 'total_polizas': len(polizas)},
+            [settings.ADMIN_EMAIL]
+        ))
+
+    try:
+        # Savepoint propio: un error al encolar no debe revertir la cancelación
+        with transaction.atomic():
+            encolar_correos(mensajes)
+        logger.info(f"{len(mensajes)} correos de cancelación en bloque encolados")
+    except Exception as e:
+        logger.exception(f"Error al encolar los correos de la cancelación en bloque: {e}")
@@ -0,0 +1,194 @@
+# polizas/correo.py
+import logging
+import time
+from itertools import islice
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+
+logger = logging.getLogger('polizas')
+
+
+def construir_correo_html(asunto, cuerpo_html, destinatarios):
+    """Crea un EmailMessage en formato HTML desde el remitente por defecto."""
+    correo = EmailMessage(
+        asunto,
+        cuerpo_html,
+        settings.DEFAULT_FROM_EMAIL,
+        destinatarios
+    )
+    correo.content_subtype = "html"
+    return correo
+
+
+def serializar_correo(correo):
+    """Convierte un EmailMessage en un dict JSON para pasarlo a una tarea de Celery."""
+    return {
+        'asunto': correo.subject,
+        'cuerpo_html': correo.body,
+        'destinatarios': list(correo.to),
+    }
+
+
+def deserializar_correo(datos):
+    """Operación inversa de serializar_correo."""
+    return construir_correo_html(datos['asunto'], datos['cuerpo_html'], datos['destinatarios'])
+
+
+def _lotes(correos, tamano_lote):
+    iterador = iter(correos)
+    while True:
+        lote = list(islice(iterador, tamano_lote))
+        if not lote:
+            return
+        yield lote
+
+
+def _enviar_en_orden(conexion, mensajes):
+    """
+    Envía los mensajes uno por uno hasta el primero que falle. Devuelve
+    (enviados, pendientes, error): `pendientes` son los mensajes desde el que
+    falló, y `error` su excepción (None si salieron todos).
+    """
+    enviados = 0
+    for posicion, mensaje in enumerate(mensajes):
+        try:
+            enviados += conexion.send_messages([mensaje]) or 0
+        except Exception as e:
+            return enviados, mensajes[posicion:], e
+    return enviados, [], None
+
+
+def enviar_lote(conexion, lote):
+    """
+    Envía un lote por una conexión ya abierta, mensaje por mensaje. Si uno
+    falla, cierra la conexión, vuelve a conectar y reintenta una vez desde
+    ese mensaje, sin reenviar los que ya salieron. Devuelve (enviados,
+    pendientes, error), con los mensajes que siguieron fallando y el último error.
+    """
+    enviados, pendientes, error = _enviar_en_orden(conexion, lote)
+    if error is None:
+        return enviados, [], None
+
+    logger.warning(
+        f"Fallo al enviar un lote de {len(lote)} correos ({len(pendientes)} sin enviar), reconectando: {error}"
+    )
+    cerrar_conexion(conexion)
+    try:
+        conexion.open()
+    except Exception as e:
+        return enviados, pendientes, e
+    reenviados, pendientes, error = _enviar_en_orden(conexion, pendientes)
+    return enviados + reenviados, pendientes, error
+
+
+def respetar_limite(cantidad, inicio, max_por_segundo):
+    """Espera lo necesario para no superar `max_por_segundo` mensajes (0 = sin límite)."""
+    if max_por_segundo:
+        espera = cantidad / max_por_segundo - (time.monotonic() - inicio)
+        if espera > 0:
+            time.sleep(espera)
+
+
+def abrir_conexion():
+    """
+    Abre una conexión SMTP para reutilizarla en varios lotes. Si no se puede
+    abrir, la devuelve igual: enviar_lote volverá a intentarlo.
+    """
+    conexion = get_connection(fail_silently=False)
+    try:
+        conexion.open()
+    except Exception as e:
+        logger.warning(f"No se pudo abrir la conexión SMTP: {e}")
+    return conexion
+
+
+def cerrar_conexion(conexion):
+    try:
+        conexion.close()
+    except Exception:
+        pass
+
+
+def enviar_en_lotes(correos, tamano_lote=None, max_por_segundo=None):
+    """
+    Envía los correos reutilizando una sola conexión SMTP, en lotes de
+    `tamano_lote` mensajes con send_messages().
+
+    - Si un correo falla, cierra la conexión, vuelve a conectar y reintenta
+      una vez lo que faltaba del lote; lo que vuelva a fallar se devuelve
+      como lote fallido (sin los correos que sí salieron).
+    - Limita la velocidad a `max_por_segundo` mensajes (0 o None = sin límite).
+
+    `correos` puede ser cualquier iterable (por ejemplo un generador), así que
+    no hace falta tener todos los mensajes en memoria.
+
+    Devuelve una tupla (enviados, lotes_fallidos, segundos).
+    """
+    if tamano_lote is None:
+        tamano_lote = settings.EMAIL_LOTE_TAMANO
+    if max_por_segundo is None:
+        max_por_segundo = settings.EMAIL_MAX_MENSAJES_POR_SEGUNDO
+
+    enviados = 0
+    lotes_fallidos = []
+    inicio = time.monotonic()
+    conexion = abrir_conexion()
+
+    try:
+        for lote in _lotes(correos, tamano_lote):
+            inicio_lote = time.monotonic()
+            enviados_lote, pendientes, error = enviar_lote(conexion, lote)
+            enviados += enviados_lote
+            if pendientes:
+                logger.error(f"{len(pendientes)} de {len(lote)} correos del lote fallaron tras reconectar: {error}")
+                lotes_fallidos.append(pendientes)
+            respetar_limite(len(lote), inicio_lote, max_por_segundo)
+    finally:
+        cerrar_conexion(conexion)
+
+    return enviados, lotes_fallidos, time.monotonic() - inicio
+
+
+def encolar_correo(asunto, plantilla, contexto, destinatarios):
+    """
+    Deja un correo en la bandeja de salida (CorreoSaliente) en lugar de
+    enviarlo. La plantilla se renderiza ahora, con los datos del momento.
+
+    Debe llamarse dentro de la misma transacción que el cambio que notifica:
+    si la transacción se revierte, el correo tampoco queda en cola. Al
+    confirmarse, se pide a Celery que despache la bandeja; si el broker no
+    responde, el despacho periódico lo enviará igual.
+    """
+    return encolar_correos([(asunto, plantilla, contexto, destinatarios)])[0]
+
+
+def encolar_correos(mensajes):
+    """
+    Como encolar_correo, para muchos correos a la vez: `mensajes` son tuplas
+    (asunto, plantilla, contexto, destinatarios). Se guardan con un solo
+    bulk_create y se pide un solo despacho de la bandeja.
+    """
+    from .models import CorreoSaliente
+
+    correos = CorreoSaliente.objects.bulk_create([
+        CorreoSaliente(
+            asunto=asunto,
+            cuerpo_html=render_to_string(plantilla, contexto),
+            destinatarios=list(destinatarios)
+        )
+        for asunto, plantilla, contexto, destinatarios in mensajes
+    ], batch_size=500)
+    if correos:
+        transaction.on_commit(_programar_despacho)
+    return correos
+
+
+def _programar_despacho():
+    from .tasks import despachar_bandeja_salida
+
+    try:
+        despachar_bandeja_salida.delay()
+    except Exception as e:
+        logger.warning(f"No se pudo programar el despacho de la bandeja de salida: {e}")
@@ -0,0 +1,157 @@
+# polizas/finance.py
+"""
+Cálculos financieros de muchas pólizas a la vez con NumPy.
+
+Las propiedades valor_iva, valor_comision y calcular_prorrateo_cancelacion
+de Poliza trabajan póliza por póliza con Decimal. Aquí las mismas fórmulas
+se aplican a columnas completas (primas, tarifas y fechas leídas con
+values_list), para calcular una cartera entera sin instanciar modelos.
+
+Para no perder centavos, los montos se manejan como enteros int64:
+- las primas en centavos (1234.56 -> 123456);
+- las tarifas en centésimas de punto porcentual (19.00 % -> 1900).
+Cada resultado se redondea una sola vez al centavo con división entera:
+- IVA y comisión redondean la mitad hacia arriba (ROUND_HALF_UP), lo que
+  se guardaría en un DecimalField de dos decimales.
+- El prorrateo redondea la mitad al par, como round() en
+  calcular_prorrateo_cancelacion.
+"""
+from decimal import Decimal
+import numpy as np
+from django.db.models.functions import Coalesce
+
+# Una tarifa en centésimas de punto porcentual, aplicada a centavos
+ESCALA_TARIFA = 10000
+
+
+def a_enteros(valores):
+    """Decimales con dos cifras (o None) a int64 en centésimas: 1234.56 -> 123456."""
+    return np.array(
+        [int(valor.scaleb(2).to_integral_value()) if valor is not None else 0 for valor in valores],
+        dtype=np.int64
+    )
+
+
+def a_decimales(centavos):
+    """Centavos int64 a una lista de Decimal con dos cifras: 123456 -> Decimal('1234.56')."""
+    return [Decimal(int(valor)).scaleb(-2) for valor in centavos]
+
+
+def a_fechas(valores):
+    """Fechas (o None) a datetime64[D]; los None quedan como NaT."""
+    return np.array(list(valores), dtype='datetime64[D]')
+
+
+def _dividir(numerador, denominador, mitad_par=False):
+    """
+    División entera redondeada al entero más cercano. Las mitades van hacia
+    arriba, o al par con mitad_par=True. `denominador` debe ser positivo.
+    """
+    cociente, resto = np.divmod(numerador, denominador)
+    doble = 2 * resto
+    if mitad_par:
+        return cociente + (doble > denominador) + ((doble == denominador) & (cociente % 2 == 1))
+    return cociente + (doble >= denominador)
+
+
+def calcular_porcentaje(primas, tarifas):
+    """Prima por tarifa / 100, en centavos. Sirve para el IVA y para la comisión."""
+    return _dividir(primas * tarifas, ESCALA_TARIFA)
+
+
+def calcular_iva(primas, tarifas_iva):
+    return calcular_porcentaje(primas, tarifas_iva)
+
+
+def calcular_comision(primas, tarifas_comision):
+    return calcular_porcentaje(primas, tarifas_comision)
+
+
+def calcular_total(primas, tarifas_iva):
+    """Prima + IVA, en centavos."""
+    return primas + calcular_iva(primas, tarifas_iva)
+
+
+def _prorratear(numerador, escala, dias_restantes, dias_totales):
+    """
+    round(numerador / escala * dias_restantes / dias_totales) sin desbordar
+    int64: se separa la parte entera de numerador / escala antes de
+    multiplicar por los días.
+    """
+    entero, fraccion = np.divmod(numerador, escala)
+    cociente, resto = np.divmod(entero * dias_restantes, dias_totales)
+    return cociente + _dividir(resto * escala + fraccion * dias_restantes, escala * dias_totales, mitad_par=True)
+
+
+def calcular_prorrateo(primas, tarifas_comision, modos_pago, fechas_inicio, fechas_fin, fechas_cancelacion):
+    """
+    Devolución al cliente y comisión a devolver por la cancelación, en centavos.
+    Devuelve (devolucion_cliente, comision_a_devolver, aplica): el prorrateo
+    solo aplica a pólizas de CONTADO con fecha de cancelación, y donde no
+    aplica los montos son 0 (el modelo devuelve None, None).
+    """
+    aplica = (np.asarray(modos_pago) == 'CONTADO') & ~np.isnat(fechas_cancelacion)
+    dias_totales = (fechas_fin - fechas_inicio).astype(np.int64)
+    # Lo que queda de vigencia es lo que se devuelve: prima - prima / días * días activos
+    dias_restantes = (fechas_fin - fechas_cancelacion).astype(np.int64)
+
+    # Pólizas sin vigencia: el modelo devuelve 0, 0
+    validas = aplica & (dias_totales > 0)
+    divisor = np.where(validas, dias_totales, 1)
+    restantes = np.where(validas, dias_restantes, 0)
+
+    devolucion = _prorratear(primas, 1, restantes, divisor)
+    comision = _prorratear(primas * tarifas_comision, ESCALA_TARIFA, restantes, divisor)
+    return np.where(validas, devolucion, 0), np.where(validas, comision, 0), aplica
+
+
+def cargar_cartera(queryset, extras=()):
+    """
+    Lee las columnas que necesitan los cálculos con un solo values_list.
+    Las tarifas sin congelar se completan con las del tipo de seguro, como
+    tarifa_iva y tarifa_comision del modelo. `extras` son campos adicionales
+    (por ejemplo para agrupar), que se devuelven con su nombre como arreglos de objetos.
+    """
+    columnas = [
+        'pk', 'valor_prima_sin_iva', 'tarifa_iva_efectiva', 'tarifa_comision_efectiva',
+        'modo_pago', 'fecha_inicio', 'fecha_fin', 'fecha_cancelacion', *extras
+    ]
+    filas = list(queryset.annotate(
+        tarifa_iva_efectiva=Coalesce('porcentaje_iva', 'tipo_seguro__porcentaje_iva'),
+        tarifa_comision_efectiva=Coalesce('comision_porcentaje', 'tipo_seguro__comision_porcentaje'),
+    ).values_list(*columnas).order_by())
+    valores = list(zip(*filas)) if filas else [()] * len(columnas)
+    pks, primas, tarifas_iva, tarifas_comision, modos, inicios, fines, cancelaciones = valores[:8]
+    resultado = {
+        'pk': np.array(pks, dtype=np.int64),
+        'prima': a_enteros(primas),
+        'tarifa_iva': a_enteros(tarifas_iva),
+        'tarifa_comision': a_enteros(tarifas_comision),
+        'modo_pago': np.array(modos, dtype=object),
+        'fecha_inicio': a_fechas(inicios),
+        'fecha_fin': a_fechas(fines),
+        'fecha_cancelacion': a_fechas(cancelaciones),
+    }
+    for nombre, columna in zip(extras, valores[8:]):
+        arreglo = np.empty(len(columna), dtype=object)
+        arreglo[:] = columna
+        resultado[nombre] = arreglo
+    return resultado
+
+
+def calcular_cartera(queryset):
+    """
+    Columnas de cargar_cartera() más iva, total, comision, devolucion_cliente,
+    comision_a_devolver y aplica_prorrateo, todas en centavos salvo la última.
+    Convertir a Decimal con a_decimales() solo lo que se vaya a mostrar o guardar.
+    """
+    columnas = cargar_cartera(queryset)
+    primas = columnas['prima']
+    columnas['iva'] = calcular_iva(primas, columnas['tarifa_iva'])
+    columnas['total'] = primas + columnas['iva']
+    columnas['comision'] = calcular_comision(primas, columnas['tarifa_comision'])
+    columnas['devolucion_cliente'], columnas['comision_a_devolver'], columnas['aplica_prorrateo'] = calcular_prorrateo(
+        primas, columnas['tarifa_comision'], columnas['modo_pago'],
+        columnas['fecha_inicio'], columnas['fecha_fin'], columnas['fecha_cancelacion']
+    )
+    return columnas
@@ -34,4 +34,14 @@ class PolicyForm(forms.ModelForm):
 
         # Hacemos que el campo vehículo y asesor no sean obligatorios
         self.fields['vehiculo'].required = False
-        self.fields['asesor'].required = False
\ No newline at end of file
+        self.fields['asesor'].required = False
+
+    def save(self, commit=True):
+        poliza = super().save(commit=False)
+        # Si se cambia el tipo de seguro, la póliza toma las tarifas del nuevo tipo
+        if 'tipo_seguro' in self.changed_data:
+            poliza.congelar_tarifas()
+        if commit:
+            poliza.save()
+            self._save_m2m()
+        return poliza
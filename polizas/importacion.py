@@ -0,0 +1,255 @@
+# polizas/importacion.py
+"""
+Importación masiva de pólizas desde un CSV.
+
+El archivo se lee fila por fila y se procesa en lotes. Cada lote:
+
+1. Resuelve clientes y vehículos con una consulta por lote, y compañías,
+   tipos de seguro y asesores con mapas cargados una sola vez.
+2. Valida cada fila con los mismos campos de PolicyForm.
+3. Crea en una transacción las pólizas, sus cuotas y sus pagos de comisión
+   con bulk_create, y actualiza el recordatorio SOAT de los vehículos.
+4. Envía la señal polizas_importadas para que las demás apps (resumen
+   mensual, búsqueda) se pongan al día, ya que bulk_create no dispara post_save.
+
+Las filas rechazadas se escriben en el reporte de errores con su número de
+fila y el motivo, y no detienen el resto de la importación.
+"""
+import csv
+import logging
+from django.core.exceptions import ValidationError
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.functions import Upper
+from cartera.models import Cuota, Pago
+from usuarios.models import PerfilCliente
+from .forms import PolicyForm
+from .models import Asesor, CompaniaAseguradora, Poliza, TipoSeguro, Vehiculo
+from .plan_pagos import construir_cuotas, construir_pago_comision
+from .signals import polizas_importadas
+
+logger = logging.getLogger('polizas')
+
+TAMANO_LOTE = 1000
+
+COLUMNAS_OBLIGATORIAS = [
+    'numero_poliza', 'cliente', 'compania', 'tipo_seguro',
+    'valor_prima_sin_iva', 'fecha_inicio', 'fecha_fin', 'modo_pago',
+]
+COLUMNAS_OPCIONALES = ['asesor', 'placa', 'plazo_meses']
+
+# Columnas que se validan con el campo correspondiente de PolicyForm
+CAMPOS_FORMULARIO = ['numero_poliza', 'valor_prima_sin_iva', 'fecha_inicio', 'fecha_fin', 'modo_pago', 'plazo_meses']
+
+COLUMNAS_REPORTE = ['fila', 'numero_poliza', 'errores']
+
+
+class ErrorImportacion(Exception):
+    """El archivo no se puede importar (por ejemplo, le faltan columnas)."""
+
+
+def _normalizar(texto):
+    return (texto or '').strip().lower()
+
+
+def leer_filas(archivo_texto):
+    """
+    Recorre el CSV sin cargarlo completo en memoria. Devuelve pares
+    (número de fila, dict) con los encabezados en minúscula; la fila 1 es
+    la de encabezados.
+    """
+    lector = csv.DictReader(archivo_texto)
+    encabezados = [_normalizar(columna) for columna in (lector.fieldnames or [])]
+    faltantes = [columna for columna in COLUMNAS_OBLIGATORIAS if columna not in encabezados]
+    if faltantes:
+        raise ErrorImportacion(f"Faltan columnas obligatorias: {', '.join(faltantes)}")
+    lector.fieldnames = encabezados
+
+    for numero_fila, fila in enumerate(lector, start=2):
+        yield numero_fila, {columna: (valor or '').strip() for columna, valor in fila.items() if columna}
+
+
+class ImportadorPolizas:
+    """
+    Procesa las filas de un CSV de pólizas por lotes. `escritor_errores` es
+    un csv.writer donde se escriben las filas rechazadas.
+    """
+
+    def __init__(self, escritor_errores, tamano_lote=TAMANO_LOTE, simular=False):
+        self.escritor_errores = escritor_errores
+        self.tamano_lote = tamano_lote
+        self.simular = simular
+        self.procesadas = 0
+        self.importadas = 0
+        self.con_error = 0
+        self.numeros_vistos = set()
+
+        # Tablas pequeñas: se cargan una vez para todo el archivo
+        self.companias = {_normalizar(c.nombre): c for c in CompaniaAseguradora.objects.all()}
+        self.tipos = {_normalizar(t.nombre): t for t in TipoSeguro.objects.all()}
+        self.asesores = {_normalizar(a.nombre_completo): a for a in Asesor.objects.all()}
+        self.campos = {nombre: PolicyForm.base_fields[nombre] for nombre in CAMPOS_FORMULARIO}
+
+        self.escritor_errores.writerow(COLUMNAS_REPORTE)
+
+    def importar(self, archivo_texto):
+        lote = []
+        for numero_fila, fila in leer_filas(archivo_texto):
+            lote.append((numero_fila, fila))
+            if len(lote) >= self.tamano_lote:
+                self.procesar_lote(lote)
+                lote = []
+        if lote:
+            self.procesar_lote(lote)
+        return {
+            'procesadas': self.procesadas,
+            'importadas': self.importadas,
+            'con_error': self.con_error,
+        }
+
+    # --- Resolución de referencias ---
+
+    def _mapas_del_lote(self, lote):
+        """Clientes (por cédula o usuario), vehículos y números ya existentes del lote."""
+        identificadores = {fila['cliente'] for _, fila in lote if fila.get('cliente')}
+        placas = {fila['placa'].upper() for _, fila in lote if fila.get('placa')}
+        numeros = {fila['numero_poliza'] for _, fila in lote if fila.get('numero_poliza')}
+
+        clientes = dict(
+            User.objects.filter(username__in=identificadores, is_staff=False).values_list('username', 'pk')
+        )
+        # La cédula tiene prioridad sobre el nombre de usuario
+        clientes.update(
+            PerfilCliente.objects.filter(
+                cedula__in=identificadores, usuario__is_staff=False
+            ).values_list('cedula', 'usuario_id')
+        )
+        vehiculos = {
+            v.placa.upper(): v
+            for v in Vehiculo.objects.annotate(placa_mayuscula=Upper('placa')).filter(
+                placa_mayuscula__in=placas
+            ).only('pk', 'placa', 'cliente_id')
+        }
+        existentes = set(Poliza.objects.filter(numero_poliza__in=numeros).values_list('numero_poliza', flat=True))
+        return clientes, vehiculos, existentes
+
+    def construir_poliza(self, fila, clientes, vehiculos, existentes):
+        """Devuelve (Poliza sin guardar, None) o (None, lista de errores)."""
+        errores = []
+        datos = {}
+        for nombre, campo in self.campos.items():
+            valor = fila.get(nombre, '')
+            if nombre in COLUMNAS_OPCIONALES and not valor:
+                datos[nombre] = Poliza._meta.get_field(nombre).default
+                continue
+            try:
+                datos[nombre] = campo.clean(valor)
+            except ValidationError as e:
+                errores.append(f"{nombre}: {' '.join(e.messages)}")
+
+        # Con plazo 0 el plan de cuotas dividiría por cero
+        if datos.get('modo_pago') == 'MENSUAL' and datos.get('plazo_meses') == 0:
+            errores.append("plazo_meses: Las pólizas mensuales necesitan al menos una cuota.")
+
+        numero = datos.get('numero_poliza')
+        if numero and (numero in existentes or numero in self.numeros_vistos):
+            errores.append(f"numero_poliza: Ya existe una póliza con el número {numero}.")
+
+        cliente_id = clientes.get(fila.get('cliente'))
+        if not cliente_id:
+            errores.append(f"cliente: No existe un cliente con cédula o usuario '{fila.get('cliente')}'.")
+        compania = self.companias.get(_normalizar(fila.get('compania')))
+        if not compania:
+            errores.append(f"compania: No existe la compañía '{fila.get('compania')}'.")
+        tipo = self.tipos.get(_normalizar(fila.get('tipo_seguro')))
+        if not tipo:
+            errores.append(f"tipo_seguro: No existe el tipo de seguro '{fila.get('tipo_seguro')}'.")
+        asesor = None
+        if fila.get('asesor'):
+            asesor = self.asesores.get(_normalizar(fila['asesor']))
+            if not asesor:
+                errores.append(f"asesor: No existe el asesor '{fila['asesor']}'.")
+        vehiculo = None
+        if fila.get('placa'):
+            vehiculo = vehiculos.get(fila['placa'].upper())
+            if not vehiculo:
+                errores.append(f"placa: No existe un vehículo con placa '{fila['placa']}'.")
+
+        if errores:
+            return None, errores
+
+        poliza = Poliza(
+            cliente_id=cliente_id,
+            compania_aseguradora=compania,
+            tipo_seguro=tipo,
+            asesor=asesor,
+            vehiculo=vehiculo,
+            **datos
+        )
+        poliza.congelar_tarifas()
+        return poliza, None
+
+    # --- Lotes ---
+
+    def procesar_lote(self, lote):
+        clientes, vehiculos, existentes = self._mapas_del_lote(lote)
+        polizas = []
+        filas_validas = []
+        for numero_fila, fila in lote:
+            self.procesadas += 1
+            poliza, errores = self.construir_poliza(fila, clientes, vehiculos, existentes)
+            if errores:
+                self.registrar_error(numero_fila, fila.get('numero_poliza', ''), errores)
+                continue
+            self.numeros_vistos.add(poliza.numero_poliza)
+            polizas.append(poliza)
+            filas_validas.append((numero_fila, poliza.numero_poliza))
+
+        if not polizas or self.simular:
+            self.importadas += len(polizas)
+            return
+
+        try:
+            with transaction.atomic():
+                self.guardar_lote(polizas)
+        except Exception as e:
+            # Un error de base de datos descarta el lote completo, no la importación
+            logger.exception(f"Error al guardar un lote de {len(polizas)} pólizas importadas: {e}")
+            for numero_fila, numero in filas_validas:
+                self.registrar_error(numero_fila, numero, [f"Lote descartado por un error al guardar: {e}"])
+            return
+        self.importadas += len(polizas)
+
+    def guardar_lote(self, polizas):
+        Poliza.objects.bulk_create(polizas)
+
+        cuotas = [cuota for poliza in polizas for cuota in construir_cuotas(poliza)]
+        Cuota.objects.bulk_create(cuotas, batch_size=1000)
+
+        pagos = [pago for pago in map(construir_pago_comision, polizas) if pago]
+        Pago.objects.bulk_create(pagos, batch_size=1000)
+
+        # Lo que hace actualizar_recordatorio_soat en polizas/signals.py
+        recordatorios = {}
+        for poliza in polizas:
+            if poliza.vehiculo_id and 'soat' in poliza.tipo_seguro.nombre.lower():
+                recordatorios[poliza.vehiculo_id] = poliza.fecha_fin
+        Vehiculo.objects.bulk_update(
+            [Vehiculo(pk=pk, soat_vencimiento_recordatorio=fecha) for pk, fecha in recordatorios.items()],
+            ['soat_vencimiento_recordatorio']
+        )
+
+        polizas_importadas.send(sender=Poliza, polizas=polizas, cuotas=cuotas, pagos=pagos)
+
+    def registrar_error(self, numero_fila, numero_poliza, errores):
+        self.con_error += 1
+        self.escritor_errores.writerow([numero_fila, numero_poliza, ' | '.join(errores)])
+
+
+def importar_polizas(archivo_texto, archivo_errores, tamano_lote=TAMANO_LOTE, simular=False):
+    """
+    Importa las pólizas de `archivo_texto` (un archivo de texto CSV) y
+    escribe las filas rechazadas en `archivo_errores`. Devuelve los totales.
+    """
+    importador = ImportadorPolizas(csv.writer(archivo_errores), tamano_lote=tamano_lote, simular=simular)
+    return importador.importar(archivo_texto)
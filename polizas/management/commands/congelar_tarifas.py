@@ -0,0 +1,53 @@
+# polizas/management/commands/congelar_tarifas.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+from polizas.models import Poliza, TipoSeguro
+from cartera.models import Pago
+
+
+class Command(BaseCommand):
+    help = (
+        'Copia a las pólizas (y a sus pagos) los porcentajes de comisión e IVA de su '
+        'tipo de seguro, para las que aún no los tienen congelados. Es obligatorio tras '
+        'migrar: los reportes (with_financials y totals) solo leen las tarifas congeladas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo muestra cuántos registros se actualizarían, sin guardar nada.'
+        )
+
+    def handle(self, *args, **options):
+        polizas_pendientes = Poliza.objects.filter(
+            Q(comision_porcentaje__isnull=True) | Q(porcentaje_iva__isnull=True)
+        )
+        pagos_pendientes = Pago.objects.filter(comision_porcentaje__isnull=True)
+
+        if options.get('dry_run'):
+            self.stdout.write(self.style.WARNING("Modo simulación (--dry-run): no se guardará ningún cambio."))
+            self.stdout.write(
+                f"Pólizas por completar: {polizas_pendientes.count()}. "
+                f"Pagos por completar: {pagos_pendientes.count()}."
+            )
+            return
+
+        tipo = TipoSeguro.objects.filter(pk=OuterRef('tipo_seguro_id'))
+        poliza = Poliza.objects.filter(pk=OuterRef('poliza_id'))
+
+        with transaction.atomic():
+            # Un UPDATE por tabla; las pólizas primero, porque los pagos copian su tarifa
+            polizas_actualizadas = polizas_pendientes.update(
+                comision_porcentaje=Subquery(tipo.values('comision_porcentaje')[:1]),
+                porcentaje_iva=Subquery(tipo.values('porcentaje_iva')[:1])
+            )
+            pagos_actualizados = pagos_pendientes.update(
+                comision_porcentaje=Subquery(poliza.values('comision_porcentaje')[:1])
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Tarifas congeladas. Pólizas actualizadas: {polizas_actualizadas}. "
+            f"Pagos actualizados: {pagos_actualizados}."
+        ))
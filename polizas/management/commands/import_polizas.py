@@ -0,0 +1,52 @@
+# polizas/management/commands/import_polizas.py
+import time
+from django.core.management.base import BaseCommand, CommandError
+from polizas.importacion import COLUMNAS_OBLIGATORIAS, COLUMNAS_OPCIONALES, TAMANO_LOTE, ErrorImportacion, importar_polizas
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa pólizas desde un CSV por lotes, con sus cuotas y pagos de comisión. '
+        f"Columnas obligatorias: {', '.join(COLUMNAS_OBLIGATORIAS)}. "
+        f"Opcionales: {', '.join(COLUMNAS_OPCIONALES)}."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del CSV (UTF-8) con una póliza por fila.')
+        parser.add_argument(
+            '--errores',
+            default=None,
+            help='Ruta del reporte de filas rechazadas (por defecto <archivo>.errores.csv).'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=TAMANO_LOTE,
+            help=f'Pólizas por transacción (por defecto {TAMANO_LOTE}).'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo valida el archivo y escribe el reporte de errores, sin guardar nada.'
+        )
+
+    def handle(self, *args, **options):
+        ruta_errores = options['errores'] or f"{options['archivo']}.errores.csv"
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("Modo simulación (--dry-run): no se guardará ningún cambio."))
+
+        inicio = time.perf_counter()
+        try:
+            with open(options['archivo'], newline='', encoding='utf-8-sig') as archivo, \
+                    open(ruta_errores, 'w', newline='', encoding='utf-8') as errores:
+                totales = importar_polizas(archivo, errores, tamano_lote=options['lote'], simular=options['dry_run'])
+        except (OSError, ErrorImportacion) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Filas procesadas: {totales['procesadas']}. Importadas: {totales['importadas']}. "
+            f"Con error: {totales['con_error']}."
+        ))
+        if totales['con_error']:
+            self.stdout.write(self.style.WARNING(f"Reporte de errores: {ruta_errores}"))
+        self.stdout.write(f"Tiempo total: {time.perf_counter() - inicio:.3f}s")
@@ -0,0 +1,60 @@
+# polizas/management/commands/regenerar_planes_pago.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from polizas.models import Poliza
+from polizas.plan_pagos import sincronizar_planes
+from reportes.cache import programar_invalidacion_cartera
+
+
+class Command(BaseCommand):
+    help = (
+        'Ajusta las cuotas no pagadas de las pólizas mensuales activas a su plan actual '
+        '(prima repartida al centavo, plazo y fecha de inicio). Sirve tras cambios masivos '
+        'de primas o para corregir planes con residuos de redondeo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Pólizas por transacción (por defecto 500).'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo muestra cuántas cuotas cambiarían, sin guardar nada.'
+        )
+
+    def handle(self, *args, **options):
+        simular = options['dry_run']
+        if simular:
+            self.stdout.write(self.style.WARNING("Modo simulación (--dry-run): no se guardará ningún cambio."))
+
+        polizas = Poliza.objects.filter(estado='ACTIVA', modo_pago='MENSUAL').only(
+            'pk', 'numero_poliza', 'valor_prima_sin_iva', 'plazo_meses', 'fecha_inicio', 'modo_pago'
+        ).order_by('pk')
+
+        totales = {'creadas': 0, 'actualizadas': 0, 'eliminadas': 0}
+        lote = []
+        for poliza in polizas.iterator(chunk_size=options['lote']):
+            lote.append(poliza)
+            if len(lote) >= options['lote']:
+                self._procesar(lote, totales, simular)
+                lote = []
+        if lote:
+            self._procesar(lote, totales, simular)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Cuotas creadas: {totales['creadas']}. Actualizadas: {totales['actualizadas']}. "
+            f"Eliminadas: {totales['eliminadas']}."
+        ))
+
+    def _procesar(self, polizas, totales, simular):
+        with transaction.atomic():
+            cambios = sincronizar_planes(polizas, simular=simular)
+            # bulk_create/bulk_update no disparan señales: invalidamos a mano los reportes de cartera
+            if not simular and any(cambios.values()):
+                programar_invalidacion_cartera()
+        for clave, cantidad in cambios.items():
+            totales[clave] += cantidad
@@ -1,4 +1,9 @@
+from decimal import Decimal
 from django.db import models
+from django.db.models import Count, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce, Upper
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import User
 from django.utils import timezone
 
@@ -20,11 +25,24 @@ class Vehiculo(models.Model):
     modelo = models.CharField(max_length=50, blank=True)
     ano = models.PositiveIntegerField('Año', blank=True, null=True)
     soat_vencimiento_recordatorio = models.DateField('Recordatorio Vencimiento SOAT', blank=True, null=True, help_text="Fecha de vencimiento del SOAT (incluso si no es de Assecol).")
+    # Vector de la búsqueda global (dashboard_admin/busqueda.py); se mantiene con señales
+    busqueda = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ['placa']
         verbose_name = "Vehículo"
         verbose_name_plural = "Vehículos"
+        indexes = [
+            # Alertas de SOAT del dashboard; solo los vehículos que tienen la fecha
+            models.Index(
+                fields=['soat_vencimiento_recordatorio'],
+                name='vehiculo_soat_venc_idx',
+                condition=models.Q(soat_vencimiento_recordatorio__isnull=False)
+            ),
+            # Autocompletar por prefijo de placa: placa__istartswith genera UPPER(placa::text) LIKE 'X%'
+            models.Index(OpClass(Upper('placa'), name='text_pattern_ops'), name='vehiculo_placa_prefijo_idx'),
+            GinIndex(fields=['busqueda'], name='vehiculo_busqueda_gin'),
+        ]
 
     def __str__(self):
         return f"{self.placa} ({self.marca} {self.modelo})"
@@ -52,6 +70,57 @@ class Asesor(models.Model):
     def __str__(self):
         return self.nombre_completo
     
+class PolizaQuerySet(models.QuerySet):
+    """
+    Consultas de pólizas con los valores financieros calculados en la base
+    de datos (mismas fórmulas que las propiedades valor_iva, valor_total_a_pagar
+    y valor_comision), para no tener que recorrer las pólizas en Python.
+
+    Usan solo las tarifas congeladas en la propia póliza, así que no necesitan
+    unir con TipoSeguro. Requisito: haber corrido el comando congelar_tarifas,
+    que completa las pólizas anteriores a esas columnas; una póliza sin tarifa
+    congelada quedaría con IVA y comisión nulos.
+    """
+
+    @staticmethod
+    def _dinero(expresion):
+        return ExpressionWrapper(expresion, output_field=models.DecimalField(max_digits=14, decimal_places=2))
+
+    @classmethod
+    def expresiones_financieras(cls, prefijo=''):
+        """
+        Expresiones de IVA, total y comisión. Con `prefijo` (por ejemplo
+        'poliza__') sirven para consultas de modelos relacionados, como Pago.
+        """
+        prima = F(f'{prefijo}valor_prima_sin_iva')
+        iva = cls._dinero(prima * F(f'{prefijo}porcentaje_iva') / 100)
+        return {
+            'iva_calculado': iva,
+            'total_calculado': cls._dinero(prima + iva),
+            'comision_calculada': cls._dinero(prima * F(f'{prefijo}comision_porcentaje') / 100),
+        }
+
+    def with_financials(self):
+        """Anota cada póliza con iva_calculado, total_calculado y comision_calculada."""
+        return self.annotate(**self.expresiones_financieras())
+
+    def totals(self):
+        """
+        Suma primas, IVA, total a pagar y comisiones del queryset en una sola
+        consulta. Devuelve un dict con total_primas, total_iva, total_a_pagar,
+        total_comisiones y cantidad.
+        """
+        expresiones = self.expresiones_financieras()
+        cero = Value(Decimal('0'), output_field=models.DecimalField(max_digits=14, decimal_places=2))
+        return self.aggregate(
+            total_primas=Coalesce(Sum('valor_prima_sin_iva'), cero),
+            total_iva=Coalesce(Sum(expresiones['iva_calculado']), cero),
+            total_a_pagar=Coalesce(Sum(expresiones['total_calculado']), cero),
+            total_comisiones=Coalesce(Sum(expresiones['comision_calculada']), cero),
+            cantidad=Count('pk'),
+        )
+
+
 class Poliza(models.Model):
     # --- Opciones para los campos 'choices' ---
     MODO_PAGO_CHOICES = [
@@ -107,26 +176,148 @@ class Poliza(models.Model):
         help_text="El asesor que realizó la venta."
     )
 
+    # --- Tarifas congeladas al emitir la póliza ---
+    # Se copian del TipoSeguro al crear la póliza, para que editar un tipo de
+    # seguro no cambie las cifras de pólizas ya emitidas.
+    comision_porcentaje = models.DecimalField('Porcentaje de Comisión (%)', max_digits=5, decimal_places=2, null=True, blank=True, help_text="Copiado del tipo de seguro al emitir la póliza.")
+    porcentaje_iva = models.DecimalField('Porcentaje de IVA (%)', max_digits=5, decimal_places=2, null=True, blank=True, help_text="Copiado del tipo de seguro al emitir la póliza.")
+
     monto_devolucion = models.DecimalField('Monto a Devolver', max_digits=12, decimal_places=2, null=True, blank=True, help_text="Calculado al momento de la cancelación.")
     comision_devuelta = models.DecimalField('Comisión a Devolver', max_digits=12, decimal_places=2, null=True, blank=True, help_text="Comisión que Assecol retorna, calculada al cancelar.")
+
+    # Vector de la búsqueda global (dashboard_admin/busqueda.py); se mantiene con señales
+    busqueda = SearchVectorField(null=True, editable=False)
     
     
+    objects = PolizaQuerySet.as_manager()
+
     class Meta:
         ordering = ['-fecha_fin']
+        indexes = [
+            # Pólizas por vencer (dashboard y recordatorios): estado='ACTIVA' y rango de fecha_fin
+            models.Index(fields=['estado', 'fecha_fin'], name='poliza_estado_fin_idx'),
+            # Reporte por asesor: asesor y rango de fecha_inicio del mes
+            models.Index(fields=['asesor', 'fecha_inicio'], name='poliza_asesor_inicio_idx'),
+            # Paginación por cursor de la cartera general: ORDER BY fecha_fin DESC, id DESC
+            models.Index(fields=['-fecha_fin', '-id'], name='poliza_fin_id_idx'),
+            # Autocompletar por prefijo del número de póliza
+            models.Index(OpClass(Upper('numero_poliza'), name='text_pattern_ops'), name='poliza_numero_prefijo_idx'),
+            GinIndex(fields=['busqueda'], name='poliza_busqueda_gin'),
+        ]
 
     def __str__(self):
         return f"Póliza {self.numero_poliza} - {self.cliente.username}"
 
+    # --- Seguimiento de cambios ---
+    # Los receptores de post_save (plan de pagos, recordatorio SOAT, pago de
+    # comisión, resumen mensual, búsqueda) solo trabajan si cambió alguno de
+    # sus campos. La póliza guarda una instantánea de estos campos al
+    # cargarse y al guardarse, y durante el save() expone en
+    # `cambios_guardados` los que cambiaron.
+    CAMPOS_RASTREADOS = (
+        'cliente_id', 'compania_aseguradora_id', 'tipo_seguro_id', 'asesor_id', 'vehiculo_id',
+        'numero_poliza', 'fecha_inicio', 'fecha_fin', 'valor_prima_sin_iva', 'modo_pago', 'plazo_meses',
+        'estado', 'estado_cartera', 'comision_porcentaje', 'porcentaje_iva',
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._tomar_instantanea()
+        return instancia
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._tomar_instantanea()
+
+    def _tomar_instantanea(self, campos=None):
+        """Guarda los valores actuales de los campos rastreados que estén cargados."""
+        if not hasattr(self, '_instantanea'):
+            self._instantanea = {}
+        for campo in self.CAMPOS_RASTREADOS if campos is None else campos:
+            if campo in self.__dict__ and campo in self.CAMPOS_RASTREADOS:
+                self._instantanea[campo] = self.__dict__[campo]
+
+    def valores_originales(self):
+        """Valores de los campos rastreados al cargar la póliza, o None si es nueva."""
+        if self._state.adding or not hasattr(self, '_instantanea'):
+            return None
+        return dict(self._instantanea)
+
+    def campos_modificados(self):
+        """
+        Campos rastreados que difieren de la instantánea. Si la póliza es
+        nueva o no se cargó de la base de datos, se consideran todos.
+        """
+        originales = self.valores_originales()
+        if originales is None:
+            return set(self.CAMPOS_RASTREADOS)
+        return {
+            campo for campo in self.CAMPOS_RASTREADOS
+            if campo in self.__dict__ and (campo not in originales or originales[campo] != self.__dict__[campo])
+        }
+
+    def guardado_cambio(self, *campos):
+        """Para los receptores de señales: ¿el save() en curso cambió alguno de `campos`?"""
+        cambios = getattr(self, 'cambios_guardados', None)
+        if cambios is None:
+            return True
+        return bool(cambios & set(campos))
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        # Solo al crear o en un save() completo: con update_fields las tarifas
+        # no se escribirían y leer tipo_seguro sería una consulta de más
+        if update_fields is None and (self.comision_porcentaje is None or self.porcentaje_iva is None):
+            self.congelar_tarifas()
+
+        cambios = self.campos_modificados()
+        if update_fields is not None:
+            guardados = {self._meta.get_field(nombre).attname for nombre in update_fields}
+            cambios &= guardados
+        self.cambios_guardados = cambios
+        try:
+            super().save(*args, **kwargs)
+        finally:
+            self.cambios_guardados = None
+        self._tomar_instantanea(guardados if update_fields is not None else None)
+
+    def congelar_tarifas(self):
+        """Copia a la póliza los porcentajes actuales de su tipo de seguro."""
+        self.comision_porcentaje = self.tipo_seguro.comision_porcentaje
+        self.porcentaje_iva = self.tipo_seguro.porcentaje_iva
+
+    @property
+    def tarifa_iva(self):
+        """Porcentaje de IVA de la póliza (el del tipo de seguro si aún no se ha congelado)."""
+        if self.porcentaje_iva is not None:
+            return self.porcentaje_iva
+        return self.tipo_seguro.porcentaje_iva
+
+    @property
+    def tarifa_comision(self):
+        """Porcentaje de comisión de la póliza (el del tipo de seguro si aún no se ha congelado)."""
+        if self.comision_porcentaje is not None:
+            return self.comision_porcentaje
+        return self.tipo_seguro.comision_porcentaje
+
+    # Las propiedades financieras usan el valor anotado por
+    # Poliza.objects.with_financials() cuando está disponible.
+
     @property
     def valor_iva(self):
-        """Calcula el valor del IVA basado en la prima y el % del Tipo de Seguro."""
-        if self.valor_prima_sin_iva and self.tipo_seguro.porcentaje_iva:
-            return (self.valor_prima_sin_iva * self.tipo_seguro.porcentaje_iva) / 100
+        """Calcula el valor del IVA basado en la prima y el % de IVA congelado en la póliza."""
+        if hasattr(self, 'iva_calculado'):
+            return self.iva_calculado
+        if self.valor_prima_sin_iva and self.tarifa_iva:
+            return (self.valor_prima_sin_iva * self.tarifa_iva) / 100
         return 0
 
     @property
     def valor_total_a_pagar(self):
         """Calcula el valor final que el cliente debe pagar (Prima + IVA)."""
+        if hasattr(self, 'total_calculado'):
+            return self.total_calculado
         return self.valor_prima_sin_iva + self.valor_iva
 
     @property
@@ -135,8 +326,10 @@ class Poliza(models.Model):
         Calcula el valor de la comisión.
         IMPORTANTE: Ahora se basa en el valor de la prima SIN IVA.
         """
-        if self.valor_prima_sin_iva and self.tipo_seguro.comision_porcentaje:
-            return (self.valor_prima_sin_iva * self.tipo_seguro.comision_porcentaje) / 100
+        if hasattr(self, 'comision_calculada'):
+            return self.comision_calculada
+        if self.valor_prima_sin_iva and self.tarifa_comision:
+            return (self.valor_prima_sin_iva * self.tarifa_comision) / 100
         return 0
     
 
@@ -169,3 +362,97 @@ class Poliza(models.Model):
         return round(monto_a_devolver_cliente, 2), round(comision_a_devolver_assecol, 2)
     
 
+
+
+class NotificacionEnviada(models.Model):
+    """
+    Registro de las notificaciones ya enviadas por póliza, para no repetir
+    el mismo aviso en cada ejecución de las tareas programadas.
+    'ventana' es el hito en días antes del vencimiento (ej: 30, 15, 7, 1).
+    """
+    TIPO_NOTIFICACION_CHOICES = [
+        ('RECORDATORIO_VENCIMIENTO', 'Recordatorio de Vencimiento'),
+    ]
+
+    poliza = models.ForeignKey(Poliza, on_delete=models.CASCADE, related_name='notificaciones')
+    tipo = models.CharField('Tipo de Notificación', max_length=30, choices=TIPO_NOTIFICACION_CHOICES)
+    ventana = models.PositiveSmallIntegerField('Días antes del vencimiento')
+    fecha_envio = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Notificación Enviada"
+        verbose_name_plural = "Notificaciones Enviadas"
+        constraints = [
+            models.UniqueConstraint(fields=['poliza', 'tipo', 'ventana'], name='notificacion_unica_por_ventana'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} ({self.ventana} días) - Póliza {self.poliza_id}"
+
+
+class CorreoSaliente(models.Model):
+    """
+    Bandeja de salida de correos. Las vistas solo encolan aquí (en la misma
+    transacción que el cambio que notifican) y la tarea despachar_bandeja_salida
+    los envía en segundo plano, con reintentos. Tras EMAIL_MAX_INTENTOS fallos
+    el correo queda en estado FALLIDO para revisarlo a mano.
+    """
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('ENVIADO', 'Enviado'),
+        ('FALLIDO', 'Fallido'),
+    ]
+
+    asunto = models.CharField(max_length=255)
+    cuerpo_html = models.TextField()
+    destinatarios = models.JSONField(default=list)
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default='PENDIENTE')
+    intentos = models.PositiveSmallIntegerField(default=0)
+    ultimo_error = models.TextField(blank=True)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_envio = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Correo Saliente"
+        verbose_name_plural = "Bandeja de Salida"
+        ordering = ['fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'proximo_intento'], name='correo_estado_intento_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.asunto} -> {', '.join(self.destinatarios)} ({self.get_estado_display()})"
+
+
+class ImportacionPolizas(models.Model):
+    """
+    Archivo CSV de pólizas subido desde el dashboard. La tarea
+    importar_polizas_task lo procesa en segundo plano (ver polizas/importacion.py)
+    y deja aquí los totales y el reporte con las filas rechazadas.
+    """
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('PROCESANDO', 'Procesando'),
+        ('COMPLETADA', 'Completada'),
+        ('FALLIDA', 'Fallida'),
+    ]
+
+    archivo = models.FileField(upload_to='importaciones/polizas/')
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default='PENDIENTE')
+    filas_procesadas = models.PositiveIntegerField(default=0)
+    filas_importadas = models.PositiveIntegerField(default=0)
+    filas_con_error = models.PositiveIntegerField(default=0)
+    reporte_errores = models.FileField(upload_to='importaciones/errores/', blank=True, null=True)
+    mensaje = models.TextField(blank=True)
+    creado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='importaciones_polizas')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_fin = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Importación de Pólizas"
+        verbose_name_plural = "Importaciones de Pólizas"
+        ordering = ['-fecha_creacion']
+
+    def __str__(self):
+        return f"Importación #{self.pk} ({self.get_estado_display()})"
@@ -0,0 +1,143 @@
+# polizas/plan_pagos.py
+"""
+Registros de cartera que nacen con cada póliza: el plan de cuotas de las
+pólizas mensuales y el Pago de comisión de las de contado o crédito.
+
+Los usan las señales de polizas/signals.py (una póliza a la vez) y la
+importación masiva de polizas/importacion.py (con bulk_create).
+
+El plan de cuotas reparte la prima al centavo: las cuotas suman exactamente
+la prima. sincronizar_planes() compara el plan que le corresponde a cada
+póliza con sus cuotas actuales y aplica solo las diferencias sobre las
+cuotas no pagadas (un DELETE, un UPDATE y un INSERT en total, sin importar
+cuántas pólizas o cuotas sean), para cuando cambian la prima, el plazo, la
+fecha de inicio o la modalidad.
+"""
+import logging
+from decimal import ROUND_DOWN, Decimal
+from dateutil.relativedelta import relativedelta
+from cartera.models import Cuota, Pago
+
+logger = logging.getLogger('polizas')
+
+CENTAVO = Decimal('0.01')
+
+
+def repartir_centavos(total, partes):
+    """
+    Divide `total` en `partes` montos con centavos exactos que suman `total`.
+    Los centavos sobrantes van a las primeras partes: 100 / 3 -> 33.34, 33.33, 33.33.
+    """
+    if partes <= 0:
+        return []
+    total = Decimal(total).quantize(CENTAVO)
+    base = (total / partes).quantize(CENTAVO, rounding=ROUND_DOWN)
+    sobrante = int((total - base * partes) / CENTAVO)
+    return [base + CENTAVO if i < sobrante else base for i in range(partes)]
+
+
+def _fecha_cuota(poliza, numero):
+    return poliza.fecha_inicio + relativedelta(months=numero)
+
+
+def construir_cuotas(poliza):
+    """Cuotas sin guardar de una póliza MENSUAL (lista vacía para otros modos)."""
+    if poliza.modo_pago != 'MENSUAL':
+        return []
+    return [
+        Cuota(
+            poliza=poliza,
+            numero_cuota=numero,
+            fecha_vencimiento=_fecha_cuota(poliza, numero),
+            monto_cuota=monto
+        )
+        for numero, monto in enumerate(repartir_centavos(poliza.valor_prima_sin_iva, poliza.plazo_meses), start=1)
+    ]
+
+
+def _diferencias(poliza, existentes):
+    """
+    Compara el plan de la póliza con sus cuotas `existentes` y devuelve
+    (a crear, a actualizar, a eliminar). Las cuotas pagadas no se tocan: el
+    saldo (prima menos lo pagado) se reparte entre los números no pagados.
+    """
+    pagadas = {cuota.numero_cuota: cuota for cuota in existentes if cuota.estado == 'PAGADA'}
+    abiertas = {cuota.numero_cuota: cuota for cuota in existentes if cuota.estado != 'PAGADA'}
+
+    numeros = []
+    if poliza.modo_pago == 'MENSUAL':
+        numeros = [numero for numero in range(1, poliza.plazo_meses + 1) if numero not in pagadas]
+    saldo = poliza.valor_prima_sin_iva - sum((cuota.monto_cuota for cuota in pagadas.values()), Decimal('0'))
+    if numeros and saldo < 0:
+        logger.warning(
+            f"Lo pagado en la póliza #{poliza.numero_poliza} supera su prima; las cuotas pendientes quedan en 0."
+        )
+        saldo = Decimal('0')
+
+    crear, actualizar = [], []
+    for numero, monto in zip(numeros, repartir_centavos(saldo, len(numeros))):
+        fecha = _fecha_cuota(poliza, numero)
+        cuota = abiertas.pop(numero, None)
+        if cuota is None:
+            crear.append(Cuota(poliza=poliza, numero_cuota=numero, fecha_vencimiento=fecha, monto_cuota=monto))
+        elif cuota.fecha_vencimiento != fecha or cuota.monto_cuota != monto:
+            cuota.fecha_vencimiento = fecha
+            cuota.monto_cuota = monto
+            actualizar.append(cuota)
+    # Lo que queda abierto sobra en el plan nuevo (plazo más corto o ya no es mensual)
+    return crear, actualizar, list(abiertas.values())
+
+
+def sincronizar_planes(polizas, simular=False):
+    """
+    Ajusta las cuotas no pagadas de `polizas` a su plan actual. Lee las
+    cuotas existentes con una consulta y escribe con un DELETE, un UPDATE
+    y un INSERT como máximo. Devuelve los totales creados, actualizados y
+    eliminados; con simular=True solo los cuenta.
+    """
+    polizas = list(polizas)
+    existentes = {}
+    for cuota in Cuota.objects.filter(poliza__in=polizas).order_by():
+        existentes.setdefault(cuota.poliza_id, []).append(cuota)
+
+    crear, actualizar, eliminar = [], [], []
+    for poliza in polizas:
+        a_crear, a_actualizar, a_eliminar = _diferencias(poliza, existentes.get(poliza.pk, []))
+        crear += a_crear
+        actualizar += a_actualizar
+        eliminar += a_eliminar
+
+    totales = {'creadas': len(crear), 'actualizadas': len(actualizar), 'eliminadas': len(eliminar)}
+    if simular:
+        return totales
+
+    # Primero se borra, para no chocar con (poliza, numero_cuota) al crear
+    if eliminar:
+        Cuota.objects.filter(pk__in=[cuota.pk for cuota in eliminar]).delete()
+    if actualizar:
+        Cuota.objects.bulk_update(actualizar, ['fecha_vencimiento', 'monto_cuota'])
+    if crear:
+        Cuota.objects.bulk_create(crear)
+    return totales
+
+
+def sincronizar_cuotas(poliza):
+    """Ajusta el plan de cuotas de una sola póliza (ver sincronizar_planes)."""
+    return sincronizar_planes([poliza])
+
+
+def construir_pago_comision(poliza, notas='Registro de comisión generado automáticamente al crear la póliza.'):
+    """Pago de comisión sin guardar de una póliza de CONTADO o CREDITO, o None si no aplica."""
+    if poliza.modo_pago not in ('CONTADO', 'CREDITO'):
+        return None
+    comision = poliza.valor_comision
+    if not comision or comision <= 0:
+        return None
+    return Pago(
+        poliza=poliza,
+        fecha_pago=poliza.fecha_inicio,
+        monto_pagado=comision,
+        comision_porcentaje=poliza.comision_porcentaje,
+        estado_comision='PENDIENTE',
+        notas=notas
+    )
@@ -1,35 +1,50 @@
 # polizas/signals.py
 import logging
 from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.dispatch import Signal, receiver
 from .models import Poliza
 from cartera.models import Cuota, Pago
-from dateutil.relativedelta import relativedelta
+from .plan_pagos import construir_cuotas, construir_pago_comision, sincronizar_cuotas
 
 logger = logging.getLogger('polizas')
 
+# La importación masiva crea pólizas, cuotas y pagos con bulk_create, que no
+# dispara post_save. Al terminar cada lote envía esta señal con las listas
+# creadas (polizas=[...], cuotas=[...], pagos=[...]) para que las demás apps
+# actualicen lo que normalmente mantienen con sus receptores de post_save.
+polizas_importadas = Signal()
+
+# La cancelación en bloque guarda las pólizas y ajusta sus pagos de comisión
+# con bulk_update, que tampoco dispara post_save. Se envía con las pólizas
+# canceladas y los pagos ajustados (polizas=[...], pagos=[...]).
+polizas_canceladas = Signal()
+
 
 @receiver(post_save, sender=Poliza)
 def crear_plan_de_pagos(sender, instance, created, **kwargs):
     """
     Si una póliza es NUEVA y su modo de pago es MENSUAL,
     crea automáticamente las cuotas correspondientes.
+    Si se edita la prima, el plazo, la fecha de inicio o la modalidad de una
+    póliza activa, ajusta sus cuotas no pagadas al nuevo plan.
     """
-    if created and instance.modo_pago == 'MENSUAL':
-        try:
-            monto_cuota = instance.valor_prima_sin_iva / instance.plazo_meses
-            cuotas_a_crear = []
-
-            for i in range(instance.plazo_meses):
-                fecha_vencimiento = instance.fecha_inicio + relativedelta(months=i + 1)
-                cuotas_a_crear.append(
-                    Cuota(
-                        poliza=instance,
-                        numero_cuota=i + 1,
-                        fecha_vencimiento=fecha_vencimiento,
-                        monto_cuota=monto_cuota
-                    )
+    if not created:
+        if instance.estado == 'ACTIVA' and instance.guardado_cambio(
+            'valor_prima_sin_iva', 'plazo_meses', 'fecha_inicio', 'modo_pago'
+        ):
+            cambios = sincronizar_cuotas(instance)
+            if any(cambios.values()):
+                logger.info(
+                    f"Plan de pagos ajustado para póliza #{instance.numero_poliza}: "
+                    f"{cambios['creadas']} creadas, {cambios['actualizadas']} actualizadas, "
+                    f"{cambios['eliminadas']} eliminadas"
                 )
+        return
+
+    if instance.modo_pago == 'MENSUAL':
+        try:
+            cuotas_a_crear = construir_cuotas(instance)
+            monto_cuota = cuotas_a_crear[0].monto_cuota if cuotas_a_crear else 0
 
             # Bulk create para mejor performance
             Cuota.objects.bulk_create(cuotas_a_crear)
@@ -50,12 +65,18 @@ def actualizar_recordatorio_soat(sender, instance, **kwargs):
     Si se guarda una póliza de tipo SOAT que está vinculada a un vehículo,
     actualiza la fecha del recordatorio en el modelo Vehiculo.
     """
-    if instance.tipo_seguro and instance.vehiculo:
+    # Solo si cambió alguno de sus datos: evita cargar el tipo y el vehículo
+    # en cada guardado (por ejemplo, al cambiar el estado de cartera)
+    if not instance.guardado_cambio('tipo_seguro_id', 'vehiculo_id', 'fecha_fin'):
+        return
+    if instance.tipo_seguro_id and instance.vehiculo_id:
         if 'soat' in instance.tipo_seguro.nombre.lower():
+            vehiculo = instance.vehiculo
+            if vehiculo.soat_vencimiento_recordatorio == instance.fecha_fin:
+                return
             try:
-                vehiculo = instance.vehiculo
                 vehiculo.soat_vencimiento_recordatorio = instance.fecha_fin
-                vehiculo.save()
+                vehiculo.save(update_fields=['soat_vencimiento_recordatorio'])
                 logger.info(
                     f"Recordatorio SOAT actualizado para vehículo {vehiculo.placa} "
                     f"a la fecha {instance.fecha_fin}"
@@ -74,19 +95,12 @@ def crear_pago_para_contado_y_credito(sender, instance, created, **kwargs):
     Si se ACTUALIZA y sigue ACTIVA, recalcula el monto del Pago si la prima cambió.
     """
     if instance.modo_pago in ['CONTADO', 'CREDITO']:
-        comision_actual = instance.valor_comision
-
         if created:
             # Lógica de Creación
+            comision_actual = instance.valor_comision
             if comision_actual and comision_actual > 0:
                 try:
-                    Pago.objects.create(
-                        poliza=instance,
-                        fecha_pago=instance.fecha_inicio,
-                        monto_pagado=comision_actual,
-                        estado_comision='PENDIENTE',
-                        notas='Registro de comisión generado automáticamente al crear la póliza.'
-                    )
+                    construir_pago_comision(instance).save()
                     logger.info(
                         f"Pago de comisión creado para póliza #{instance.numero_poliza}: "
                         f"${comision_actual:.2f}"
@@ -97,13 +111,18 @@ def crear_pago_para_contado_y_credito(sender, instance, created, **kwargs):
                     )
                     raise
         else:
-            # Lógica de Actualización
-            if instance.estado == 'ACTIVA':
+            # Lógica de Actualización: solo si cambió algo de lo que depende la comisión
+            if instance.estado == 'ACTIVA' and instance.guardado_cambio(
+                'valor_prima_sin_iva', 'comision_porcentaje', 'tipo_seguro_id', 'modo_pago', 'estado'
+            ):
+                # Se calcula aquí: sin tarifa congelada, valor_comision consulta el tipo de seguro
+                comision_actual = instance.valor_comision
                 try:
                     pago_existente = Pago.objects.get(poliza=instance, cuota__isnull=True)
                     if pago_existente.monto_pagado != comision_actual:
                         monto_anterior = pago_existente.monto_pagado
                         pago_existente.monto_pagado = comision_actual
+                        pago_existente.comision_porcentaje = instance.comision_porcentaje
                         pago_existente.save()
                         logger.info(
                             f"Pago actualizado para póliza #{instance.numero_poliza}: "
@@ -112,13 +131,9 @@ def crear_pago_para_contado_y_credito(sender, instance, created, **kwargs):
                 except Pago.DoesNotExist:
                     # Si no existe, lo creamos (caso borde)
                     if comision_actual and comision_actual > 0:
-                        Pago.objects.create(
-                            poliza=instance,
-                            fecha_pago=instance.fecha_inicio,
-                            monto_pagado=comision_actual,
-                            estado_comision='PENDIENTE',
-                            notas='Registro de comisión generado al actualizar póliza.'
-                        )
+                        construir_pago_comision(
+                            instance, notas='Registro de comisión generado al actualizar póliza.'
+                        ).save()
                         logger.warning(
                             f"Pago faltante creado para póliza #{instance.numero_poliza} "
                             f"durante actualización: ${comision_actual:.2f}"
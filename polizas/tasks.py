@@ -1,99 +1,415 @@
+import io
 import logging
-from celery import shared_task
+import tempfile
+import time
+from celery import chord, group, shared_task
+from celery.utils.time import get_exponential_backoff_interval
 from django.utils import timezone
 from datetime import timedelta
-from .models import Poliza
-from django.core.mail import EmailMessage
+from .models import CorreoSaliente, ImportacionPolizas, NotificacionEnviada, Poliza
+from .importacion import importar_polizas
+from .correo import (
+    abrir_conexion, cerrar_conexion, construir_correo_html, deserializar_correo,
+    encolar_correo, enviar_en_lotes, enviar_lote, respetar_limite, serializar_correo
+)
+from django.core.files import File
 from django.template.loader import render_to_string
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, Exists, F, IntegerField, OuterRef, Value, When
 
 logger = logging.getLogger('polizas')
 
+TIPO_RECORDATORIO = 'RECORDATORIO_VENCIMIENTO'
+
+
+@shared_task(bind=True, max_retries=5)
+def reenviar_lote_correos(self, correos, notificaciones=None):
+    """
+    Reintenta el envío de un lote de correos que falló, con backoff exponencial.
+    Recibe los correos serializados con polizas.correo.serializar_correo y,
+    opcionalmente, `notificaciones` alineada con `correos`: el par
+    [poliza_id, ventana] del recordatorio de cada correo (o None), que se
+    registra en NotificacionEnviada cuando ese correo sale.
+
+    Los correos salen uno por uno; si alguno falla, el siguiente reintento
+    lleva solo los que faltan, para no mandar dos veces los ya entregados.
+    """
+    notificaciones = notificaciones or [None] * len(correos)
+    conexion = abrir_conexion()
+    try:
+        enviados, pendientes, error = enviar_lote(conexion, [deserializar_correo(datos) for datos in correos])
+    finally:
+        cerrar_conexion(conexion)
+
+    entregados = len(correos) - len(pendientes)
+    registrar_recordatorios_enviados([par for par in notificaciones[:entregados] if par])
+    if error is not None:
+        logger.warning(f"Reintento de lote: {entregados} de {len(correos)} correos enviados, se reprograman los demás: {error}")
+        raise self.retry(
+            args=[correos[entregados:], notificaciones[entregados:]],
+            exc=error,
+            countdown=get_exponential_backoff_interval(
+                factor=1, retries=self.request.retries, maximum=600, full_jitter=True
+            )
+        )
+    logger.info(f"Lote reintentado con éxito: {enviados} correo(s) enviados.")
+    return enviados
+
+
+def registrar_recordatorios_enviados(pares):
+    """
+    Guarda en el registro de notificaciones los recordatorios enviados.
+    `pares` es una lista de [poliza_id, ventana]; los duplicados se ignoran
+    gracias a la restricción única (poliza, tipo, ventana).
+    """
+    NotificacionEnviada.objects.bulk_create(
+        [
+            NotificacionEnviada(poliza_id=poliza_id, tipo=TIPO_RECORDATORIO, ventana=ventana)
+            for poliza_id, ventana in pares
+        ],
+        ignore_conflicts=True
+    )
+
+
+def ventana_de_recordatorio(hoy):
+    """
+    Anota cada póliza con el hito de recordatorio que le corresponde hoy: el
+    menor hito de RECORDATORIOS_HITOS_DIAS que sea >= a los días que le faltan
+    para vencer (ej: a 10 días del vencimiento le corresponde el hito de 15).
+    """
+    return Case(
+        *[
+            When(fecha_fin__lte=hoy + timedelta(days=hito), then=Value(hito))
+            for hito in sorted(settings.RECORDATORIOS_HITOS_DIAS)
+        ],
+        output_field=IntegerField()
+    )
+
 
 @shared_task
 def enviar_recordatorios_vencimiento():
     """
     Tarea de Celery que se ejecuta periódicamente para encontrar pólizas
-    próximas a vencer y enviar notificaciones por correo electrónico
-    tanto al cliente como a un correo administrativo.
+    próximas a vencer y enviar notificaciones por correo electrónico al
+    cliente. El administrador recibe un solo resumen por ejecución (o una
+    copia por póliza si RECORDATORIOS_COPIA_ADMIN_POR_POLIZA está activo).
+
+    Cada póliza recibe un solo recordatorio por hito (ver RECORDATORIOS_HITOS_DIAS
+    y NotificacionEnviada), así que volver a ejecutar la tarea no repite envíos.
+
+    Actúa como coordinadora: solo reúne los IDs de las pólizas y reparte el
+    envío en subtareas de RECORDATORIOS_POLIZAS_POR_SUBTAREA pólizas cada una
+    (un chord), para que trabajen todos los workers a la vez. Al final,
+    resumir_recordatorios registra el resumen total.
     """
     logger.info("Iniciando tarea: enviar_recordatorios_vencimiento")
 
     hoy = timezone.now().date()
-    fecha_limite = hoy + timedelta(days=30)
+    fecha_limite = hoy + timedelta(days=max(settings.RECORDATORIOS_HITOS_DIAS))
 
-    polizas_por_vencer = Poliza.objects.filter(
+    # Anti-join contra el registro: solo las pólizas que aún no recibieron
+    # el recordatorio del hito en el que están hoy.
+    ya_notificadas = NotificacionEnviada.objects.filter(
+        poliza=OuterRef('pk'),
+        tipo=TIPO_RECORDATORIO,
+        ventana=OuterRef('ventana')
+    )
+    pendientes = list(Poliza.objects.filter(
         estado='ACTIVA',
         fecha_fin__gte=hoy,
         fecha_fin__lte=fecha_limite
-    ).select_related('cliente', 'tipo_seguro', 'vehiculo')
+    ).annotate(
+        ventana=ventana_de_recordatorio(hoy)
+    ).filter(
+        ~Exists(ya_notificadas)
+    ).order_by('pk').values_list('pk', 'ventana'))
 
-    if not polizas_por_vencer.exists():
-        logger.info("No se encontraron pólizas por vencer en los próximos 30 días.")
+    if not pendientes:
+        logger.info("No hay pólizas con recordatorios pendientes para hoy.")
         return "No hay pólizas por vencer para procesar."
 
-    total_polizas = polizas_por_vencer.count()
-    logger.info(f"Se encontraron {total_polizas} pólizas por vencer. Enviando correos...")
+    total_polizas = len(pendientes)
+    tamano = settings.RECORDATORIOS_POLIZAS_POR_SUBTAREA
+    subtareas = [
+        enviar_recordatorios_lote.s([list(par) for par in pendientes[i:i + tamano]])
+        for i in range(0, total_polizas, tamano)
+    ]
 
-    enviados_exitosos = 0
-    errores = 0
+    logger.info(
+        f"Se encontraron {total_polizas} pólizas por vencer. "
+        f"Repartiendo el envío en {len(subtareas)} subtarea(s)..."
+    )
+    chord(group(subtareas))(resumir_recordatorios.s(total_polizas))
 
-    for poliza in polizas_por_vencer:
-        contexto_email = {'poliza': poliza}
+    return f"Envío repartido en {len(subtareas)} subtarea(s) para {total_polizas} pólizas."
 
-        try:
-            # Correo para el Cliente
-            cuerpo_html_cliente = render_to_string('emails/recordatorio_vencimiento.html', contexto_email)
-            asunto_cliente = f"Recordatorio: Tu póliza #{poliza.numero_poliza} está por vencer"
-
-            email_cliente = EmailMessage(
-                asunto_cliente,
-                cuerpo_html_cliente,
-                settings.DEFAULT_FROM_EMAIL,
-                [poliza.cliente.email]
-            )
-            email_cliente.content_subtype = "html"
-            email_cliente.send()
 
-            logger.info(
-                f"Correo de recordatorio enviado a cliente {poliza.cliente.email} "
-                f"para póliza #{poliza.numero_poliza}"
-            )
+@shared_task
+def enviar_recordatorios_lote(pendientes):
+    """
+    Envía los recordatorios de vencimiento de un grupo de pólizas.
+    `pendientes` es una lista de pares [poliza_id, ventana].
+
+    Los correos se envían por lotes sobre una sola conexión SMTP
+    (ver polizas.correo.enviar_en_lotes); los lotes que fallan se
+    reprograman en reenviar_lote_correos. Cada recordatorio enviado al
+    cliente queda registrado en NotificacionEnviada.
+
+    Devuelve un dict con los conteos para resumir_recordatorios.
+    """
+    ventanas = dict(pendientes)
+    polizas = Poliza.objects.filter(
+        pk__in=ventanas
+    ).select_related('cliente', 'tipo_seguro', 'vehiculo')
 
-            # Correo para el Administrador
-            if settings.ADMIN_EMAIL:
-                cuerpo_html_admin = render_to_string('emails/recordatorio_vencimiento_admin.html', contexto_email)
-                asunto_admin = f"Alerta Vencimiento: Póliza de {poliza.cliente.get_full_name()}"
+    total_polizas = 0
+    errores = 0
+    recordatorios_preparados = []
+
+    def generar_correos():
+        nonlocal total_polizas, errores
+        for poliza in polizas:
+            total_polizas += 1
+            contexto_email = {'poliza': poliza}
+
+            try:
+                # Correo para el Cliente
+                correo_cliente = construir_correo_html(
+                    f"Recordatorio: Tu póliza #{poliza.numero_poliza} está por vencer",
+                    render_to_string('emails/recordatorio_vencimiento.html', contexto_email),
+                    [poliza.cliente.email]
+                )
+                correo_cliente.notificacion = [poliza.pk, ventanas[poliza.pk]]
+                correos = [correo_cliente]
 
-                email_admin = EmailMessage(
-                    asunto_admin,
-                    cuerpo_html_admin,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [settings.ADMIN_EMAIL]
+                # Copia por póliza para el Administrador (opcional; por defecto
+                # recibe un solo resumen al final del proceso)
+                if settings.ADMIN_EMAIL and settings.RECORDATORIOS_COPIA_ADMIN_POR_POLIZA:
+                    correos.append(construir_correo_html(
+                        f"Alerta Vencimiento: Póliza de {poliza.cliente.get_full_name()}",
+                        render_to_string('emails/recordatorio_vencimiento_admin.html', contexto_email),
+                        [settings.ADMIN_EMAIL]
+                    ))
+            except Exception as e:
+                errores += 1
+                logger.exception(
+                    f"Error al preparar correos para póliza #{poliza.numero_poliza} "
+                    f"(cliente: {poliza.cliente.email}): {e}"
                 )
-                email_admin.content_subtype = "html"
-                email_admin.send()
+                # Continuamos con las siguientes pólizas en lugar de detener todo el proceso
+                continue
 
-                logger.debug(f"Copia de recordatorio enviada a admin: {settings.ADMIN_EMAIL}")
+            recordatorios_preparados.append(correo_cliente.notificacion)
+            yield from correos
 
-            enviados_exitosos += 1
+    enviados, lotes_fallidos, segundos = enviar_en_lotes(generar_correos())
 
+    reprogramados = 0
+    ids_fallidos = set()
+    for lote in lotes_fallidos:
+        # Alineada con el lote: la copia del administrador no tiene notificación
+        notificaciones = [getattr(correo, 'notificacion', None) for correo in lote]
+        ids_fallidos.update(par[0] for par in notificaciones if par)
+        try:
+            reenviar_lote_correos.delay([serializar_correo(correo) for correo in lote], notificaciones)
+            reprogramados += len(lote)
         except Exception as e:
-            errores += 1
-            logger.exception(
-                f"Error al enviar correos para póliza #{poliza.numero_poliza} "
-                f"(cliente: {poliza.cliente.email}): {e}"
-            )
-            # Continuamos con las siguientes pólizas en lugar de detener todo el proceso
+            errores += len(lote)
+            logger.exception(f"No se pudo reprogramar un lote de {len(lote)} correos: {e}")
+
+    registrar_recordatorios_enviados([
+        [poliza_id, ventana] for poliza_id, ventana in recordatorios_preparados
+        if poliza_id not in ids_fallidos
+    ])
+
+    return {
+        'total': total_polizas,
+        'enviados': enviados,
+        'errores': errores,
+        'reprogramados': reprogramados,
+        'segundos': segundos,
+        # Pólizas cuyo recordatorio salió o quedó reprogramado, para el resumen del admin
+        'polizas': [poliza_id for poliza_id, _ in recordatorios_preparados],
+    }
+
+
+@shared_task
+def resumir_recordatorios(resultados, total_polizas):
+    """
+    Callback del chord de recordatorios: suma los conteos de cada subtarea,
+    registra el resumen del proceso y encola el resumen para el administrador.
+    """
+    enviados = sum(r['enviados'] for r in resultados)
+    errores = sum(r['errores'] for r in resultados)
+    reprogramados = sum(r['reprogramados'] for r in resultados)
+    # Las subtareas corren en paralelo: la velocidad agregada es la suma de cada una
+    velocidad = sum(r['enviados'] / r['segundos'] for r in resultados if r['segundos'] > 0)
 
     resultado = (
         f"Proceso completado. Total: {total_polizas}, "
-        f"Enviados: {enviados_exitosos}, Errores: {errores}"
+        f"Enviados: {enviados}, Errores: {errores}, "
+        f"Reprogramados: {reprogramados}, "
+        f"Velocidad: {velocidad:.1f} correos/s"
     )
 
-    if errores > 0:
+    if errores > 0 or reprogramados > 0:
         logger.warning(resultado)
     else:
         logger.info(resultado)
 
+    if settings.ADMIN_EMAIL and not settings.RECORDATORIOS_COPIA_ADMIN_POR_POLIZA:
+        polizas_notificadas = [pk for r in resultados for pk in r.get('polizas', [])]
+        try:
+            encolar_resumen_vencimientos_admin(polizas_notificadas)
+        except Exception as e:
+            logger.exception(f"Error al encolar el resumen de vencimientos para el administrador: {e}")
+
+    return resultado
+
+
+def encolar_resumen_vencimientos_admin(polizas_ids):
+    """
+    Encola en la bandeja de salida un único correo para el administrador con
+    las pólizas notificadas, agrupadas por compañía, tipo de seguro y fecha de
+    vencimiento. La tabla sale de una sola consulta agrupada.
+    """
+    if not polizas_ids:
+        return None
+
+    hoy = timezone.now().date()
+    filas = list(Poliza.objects.filter(
+        pk__in=polizas_ids
+    ).values(
+        'compania_aseguradora__nombre', 'tipo_seguro__nombre', 'fecha_fin'
+    ).annotate(
+        cantidad=Count('pk')
+    ).order_by('fecha_fin', 'compania_aseguradora__nombre', 'tipo_seguro__nombre'))
+
+    for fila in filas:
+        fila['dias_para_vencer'] = (fila['fecha_fin'] - hoy).days
+
+    return encolar_correo(
+        f"Resumen de vencimientos: {len(polizas_ids)} póliza(s) por vencer",
+        'emails/resumen_vencimientos_admin.html',
+        {'fecha': hoy, 'filas': filas, 'total_polizas': len(polizas_ids)},
+        [settings.ADMIN_EMAIL]
+    )
+
+
+def _reprogramar_correos(filas, error, ahora):
+    """
+    Registra un intento fallido en cada correo de la bandeja: vuelve a
+    intentarlo más tarde con espera exponencial, o lo deja FALLIDO al llegar
+    a EMAIL_MAX_INTENTOS.
+    """
+    for fila in filas:
+        fila.intentos += 1
+        fila.ultimo_error = str(error)[:1000]
+        if fila.intentos >= settings.EMAIL_MAX_INTENTOS:
+            fila.estado = 'FALLIDO'
+            logger.error(f"Correo #{fila.pk} ('{fila.asunto}') marcado como FALLIDO tras {fila.intentos} intentos: {error}")
+        else:
+            fila.proximo_intento = ahora + timedelta(minutes=2 ** fila.intentos)
+    CorreoSaliente.objects.bulk_update(filas, ['intentos', 'ultimo_error', 'estado', 'proximo_intento'])
+
+
+@shared_task
+def despachar_bandeja_salida():
+    """
+    Envía los correos pendientes de la bandeja de salida (CorreoSaliente).
+
+    Toma los correos por lotes de EMAIL_LOTE_TAMANO con SELECT ... FOR UPDATE
+    SKIP LOCKED, así varios workers pueden despachar a la vez sin mandar dos
+    veces el mismo correo. Todos los lotes comparten una conexión SMTP.
+    Los correos que fallan (no los que ya salieron del lote) se reprograman
+    con espera exponencial y, tras EMAIL_MAX_INTENTOS, quedan en estado FALLIDO.
+    """
+    enviados = 0
+    fallidos = 0
+    conexion = abrir_conexion()
+
+    try:
+        while True:
+            ahora = timezone.now()
+            with transaction.atomic():
+                filas = list(CorreoSaliente.objects.select_for_update(skip_locked=True).filter(
+                    estado='PENDIENTE',
+                    proximo_intento__lte=ahora
+                ).order_by('proximo_intento', 'pk')[:settings.EMAIL_LOTE_TAMANO])
+
+                if not filas:
+                    break
+
+                inicio_lote = time.monotonic()
+                _, pendientes, error = enviar_lote(conexion, [
+                    construir_correo_html(fila.asunto, fila.cuerpo_html, fila.destinatarios)
+                    for fila in filas
+                ])
+                # enviar_lote sigue el orden de las filas: las pendientes son las últimas
+                salieron, fallaron = filas[:len(filas) - len(pendientes)], filas[len(filas) - len(pendientes):]
+                if salieron:
+                    CorreoSaliente.objects.filter(pk__in=[fila.pk for fila in salieron]).update(
+                        estado='ENVIADO',
+                        intentos=F('intentos') + 1,
+                        ultimo_error='',
+                        fecha_envio=timezone.now()
+                    )
+                    enviados += len(salieron)
+                if fallaron:
+                    logger.warning(f"Falló el envío de {len(fallaron)} de {len(filas)} correos de la bandeja: {error}")
+                    _reprogramar_correos(fallaron, error, ahora)
+                    fallidos += len(fallaron)
+
+            respetar_limite(len(filas), inicio_lote, settings.EMAIL_MAX_MENSAJES_POR_SEGUNDO)
+    finally:
+        cerrar_conexion(conexion)
+
+    resultado = f"Bandeja de salida despachada. Enviados: {enviados}, Fallidos: {fallidos}"
+    if fallidos:
+        logger.warning(resultado)
+    elif enviados:
+        logger.info(resultado)
+    return resultado
+
+
+@shared_task
+def importar_polizas_task(importacion_id):
+    """
+    Procesa una ImportacionPolizas subida desde el dashboard. El reporte de
+    errores se escribe en un archivo temporal y solo se guarda si hubo
+    filas rechazadas.
+    """
+    # Solo una ejecución toma la importación, aunque la tarea llegue dos veces
+    tomada = ImportacionPolizas.objects.filter(pk=importacion_id, estado='PENDIENTE').update(estado='PROCESANDO')
+    if not tomada:
+        return f"La importación {importacion_id} no está pendiente."
+    importacion = ImportacionPolizas.objects.get(pk=importacion_id)
+
+    try:
+        with importacion.archivo.open('rb'), tempfile.TemporaryFile() as temporal:
+            errores = io.TextIOWrapper(temporal, encoding='utf-8', newline='')
+            totales = importar_polizas(io.TextIOWrapper(importacion.archivo, encoding='utf-8-sig', newline=''), errores)
+            errores.flush()
+            if totales['con_error']:
+                temporal.seek(0)
+                importacion.reporte_errores.save(f'importacion_{importacion.pk}_errores.csv', File(temporal), save=False)
+            errores.detach()
+    except Exception as e:
+        logger.exception(f"La importación de pólizas {importacion.pk} falló: {e}")
+        importacion.estado = 'FALLIDA'
+        importacion.mensaje = str(e)
+    else:
+        importacion.estado = 'COMPLETADA'
+        importacion.filas_procesadas = totales['procesadas']
+        importacion.filas_importadas = totales['importadas']
+        importacion.filas_con_error = totales['con_error']
+    importacion.fecha_fin = timezone.now()
+    importacion.save()
+
+    resultado = (
+        f"Importación {importacion.pk}: {importacion.get_estado_display()}. "
+        f"Importadas: {importacion.filas_importadas}, Con error: {importacion.filas_con_error}"
+    )
+    logger.info(resultado)
     return resultado
@@ -1,10 +1,37 @@
 # polizas/tests.py
-from decimal import Decimal
+import csv
+import os
+import random
+import shutil
+import smtplib
+import tempfile
+from io import StringIO
+from decimal import ROUND_HALF_UP, Decimal
 from datetime import date, timedelta
-from django.test import TestCase
+from django.utils import timezone
+from unittest.mock import patch
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
-from .models import TipoSeguro, CompaniaAseguradora, Poliza, Vehiculo, Asesor
+from .models import (
+    TipoSeguro, CompaniaAseguradora, CorreoSaliente, ImportacionPolizas, NotificacionEnviada, Poliza, PolizaQuerySet, Vehiculo, Asesor
+)
+from .correo import construir_correo_html, encolar_correo, enviar_en_lotes, serializar_correo
+from . import finance
+from .cancelacion import cancelar_polizas, resumir_cancelacion
+from .importacion import ErrorImportacion, importar_polizas
+from .plan_pagos import repartir_centavos, sincronizar_planes
+from .tasks import (
+    despachar_bandeja_salida, enviar_recordatorios_lote, enviar_recordatorios_vencimiento, importar_polizas_task,
+    reenviar_lote_correos, resumir_recordatorios
+)
 from cartera.models import Cuota, Pago
+from reportes.models import ResumenMensual
 
 
 class TipoSeguroModelTest(TestCase):
@@ -153,6 +180,94 @@ class PolizaModelTest(TestCase):
         # 2,000,000 * 25% = 500,000
         self.assertEqual(poliza.valor_comision, Decimal('500000.00'))
 
+    # ==================== Tests de tarifas congeladas ====================
+
+    def test_tarifas_se_congelan_al_crear(self):
+        """Verifica que cambiar el tipo de seguro no altera las cifras de pólizas ya emitidas."""
+        poliza = self.crear_poliza(valor_prima_sin_iva=Decimal('1000000.00'))
+        TipoSeguro.objects.filter(pk=self.tipo_seguro.pk).update(
+            comision_porcentaje=Decimal('30.00'),
+            porcentaje_iva=Decimal('5.00')
+        )
+
+        poliza = Poliza.objects.get(pk=poliza.pk)
+        self.assertEqual(poliza.comision_porcentaje, Decimal('15.00'))
+        self.assertEqual(poliza.valor_comision, Decimal('150000.00'))
+        self.assertEqual(poliza.valor_iva, Decimal('190000.00'))
+        self.assertEqual(Poliza.objects.totals()['total_comisiones'], Decimal('150000.00'))
+        self.assertEqual(poliza.pagos.get().comision_porcentaje, Decimal('15.00'))
+
+    def test_comando_congelar_tarifas_completa_registros_antiguos(self):
+        """Verifica que el comando de backfill copia las tarifas del tipo de seguro."""
+        poliza = self.crear_poliza()
+        Poliza.objects.filter(pk=poliza.pk).update(comision_porcentaje=None, porcentaje_iva=None)
+        Pago.objects.filter(poliza=poliza).update(comision_porcentaje=None)
+
+        call_command('congelar_tarifas', stdout=StringIO())
+
+        poliza.refresh_from_db()
+        self.assertEqual(poliza.comision_porcentaje, Decimal('15.00'))
+        self.assertEqual(poliza.porcentaje_iva, Decimal('19.00'))
+        self.assertEqual(poliza.pagos.get().comision_porcentaje, Decimal('15.00'))
+
+    # ==================== Tests de with_financials / totals ====================
+
+    def test_with_financials_coincide_con_las_propiedades(self):
+        """Verifica que los valores calculados en SQL coinciden con las propiedades."""
+        self.crear_poliza(valor_prima_sin_iva=Decimal('1234567.89'))
+        sin_anotar = Poliza.objects.get()
+        anotada = Poliza.objects.with_financials().get()
+
+        self.assertEqual(anotada.iva_calculado, sin_anotar.valor_iva)
+        self.assertEqual(anotada.total_calculado, sin_anotar.valor_total_a_pagar)
+        self.assertEqual(anotada.comision_calculada, sin_anotar.valor_comision)
+
+    def test_propiedades_usan_el_valor_anotado(self):
+        """Verifica que las propiedades no consultan tipo_seguro si la póliza viene anotada."""
+        self.crear_poliza()
+        with self.assertNumQueries(1):
+            poliza = Poliza.objects.with_financials().get()
+            self.assertEqual(poliza.valor_comision, Decimal('150000.00'))
+            self.assertEqual(poliza.valor_total_a_pagar, Decimal('1190000.00'))
+
+    def test_totals_suma_en_una_consulta(self):
+        """Verifica que totals() devuelve todas las sumas en una sola consulta."""
+        self.crear_poliza(valor_prima_sin_iva=Decimal('1000000.00'))
+        self.crear_poliza(valor_prima_sin_iva=Decimal('500000.00'))
+
+        with self.assertNumQueries(1):
+            totales = Poliza.objects.totals()
+
+        self.assertEqual(totales['cantidad'], 2)
+        self.assertEqual(totales['total_primas'], Decimal('1500000.00'))
+        self.assertEqual(totales['total_iva'], Decimal('285000.00'))
+        self.assertEqual(totales['total_a_pagar'], Decimal('1785000.00'))
+        self.assertEqual(totales['total_comisiones'], Decimal('225000.00'))
+
+    def test_totals_sin_polizas_devuelve_ceros(self):
+        """Verifica que totals() devuelve ceros y no None cuando no hay pólizas."""
+        totales = Poliza.objects.none().totals()
+        self.assertEqual(totales['total_a_pagar'], Decimal('0'))
+        self.assertEqual(totales['cantidad'], 0)
+
+    def test_expresiones_financieras_tras_congelar_tarifas(self):
+        """Verifica que tras congelar_tarifas los cálculos en SQL no necesitan unir con TipoSeguro."""
+        poliza = self.crear_poliza(valor_prima_sin_iva=Decimal('1000000.00'))
+        Poliza.objects.filter(pk=poliza.pk).update(porcentaje_iva=None, comision_porcentaje=None)
+        call_command('congelar_tarifas', stdout=StringIO())
+
+        with CaptureQueriesContext(connection) as consultas:
+            anotada = Poliza.objects.with_financials().get()
+            totales = Poliza.objects.totals()
+        self.assertEqual(anotada.iva_calculado, Decimal('190000.00'))
+        self.assertEqual(anotada.comision_calculada, Decimal('150000.00'))
+        self.assertEqual(totales['total_a_pagar'], Decimal('1190000.00'))
+        self.assertFalse(any('polizas_tiposeguro' in consulta['sql'] for consulta in consultas.captured_queries))
+
+        expresiones = PolizaQuerySet.expresiones_financieras('poliza__')
+        pago = Pago.objects.annotate(comision_poliza=expresiones['comision_calculada']).get(poliza=poliza)
+        self.assertEqual(pago.comision_poliza, Decimal('150000.00'))
+
     # ==================== Tests de calcular_prorrateo_cancelacion ====================
 
     def test_prorrateo_solo_aplica_contado(self):
@@ -332,6 +447,423 @@ class PolizaSignalsTest(TestCase):
         self.assertEqual(cuotas.count(), 0)
 
 
+class SeguimientoCambiosPolizaTest(TestCase):
+    """Tests para el seguimiento de cambios de Poliza y los receptores que dependen de él."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user(username='cliente_cambios')
+        cls.soat = TipoSeguro.objects.create(
+            nombre='SOAT Cambios', comision_porcentaje=Decimal('10.00'), porcentaje_iva=Decimal('19.00')
+        )
+        cls.compania = CompaniaAseguradora.objects.create(nombre='Compañía Cambios')
+        cls.vehiculo = Vehiculo.objects.create(cliente=cls.cliente, placa='CAM123')
+        cls.poliza_id = Poliza.objects.create(
+            cliente=cls.cliente, tipo_seguro=cls.soat, compania_aseguradora=cls.compania,
+            numero_poliza='CAMBIOS-001', vehiculo=cls.vehiculo,
+            fecha_inicio=date(2025, 1, 1), fecha_fin=date(2026, 1, 1),
+            valor_prima_sin_iva=Decimal('1000000.00'), modo_pago='CONTADO'
+        ).pk
+
+    def test_campos_modificados(self):
+        """Verifica que la póliza cargada sabe qué campos cambiaron desde que se leyó."""
+        poliza = Poliza.objects.get(pk=self.poliza_id)
+        self.assertEqual(poliza.campos_modificados(), set())
+
+        poliza.estado_cartera = 'EN_MORA'
+        poliza.valor_prima_sin_iva = Decimal('2000000.00')
+        self.assertEqual(poliza.campos_modificados(), {'estado_cartera', 'valor_prima_sin_iva'})
+
+        poliza.save(update_fields=['estado_cartera'])
+        # Lo que no se guardó sigue pendiente
+        self.assertEqual(poliza.campos_modificados(), {'valor_prima_sin_iva'})
+
+    def test_cambio_de_estado_es_una_sola_consulta(self):
+        """Verifica que cambiar el estado de cartera solo ejecuta el UPDATE."""
+        poliza = Poliza.objects.get(pk=self.poliza_id)
+        poliza.estado_cartera = 'EN_MORA'
+        with self.assertNumQueries(1):
+            poliza.save(update_fields=['estado_cartera'])
+
+        # Aun sin update_fields, los receptores no hacen nada si no cambiaron sus campos
+        poliza.estado_cartera = 'AL_DIA'
+        with self.assertNumQueries(1):
+            poliza.save()
+
+    def test_cambio_de_estado_sin_tarifas_congeladas_no_lee_el_tipo(self):
+        """Verifica que un save(update_fields) no congela tarifas que no va a escribir."""
+        Poliza.objects.filter(pk=self.poliza_id).update(comision_porcentaje=None, porcentaje_iva=None)
+        poliza = Poliza.objects.get(pk=self.poliza_id)
+        poliza.estado_cartera = 'EN_MORA'
+        with self.assertNumQueries(1):
+            poliza.save(update_fields=['estado_cartera'])
+        self.assertIsNone(poliza.comision_porcentaje)
+
+        # Un save() completo sí las congela y las escribe
+        poliza.save()
+        poliza.refresh_from_db()
+        self.assertIsNotNone(poliza.comision_porcentaje)
+        self.assertIsNotNone(poliza.porcentaje_iva)
+
+    def test_cambio_de_prima_actualiza_el_pago(self):
+        """Verifica que los receptores sí trabajan cuando cambian sus campos."""
+        poliza = Poliza.objects.get(pk=self.poliza_id)
+        poliza.valor_prima_sin_iva = Decimal('2000000.00')
+        poliza.save()
+
+        pago = Pago.objects.get(poliza=poliza, cuota__isnull=True)
+        self.assertEqual(pago.monto_pagado, Decimal('200000.00'))
+
+    def test_cambio_de_fecha_fin_actualiza_recordatorio_soat(self):
+        """Verifica que el recordatorio SOAT sigue a la fecha de fin y no se reescribe si no cambió."""
+        poliza = Poliza.objects.get(pk=self.poliza_id)
+        poliza.fecha_fin = date(2026, 6, 1)
+        poliza.save()
+
+        self.vehiculo.refresh_from_db()
+        self.assertEqual(self.vehiculo.soat_vencimiento_recordatorio, date(2026, 6, 1))
+
+        with patch.object(Vehiculo, 'save') as save_mock:
+            poliza.numero_poliza = 'CAMBIOS-002'
+            poliza.save()
+        save_mock.assert_not_called()
+
+
+class PlanPagosTest(TestCase):
+    """Tests para el reparto al centavo y el ajuste incremental del plan de cuotas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user(username='cliente_plan')
+        cls.tipo = TipoSeguro.objects.create(
+            nombre='Hogar Plan', comision_porcentaje=Decimal('10.00'), porcentaje_iva=Decimal('19.00')
+        )
+        cls.compania = CompaniaAseguradora.objects.create(nombre='Compañía Plan')
+        cls.poliza_id = Poliza.objects.create(
+            cliente=cls.cliente, tipo_seguro=cls.tipo, compania_aseguradora=cls.compania,
+            numero_poliza='PLAN-001', fecha_inicio=date(2025, 1, 1), fecha_fin=date(2026, 1, 1),
+            valor_prima_sin_iva=Decimal('100.00'), modo_pago='MENSUAL', plazo_meses=3
+        ).pk
+
+    def cuotas(self):
+        return list(
+            Cuota.objects.filter(poliza_id=self.poliza_id).order_by('numero_cuota')
+            .values_list('numero_cuota', 'monto_cuota', 'estado')
+        )
+
+    def test_repartir_centavos(self):
+        """Verifica que las partes suman exactamente el total y el sobrante va a las primeras."""
+        self.assertEqual(
+            repartir_centavos(Decimal('100.00'), 3),
+            [Decimal('33.34'), Decimal('33.33'), Decimal('33.33')]
+        )
+        partes = repartir_centavos(Decimal('1234567.89'), 7)
+        self.assertEqual(sum(partes), Decimal('1234567.89'))
+        self.assertEqual(repartir_centavos(Decimal('50.00'), 0), [])
+
+    def test_plan_inicial_suma_la_prima(self):
+        """Verifica que las cuotas creadas con la póliza suman la prima sin residuos."""
+        self.assertEqual(self.cuotas(), [
+            (1, Decimal('33.34'), 'PENDIENTE'),
+            (2, Decimal('33.33'), 'PENDIENTE'),
+            (3, Decimal('33.33'), 'PENDIENTE'),
+        ])
+
+    def test_cambio_de_prima_respeta_cuotas_pagadas(self):
+        """Verifica que al cambiar la prima solo se reparte el saldo entre las cuotas no pagadas."""
+        Cuota.objects.filter(poliza_id=self.poliza_id, numero_cuota=1).update(estado='PAGADA')
+        poliza = Poliza.objects.get(pk=self.poliza_id)
+        poliza.valor_prima_sin_iva = Decimal('200.00')
+        poliza.plazo_meses = 4
+        poliza.save()
+
+        self.assertEqual(self.cuotas(), [
+            (1, Decimal('33.34'), 'PAGADA'),
+            (2, Decimal('55.56'), 'PENDIENTE'),
+            (3, Decimal('55.55'), 'PENDIENTE'),
+            (4, Decimal('55.55'), 'PENDIENTE'),
+        ])
+        fecha = Cuota.objects.get(poliza_id=self.poliza_id, numero_cuota=4).fecha_vencimiento
+        self.assertEqual(fecha, date(2025, 5, 1))
+
+    def test_plazo_mas_corto_elimina_cuotas_sobrantes(self):
+        """Verifica que acortar el plazo borra las cuotas pendientes que sobran."""
+        poliza = Poliza.objects.get(pk=self.poliza_id)
+        poliza.plazo_meses = 2
+        poliza.save()
+        self.assertEqual(self.cuotas(), [(1, Decimal('50.00'), 'PENDIENTE'), (2, Decimal('50.00'), 'PENDIENTE')])
+
+    def test_cambio_a_contado_elimina_cuotas_pendientes(self):
+        """Verifica que al dejar de ser mensual se borran las cuotas no pagadas y se conservan las pagadas."""
+        Cuota.objects.filter(poliza_id=self.poliza_id, numero_cuota=1).update(estado='PAGADA')
+        poliza = Poliza.objects.get(pk=self.poliza_id)
+        poliza.modo_pago = 'CONTADO'
+        poliza.save()
+        self.assertEqual(self.cuotas(), [(1, Decimal('33.34'), 'PAGADA')])
+
+    def test_cambio_de_fecha_inicio_mueve_vencimientos(self):
+        """Verifica que cambiar la fecha de inicio solo actualiza los vencimientos."""
+        poliza = Poliza.objects.get(pk=self.poliza_id)
+        poliza.fecha_inicio = date(2025, 3, 1)
+        poliza.save()
+        fechas = list(
+            Cuota.objects.filter(poliza_id=self.poliza_id).order_by('numero_cuota')
+            .values_list('fecha_vencimiento', flat=True)
+        )
+        self.assertEqual(fechas, [date(2025, 4, 1), date(2025, 5, 1), date(2025, 6, 1)])
+
+    def test_sincronizar_varias_polizas_en_consultas_fijas(self):
+        """Verifica que ajustar muchas pólizas usa las mismas consultas que ajustar una."""
+        for numero in range(2, 6):
+            Poliza.objects.create(
+                cliente=self.cliente, tipo_seguro=self.tipo, compania_aseguradora=self.compania,
+                numero_poliza=f'PLAN-00{numero}', fecha_inicio=date(2025, 1, 1), fecha_fin=date(2026, 1, 1),
+                valor_prima_sin_iva=Decimal('100.00'), modo_pago='MENSUAL', plazo_meses=3
+            )
+        polizas = list(Poliza.objects.filter(numero_poliza__startswith='PLAN-'))
+        for poliza in polizas:
+            poliza.plazo_meses = 2 if poliza.pk % 2 else 4
+            poliza.valor_prima_sin_iva = Decimal('90.00')
+
+        # SELECT de cuotas, borrado (colector + SET_NULL de pagos + DELETE), UPDATE e INSERT
+        with self.assertNumQueries(6):
+            totales = sincronizar_planes(polizas)
+        self.assertEqual(totales['eliminadas'] + totales['creadas'], len(polizas))
+        for poliza in polizas:
+            montos = Cuota.objects.filter(poliza=poliza).values_list('monto_cuota', flat=True)
+            self.assertEqual(sum(montos), Decimal('90.00'))
+
+    def test_comando_regenerar_planes_pago(self):
+        """Verifica que el comando corrige planes desajustados y que --dry-run no guarda nada."""
+        Cuota.objects.filter(poliza_id=self.poliza_id, numero_cuota=3).delete()
+
+        salida = StringIO()
+        with patch('polizas.management.commands.regenerar_planes_pago.programar_invalidacion_cartera') as invalidar_mock:
+            call_command('regenerar_planes_pago', '--dry-run', stdout=salida)
+        self.assertIn('Cuotas creadas: 1', salida.getvalue())
+        self.assertEqual(len(self.cuotas()), 2)
+        invalidar_mock.assert_not_called()
+
+        with patch('polizas.management.commands.regenerar_planes_pago.programar_invalidacion_cartera') as invalidar_mock:
+            call_command('regenerar_planes_pago', stdout=StringIO())
+        invalidar_mock.assert_called_once()
+        self.assertEqual(sum(monto for _, monto, _ in self.cuotas()), Decimal('100.00'))
+        self.assertEqual(len(self.cuotas()), 3)
+
+
+class CalculoFinancieroEnBloqueTest(TestCase):
+    """Tests de paridad entre polizas.finance y los métodos financieros de Poliza."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user(username='cliente_finanzas')
+        cls.compania = CompaniaAseguradora.objects.create(nombre='Compañía Finanzas')
+        tipos = [
+            TipoSeguro.objects.create(
+                nombre=f'Finanzas {indice}', comision_porcentaje=comision, porcentaje_iva=iva
+            )
+            for indice, (comision, iva) in enumerate([
+                (Decimal('10.00'), Decimal('19.00')),
+                (Decimal('12.50'), Decimal('5.00')),
+                (Decimal('7.35'), Decimal('0.00')),
+            ])
+        ]
+        azar = random.Random(2025)
+        for numero in range(60):
+            inicio = date(2025, 1, 1) + timedelta(days=azar.randint(0, 200))
+            fin = inicio + timedelta(days=azar.choice([1, 30, 90, 181, 365, 730]))
+            modo = azar.choice(['CONTADO', 'CONTADO', 'CREDITO', 'MENSUAL'])
+            cancelacion = None
+            if azar.random() < 0.7:
+                cancelacion = inicio + timedelta(days=azar.randint(0, (fin - inicio).days + 10))
+            Poliza.objects.create(
+                cliente=cls.cliente, compania_aseguradora=cls.compania, tipo_seguro=azar.choice(tipos),
+                numero_poliza=f'FIN-{numero:03d}', fecha_inicio=inicio, fecha_fin=fin,
+                fecha_cancelacion=cancelacion, modo_pago=modo, plazo_meses=12,
+                valor_prima_sin_iva=Decimal(azar.randint(1, 500000000)) / 100
+            )
+        # Póliza con tarifas sin congelar: se usan las del tipo de seguro
+        Poliza.objects.filter(numero_poliza='FIN-000').update(porcentaje_iva=None, comision_porcentaje=None)
+
+    @staticmethod
+    def centavos(valor):
+        return Decimal(valor).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+    def test_paridad_con_el_modelo(self):
+        """Verifica que IVA, total, comisión y prorrateo coinciden al centavo con los métodos del modelo."""
+        columnas = finance.calcular_cartera(Poliza.objects.all())
+        polizas = Poliza.objects.select_related('tipo_seguro').in_bulk(columnas['pk'].tolist())
+        self.assertEqual(len(polizas), 60)
+
+        iva = finance.a_decimales(columnas['iva'])
+        total = finance.a_decimales(columnas['total'])
+        comision = finance.a_decimales(columnas['comision'])
+        devolucion = finance.a_decimales(columnas['devolucion_cliente'])
+        comision_devuelta = finance.a_decimales(columnas['comision_a_devolver'])
+        for indice, pk in enumerate(columnas['pk'].tolist()):
+            poliza = polizas[pk]
+            with self.subTest(poliza=poliza.numero_poliza):
+                self.assertEqual(iva[indice], self.centavos(poliza.valor_iva))
+                self.assertEqual(total[indice], self.centavos(poliza.valor_total_a_pagar))
+                self.assertEqual(comision[indice], self.centavos(poliza.valor_comision))
+
+                esperado = poliza.calcular_prorrateo_cancelacion()
+                if esperado == (None, None):
+                    self.assertFalse(columnas['aplica_prorrateo'][indice])
+                else:
+                    self.assertTrue(columnas['aplica_prorrateo'][indice])
+                    self.assertEqual((devolucion[indice], comision_devuelta[indice]), esperado)
+
+    def test_paridad_con_with_financials(self):
+        """Verifica que coincide con los valores que calcula la base de datos, redondeados al centavo."""
+        Poliza.objects.filter(porcentaje_iva__isnull=True).delete()
+        columnas = finance.calcular_cartera(Poliza.objects.all())
+        esperados = {
+            pk: (self.centavos(iva), self.centavos(total), self.centavos(comision))
+            for pk, iva, total, comision in Poliza.objects.with_financials().values_list(
+                'pk', 'iva_calculado', 'total_calculado', 'comision_calculada'
+            )
+        }
+        calculados = zip(
+            columnas['pk'].tolist(), finance.a_decimales(columnas['iva']),
+            finance.a_decimales(columnas['total']), finance.a_decimales(columnas['comision'])
+        )
+        self.assertEqual({pk: tuple(valores) for pk, *valores in calculados}, esperados)
+
+    def test_una_consulta_para_toda_la_cartera(self):
+        """Verifica que la cartera completa se carga con una sola consulta."""
+        with self.assertNumQueries(1):
+            columnas = finance.calcular_cartera(Poliza.objects.all())
+        self.assertEqual(len(columnas['pk']), 60)
+
+        vacia = finance.calcular_cartera(Poliza.objects.none())
+        self.assertEqual(len(vacia['total']), 0)
+
+    def test_redondeo_y_montos_grandes(self):
+        """Verifica el redondeo de mitades y que los montos máximos no desbordan int64."""
+        import numpy as np
+        self.assertEqual(finance._dividir(np.array([5, 15, 25]), 10).tolist(), [1, 2, 3])
+        self.assertEqual(finance._dividir(np.array([5, 15, 25]), 10, mitad_par=True).tolist(), [0, 2, 2])
+
+        prima = Decimal('9999999999.99')
+        primas = finance.a_enteros([prima])
+        tarifas = finance.a_enteros([Decimal('999.99')])
+        devolucion, comision, aplica = finance.calcular_prorrateo(
+            primas, tarifas, ['CONTADO'],
+            finance.a_fechas([date(2000, 1, 1)]), finance.a_fechas([date(2099, 12, 31)]),
+            finance.a_fechas([date(2000, 1, 2)])
+        )
+        dias = (date(2099, 12, 31) - date(2000, 1, 1)).days
+        self.assertTrue(aplica[0])
+        self.assertEqual(finance.a_decimales(devolucion)[0], round(prima * (dias - 1) / dias, 2))
+        self.assertEqual(
+            finance.a_decimales(comision)[0],
+            round(prima * Decimal('999.99') / 100 * (dias - 1) / dias, 2)
+        )
+
+
+@override_settings(ADMIN_EMAIL='admin@test.com')
+class CancelacionEnBloqueTest(TestCase):
+    """Tests para la cancelación en bloque de pólizas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tipo = TipoSeguro.objects.create(
+            nombre='Producto Retirado', comision_porcentaje=Decimal('12.50'), porcentaje_iva=Decimal('19.00')
+        )
+        cls.compania = CompaniaAseguradora.objects.create(nombre='Compañía Saliente')
+        cls.otra_compania = CompaniaAseguradora.objects.create(nombre='Compañía que Sigue')
+        cls.fecha = date(2025, 6, 15)
+        for numero in range(6):
+            cliente = User.objects.create_user(username=f'cliente_bloque_{numero}', email=f'bloque{numero}@test.com')
+            Poliza.objects.create(
+                cliente=cliente, tipo_seguro=cls.tipo, compania_aseguradora=cls.compania,
+                numero_poliza=f'BLOQUE-{numero}', fecha_inicio=date(2025, 1, 1) + timedelta(days=numero * 17),
+                fecha_fin=date(2026, 1, 1) + timedelta(days=numero * 17),
+                valor_prima_sin_iva=Decimal('1000000.00') + Decimal(numero) * Decimal('123456.78'),
+                modo_pago='MENSUAL' if numero == 5 else 'CONTADO', plazo_meses=12
+            )
+        Poliza.objects.create(
+            cliente=cliente, tipo_seguro=cls.tipo, compania_aseguradora=cls.otra_compania,
+            numero_poliza='BLOQUE-OTRA', fecha_inicio=date(2025, 1, 1), fecha_fin=date(2026, 1, 1),
+            valor_prima_sin_iva=Decimal('500000.00'), modo_pago='CONTADO'
+        )
+
+    def test_prorrateo_igual_al_del_modelo(self):
+        """Verifica que devolución, comisión devuelta y pago ajustado coinciden con la cancelación individual."""
+        esperados = {}
+        for poliza in Poliza.objects.filter(compania_aseguradora=self.compania, modo_pago='CONTADO'):
+            poliza.fecha_cancelacion = self.fecha
+            devolucion, comision_devuelta = poliza.calcular_prorrateo_cancelacion()
+            # Comisión devuelta + ganada = la comisión que ya estaba registrada en el pago
+            ganada = Pago.objects.get(poliza=poliza, cuota__isnull=True).monto_pagado - comision_devuelta
+            esperados[poliza.pk] = (devolucion, comision_devuelta, ganada)
+
+        canceladas = cancelar_polizas(
+            Poliza.objects.filter(compania_aseguradora=self.compania), 'Retiro del producto', self.fecha
+        )
+        self.assertEqual(len(canceladas), 6)
+
+        for poliza in Poliza.objects.filter(pk__in=esperados):
+            pago = Pago.objects.get(poliza=poliza, cuota__isnull=True)
+            self.assertEqual(poliza.estado, 'CANCELADA')
+            self.assertEqual(poliza.fecha_cancelacion, self.fecha)
+            self.assertEqual(poliza.motivo_cancelacion, 'Retiro del producto')
+            self.assertEqual((poliza.monto_devolucion, poliza.comision_devuelta, pago.monto_pagado), esperados[poliza.pk])
+
+        mensual = Poliza.objects.get(numero_poliza='BLOQUE-5')
+        self.assertEqual(mensual.estado, 'CANCELADA')
+        self.assertIsNone(mensual.monto_devolucion)
+        self.assertEqual(Poliza.objects.get(numero_poliza='BLOQUE-OTRA').estado, 'ACTIVA')
+
+    def test_resumen_coincide_con_la_cancelacion(self):
+        """Verifica que la previsualización anuncia lo mismo que se guarda al cancelar."""
+        polizas = Poliza.objects.filter(compania_aseguradora=self.compania)
+        resumen = resumir_cancelacion(polizas, self.fecha)
+        cancelar_polizas(polizas, 'Retiro del producto', self.fecha)
+
+        totales = Poliza.objects.filter(compania_aseguradora=self.compania).aggregate(
+            devolucion=Sum('monto_devolucion'), comision=Sum('comision_devuelta')
+        )
+        self.assertEqual(resumen['cantidad'], 6)
+        self.assertEqual(resumen['contado'], 5)
+        self.assertEqual((resumen['devolucion'], resumen['comision_devuelta']), (totales['devolucion'], totales['comision']))
+        # Ya canceladas, no queda nada por cancelar
+        self.assertEqual(resumir_cancelacion(polizas, self.fecha)['cantidad'], 0)
+
+    def test_correos_encolados_en_bloque(self):
+        """Verifica que se encola un correo por cliente y un resumen para el administrador, sin enviar nada."""
+        with patch('polizas.tasks.despachar_bandeja_salida.delay') as delay_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                cancelar_polizas(Poliza.objects.filter(compania_aseguradora=self.compania), 'Retiro', self.fecha)
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(delay_mock.call_count, 1)
+        destinatarios = list(CorreoSaliente.objects.values_list('destinatarios', flat=True))
+        self.assertEqual(len(destinatarios), 7)
+        self.assertIn(['admin@test.com'], destinatarios)
+        resumen = CorreoSaliente.objects.get(destinatarios=['admin@test.com'])
+        self.assertIn('Compañía Saliente', resumen.cuerpo_html)
+
+    def test_consultas_no_dependen_de_la_cantidad(self):
+        """Verifica que cancelar más pólizas no agrega consultas."""
+        def consultas(numeros):
+            with self.captureOnCommitCallbacks(execute=False):
+                with CaptureQueriesContext(connection) as contexto:
+                    cancelar_polizas(Poliza.objects.filter(numero_poliza__in=numeros), 'Retiro', self.fecha)
+            return len(contexto.captured_queries)
+
+        self.assertEqual(consultas(['BLOQUE-0']), consultas(['BLOQUE-1', 'BLOQUE-2', 'BLOQUE-3', 'BLOQUE-4']))
+
+    def test_resumen_mensual_al_dia(self):
+        """Verifica que el resumen mensual refleja los pagos ajustados con bulk_update."""
+        with self.captureOnCommitCallbacks(execute=True):
+            cancelar_polizas(Poliza.objects.filter(numero_poliza='BLOQUE-0'), 'Retiro', self.fecha)
+        pago = Pago.objects.get(poliza__numero_poliza='BLOQUE-0', cuota__isnull=True)
+        resumen = ResumenMensual.objects.get(cliente=pago.poliza.cliente, mes=date(2025, 1, 1))
+        self.assertEqual(resumen.comisiones_pendientes, pago.monto_pagado)
+
+
 class VehiculoModelTest(TestCase):
     """Tests para el modelo Vehiculo."""
 
@@ -391,3 +923,468 @@ class AsesorModelTest(TestCase):
         """Verifica la representación string del asesor."""
         asesor = Asesor.objects.create(nombre_completo='Ana López')
         self.assertEqual(str(asesor), 'Ana López')
+
+
+class EnvioEnLotesTest(TestCase):
+    """Tests para el envío de correos por lotes sobre una conexión reutilizada."""
+
+    def crear_correos(self, cantidad):
+        return [
+            construir_correo_html(f'Asunto {i}', '<p>Hola</p>', [f'cliente{i}@test.com'])
+            for i in range(cantidad)
+        ]
+
+    def test_envia_todos_los_correos(self):
+        """Verifica que se envían todos los correos en varios lotes."""
+        enviados, lotes_fallidos, _ = enviar_en_lotes(self.crear_correos(7), tamano_lote=3, max_por_segundo=0)
+        self.assertEqual(enviados, 7)
+        self.assertEqual(lotes_fallidos, [])
+        self.assertEqual(len(mail.outbox), 7)
+
+    def test_reutiliza_una_conexion(self):
+        """Verifica que todos los lotes salen por la misma conexión."""
+        conexion = ConexionFalsa()
+        with patch('polizas.correo.get_connection', return_value=conexion):
+            enviados, _, _ = enviar_en_lotes(self.crear_correos(10), tamano_lote=4, max_por_segundo=0)
+
+        self.assertEqual(enviados, 10)
+        self.assertEqual(conexion.aperturas, 1)
+        self.assertEqual(len(conexion.asuntos), 10)
+
+    def test_reconecta_si_un_lote_falla(self):
+        """Verifica que un fallo provoca una reconexión y el reintento de lo que faltaba."""
+        conexion = ConexionFalsa(fallos=1)
+        with patch('polizas.correo.get_connection', return_value=conexion):
+            enviados, lotes_fallidos, _ = enviar_en_lotes(self.crear_correos(4), tamano_lote=2, max_por_segundo=0)
+
+        self.assertEqual(enviados, 4)
+        self.assertEqual(lotes_fallidos, [])
+        self.assertEqual(conexion.aperturas, 2)
+
+    def test_devuelve_lotes_que_fallan_tras_reconectar(self):
+        """Verifica que un lote que falla dos veces se devuelve como fallido."""
+        conexion = ConexionFalsa(fallos=2)
+        with patch('polizas.correo.get_connection', return_value=conexion):
+            enviados, lotes_fallidos, _ = enviar_en_lotes(self.crear_correos(4), tamano_lote=2, max_por_segundo=0)
+
+        self.assertEqual(enviados, 2)
+        self.assertEqual(len(lotes_fallidos), 1)
+        self.assertEqual(len(lotes_fallidos[0]), 2)
+
+    def test_fallo_a_mitad_de_lote_no_reenvia_los_entregados(self):
+        """Verifica que tras reconectar solo se envían los correos que faltaban del lote."""
+        conexion = ConexionFalsa(fallos=1, fallar_tras=2)
+        with patch('polizas.correo.get_connection', return_value=conexion):
+            enviados, lotes_fallidos, _ = enviar_en_lotes(self.crear_correos(4), tamano_lote=4, max_por_segundo=0)
+
+        self.assertEqual(enviados, 4)
+        self.assertEqual(lotes_fallidos, [])
+        self.assertEqual(conexion.asuntos, [f'Asunto {i}' for i in range(4)])
+
+    def test_lote_fallido_solo_lleva_los_pendientes(self):
+        """Verifica que el lote devuelto como fallido no incluye los correos que sí salieron."""
+        conexion = ConexionFalsa(fallos=2, fallar_tras=1)
+        with patch('polizas.correo.get_connection', return_value=conexion):
+            enviados, lotes_fallidos, _ = enviar_en_lotes(self.crear_correos(3), tamano_lote=3, max_por_segundo=0)
+
+        self.assertEqual(enviados, 1)
+        self.assertEqual([correo.subject for correo in lotes_fallidos[0]], ['Asunto 1', 'Asunto 2'])
+
+    def test_reintento_no_duplica_los_entregados(self):
+        """Verifica que reenviar_lote_correos reprograma solo los correos que faltan."""
+        conexion = ConexionFalsa(fallos=2, fallar_tras=1)
+        correos = [serializar_correo(correo) for correo in self.crear_correos(3)]
+        with patch('polizas.correo.get_connection', return_value=conexion), \
+                patch('polizas.tasks.registrar_recordatorios_enviados') as registrar_mock:
+            reenviar_lote_correos.apply(args=[correos, [[1, 30], None, [3, 30]]])
+
+        self.assertEqual(conexion.asuntos, ['Asunto 0', 'Asunto 1', 'Asunto 2'])
+        # Cada recordatorio se registra una vez, en el intento en que salió su correo
+        self.assertEqual([c.args[0] for c in registrar_mock.call_args_list], [[[1, 30]], [[3, 30]]])
+
+
+class ConexionFalsa:
+    """
+    Conexión SMTP de prueba que cuenta aperturas y guarda los asuntos
+    enviados. Tras entregar `fallar_tras` mensajes, falla `fallos` veces.
+    """
+
+    def __init__(self, fallos=0, fallar_tras=0):
+        self.fallos = fallos
+        self.fallar_tras = fallar_tras
+        self.aperturas = 0
+        self.asuntos = []
+
+    def open(self):
+        self.aperturas += 1
+        return True
+
+    def close(self):
+        pass
+
+    def send_messages(self, mensajes):
+        if self.fallos and len(self.asuntos) >= self.fallar_tras:
+            self.fallos -= 1
+            raise smtplib.SMTPServerDisconnected('Conexión perdida')
+        self.asuntos.extend(mensaje.subject for mensaje in mensajes)
+        return len(mensajes)
+
+
+@override_settings(ADMIN_EMAIL='admin@test.com', EMAIL_MAX_MENSAJES_POR_SEGUNDO=0)
+class RecordatoriosVencimientoTaskTest(TestCase):
+    """Tests para la tarea enviar_recordatorios_vencimiento."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user(
+            username='cliente_recordatorio',
+            email='recordatorio@test.com',
+            password='testpass123'
+        )
+
+        cls.tipo_seguro = TipoSeguro.objects.create(
+            nombre='Seguro Recordatorio',
+            comision_porcentaje=Decimal('10.00'),
+            porcentaje_iva=Decimal('19.00')
+        )
+
+        cls.compania = CompaniaAseguradora.objects.create(
+            nombre='Compañía Recordatorio'
+        )
+
+        cls.polizas = {}
+        for i, dias in enumerate([5, 20, 60]):
+            poliza = Poliza.objects.create(
+                cliente=cls.cliente,
+                tipo_seguro=cls.tipo_seguro,
+                compania_aseguradora=cls.compania,
+                numero_poliza=f'POL-REC-{i}',
+                fecha_inicio=date.today() - timedelta(days=300),
+                fecha_fin=date.today() + timedelta(days=dias),
+                valor_prima_sin_iva=Decimal('500000.00'),
+                modo_pago='CONTADO'
+            )
+            cls.polizas[poliza.numero_poliza] = poliza.pk
+
+    def test_coordinador_reparte_en_subtareas(self):
+        """Verifica que el coordinador reparte los IDs en subtareas del tamaño configurado."""
+        with override_settings(RECORDATORIOS_POLIZAS_POR_SUBTAREA=1), \
+                patch('polizas.tasks.chord') as chord_mock:
+            resultado = enviar_recordatorios_vencimiento()
+
+        self.assertIn('2 subtarea(s)', resultado)
+        subtareas = chord_mock.call_args.args[0].tasks
+        # A 5 días le corresponde el hito de 7; a 20 días, el de 30
+        self.assertEqual(
+            [s.args[0] for s in subtareas],
+            [[[self.polizas['POL-REC-0'], 7]], [[self.polizas['POL-REC-1'], 30]]]
+        )
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_coordinador_omite_recordatorios_ya_enviados(self):
+        """Verifica que solo se envía el recordatorio del hito actual si aún no está registrado."""
+        # POL-REC-0 ya recibió el aviso de 15 días, pero hoy le corresponde el de 7
+        NotificacionEnviada.objects.create(
+            poliza_id=self.polizas['POL-REC-0'], tipo='RECORDATORIO_VENCIMIENTO', ventana=15
+        )
+        # POL-REC-1 ya recibió el aviso del hito en el que está (30 días)
+        NotificacionEnviada.objects.create(
+            poliza_id=self.polizas['POL-REC-1'], tipo='RECORDATORIO_VENCIMIENTO', ventana=30
+        )
+
+        with patch('polizas.tasks.chord') as chord_mock:
+            enviar_recordatorios_vencimiento()
+
+        subtareas = chord_mock.call_args.args[0].tasks
+        self.assertEqual([s.args[0] for s in subtareas], [[[self.polizas['POL-REC-0'], 7]]])
+
+    def test_subtarea_envia_correo_solo_al_cliente(self):
+        """Verifica que por defecto una subtarea envía un correo por póliza, solo al cliente."""
+        pendientes = [[self.polizas['POL-REC-0'], 7], [self.polizas['POL-REC-1'], 30]]
+        resultado = enviar_recordatorios_lote(pendientes)
+
+        self.assertEqual(resultado['total'], 2)
+        self.assertEqual(resultado['enviados'], 2)
+        self.assertEqual(resultado['errores'], 0)
+        self.assertEqual(sorted(resultado['polizas']), sorted(pk for pk, _ in pendientes))
+        self.assertEqual([correo.to[0] for correo in mail.outbox], ['recordatorio@test.com'] * 2)
+
+        # Los envíos quedan registrados, y un segundo intento no duplica el registro
+        enviar_recordatorios_lote(pendientes)
+        registro = sorted(NotificacionEnviada.objects.values_list('poliza_id', 'ventana'))
+        self.assertEqual(registro, sorted(tuple(par) for par in pendientes))
+
+    @override_settings(RECORDATORIOS_COPIA_ADMIN_POR_POLIZA=True)
+    def test_subtarea_envia_copia_al_admin_si_esta_activa(self):
+        """Verifica que con la copia por póliza activa también se envía un correo al admin."""
+        pendientes = [[self.polizas['POL-REC-0'], 7], [self.polizas['POL-REC-1'], 30]]
+        resultado = enviar_recordatorios_lote(pendientes)
+
+        self.assertEqual(resultado['enviados'], 4)
+        destinatarios = sorted(correo.to[0] for correo in mail.outbox)
+        self.assertEqual(destinatarios, ['admin@test.com'] * 2 + ['recordatorio@test.com'] * 2)
+
+    def test_resumen_encola_un_solo_correo_para_el_admin(self):
+        """Verifica que el callback encola un único resumen agrupado para el administrador."""
+        resultados = [
+            {'total': 1, 'enviados': 1, 'errores': 0, 'reprogramados': 0, 'segundos': 1.0,
+             'polizas': [self.polizas['POL-REC-0']]},
+            {'total': 1, 'enviados': 1, 'errores': 0, 'reprogramados': 0, 'segundos': 1.0,
+             'polizas': [self.polizas['POL-REC-1']]},
+        ]
+        with patch('polizas.tasks.despachar_bandeja_salida.delay'):
+            resumir_recordatorios(resultados, 2)
+
+        resumen = CorreoSaliente.objects.get()
+        self.assertEqual(resumen.destinatarios, ['admin@test.com'])
+        self.assertIn('2 póliza(s)', resumen.asunto)
+        self.assertIn('Compañía Recordatorio', resumen.cuerpo_html)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_resumen_suma_las_subtareas(self):
+        """Verifica que el callback del chord agrega los conteos de las subtareas."""
+        resultados = [
+            {'total': 2, 'enviados': 4, 'errores': 0, 'reprogramados': 0, 'segundos': 2.0},
+            {'total': 1, 'enviados': 1, 'errores': 1, 'reprogramados': 0, 'segundos': 0.5},
+        ]
+        resultado = resumir_recordatorios(resultados, 3)
+
+        self.assertIn('Total: 3', resultado)
+        self.assertIn('Enviados: 5', resultado)
+        self.assertIn('Errores: 1', resultado)
+        self.assertIn('Velocidad: 4.0 correos/s', resultado)
+
+
+@override_settings(EMAIL_MAX_MENSAJES_POR_SEGUNDO=0, EMAIL_LOTE_TAMANO=2, EMAIL_MAX_INTENTOS=3)
+class BandejaSalidaTest(TestCase):
+    """Tests para la bandeja de salida de correos y su despachador."""
+
+    def encolar(self, cantidad):
+        return [
+            encolar_correo(
+                f'Asunto {i}',
+                'emails/cancelacion_poliza_cliente.html',
+                {'poliza': None},
+                [f'cliente{i}@test.com']
+            )
+            for i in range(cantidad)
+        ]
+
+    def test_encolar_no_envia_y_programa_el_despacho_al_confirmar(self):
+        """Verifica que encolar guarda el correo y solo pide el despacho al confirmar la transacción."""
+        with patch('polizas.tasks.despachar_bandeja_salida.delay') as delay_mock:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                correo, = self.encolar(1)
+                self.assertFalse(delay_mock.called)
+
+        self.assertEqual(len(callbacks), 1)
+        delay_mock.assert_called_once_with()
+        self.assertEqual(correo.estado, 'PENDIENTE')
+        self.assertEqual(correo.destinatarios, ['cliente0@test.com'])
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_despacho_envia_pendientes_por_lotes(self):
+        """Verifica que el despachador envía todo en lotes por una misma conexión."""
+        self.encolar(5)
+        conexion = ConexionFalsa()
+        with patch('polizas.correo.get_connection', return_value=conexion):
+            resultado = despachar_bandeja_salida()
+
+        self.assertIn('Enviados: 5', resultado)
+        self.assertEqual(conexion.aperturas, 1)
+        self.assertEqual(len(conexion.asuntos), 5)
+        self.assertEqual(CorreoSaliente.objects.filter(estado='ENVIADO').count(), 5)
+        self.assertFalse(CorreoSaliente.objects.filter(fecha_envio__isnull=True).exists())
+
+    def test_lote_fallido_se_reprograma_con_espera(self):
+        """Verifica que un lote que falla se reintenta más tarde y no en la misma pasada."""
+        self.encolar(1)
+        with patch('polizas.correo.get_connection', return_value=ConexionFalsa(fallos=2)):
+            resultado = despachar_bandeja_salida()
+
+        self.assertIn('Fallidos: 1', resultado)
+        correo = CorreoSaliente.objects.get()
+        self.assertEqual(correo.estado, 'PENDIENTE')
+        self.assertEqual(correo.intentos, 1)
+        self.assertIn('Conexión perdida', correo.ultimo_error)
+        self.assertGreater(correo.proximo_intento, timezone.now() + timedelta(minutes=1))
+
+        # Mientras no llegue su próximo intento, el despachador no lo toca
+        resultado = despachar_bandeja_salida()
+        self.assertIn('Enviados: 0, Fallidos: 0', resultado)
+
+    def test_fallo_a_mitad_de_lote_solo_reprograma_los_pendientes(self):
+        """Verifica que los correos que ya salieron del lote quedan ENVIADO y no se reintentan."""
+        self.encolar(3)
+        with patch('polizas.correo.get_connection', return_value=ConexionFalsa(fallos=2, fallar_tras=1)):
+            resultado = despachar_bandeja_salida()
+
+        # Lotes de 2: del primero solo falla el segundo correo; el tercero va en otro lote
+        self.assertIn('Enviados: 2, Fallidos: 1', resultado)
+        self.assertEqual(
+            list(CorreoSaliente.objects.order_by('pk').values_list('estado', 'intentos')),
+            [('ENVIADO', 1), ('PENDIENTE', 1), ('ENVIADO', 1)]
+        )
+
+    def test_correo_queda_fallido_tras_max_intentos(self):
+        """Verifica que al agotar los intentos el correo pasa a FALLIDO."""
+        correo, = self.encolar(1)
+        CorreoSaliente.objects.filter(pk=correo.pk).update(intentos=2)
+
+        with patch('polizas.correo.get_connection', return_value=ConexionFalsa(fallos=2)):
+            despachar_bandeja_salida()
+
+        correo.refresh_from_db()
+        self.assertEqual(correo.estado, 'FALLIDO')
+        self.assertEqual(correo.intentos, 3)
+
+
+class ImportacionPolizasTest(TestCase):
+    """Tests para la importación masiva de pólizas desde CSV."""
+
+    ENCABEZADOS = (
+        'numero_poliza,cliente,compania,tipo_seguro,valor_prima_sin_iva,'
+        'fecha_inicio,fecha_fin,modo_pago,plazo_meses,asesor,placa\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user(username='cliente_importado', first_name='Rosa', last_name='Mora')
+        cls.cliente.perfilcliente.cedula = '1020304050'
+        cls.cliente.perfilcliente.save()
+        cls.tipo_soat = TipoSeguro.objects.create(
+            nombre='SOAT', comision_porcentaje=Decimal('10.00'), porcentaje_iva=Decimal('19.00')
+        )
+        cls.tipo_vida = TipoSeguro.objects.create(
+            nombre='Vida', comision_porcentaje=Decimal('20.00'), porcentaje_iva=Decimal('0.00')
+        )
+        cls.compania = CompaniaAseguradora.objects.create(nombre='Sura')
+        cls.asesor = Asesor.objects.create(nombre_completo='Luis Asesor')
+        cls.vehiculo = Vehiculo.objects.create(cliente=cls.cliente, placa='IMP123', marca='Mazda', modelo='3')
+
+    def csv(self, *filas):
+        return StringIO(self.ENCABEZADOS + ''.join(f'{fila}\n' for fila in filas))
+
+    def importar(self, *filas, **kwargs):
+        errores = StringIO()
+        totales = importar_polizas(self.csv(*filas), errores, **kwargs)
+        errores.seek(0)
+        return totales, list(csv.DictReader(errores))
+
+    def test_importa_polizas_con_cuotas_pagos_y_recordatorio(self):
+        """Verifica que se crean las pólizas con sus cuotas, pagos y el recordatorio SOAT."""
+        totales, errores = self.importar(
+            'IMP-1,1020304050,sura,soat,1000000,2026-01-15,2027-01-15,CONTADO,,,imp123',
+            'IMP-2,cliente_importado,Sura,Vida,1200000,2026-02-01,2027-02-01,MENSUAL,12,Luis Asesor,',
+        )
+
+        self.assertEqual(totales, {'procesadas': 2, 'importadas': 2, 'con_error': 0})
+        self.assertEqual(errores, [])
+
+        contado = Poliza.objects.get(numero_poliza='IMP-1')
+        self.assertEqual(contado.cliente, self.cliente)
+        self.assertEqual(contado.vehiculo, self.vehiculo)
+        self.assertEqual(contado.comision_porcentaje, Decimal('10.00'))
+        pago = Pago.objects.get(poliza=contado)
+        self.assertEqual(pago.monto_pagado, Decimal('100000.00'))
+
+        mensual = Poliza.objects.get(numero_poliza='IMP-2')
+        self.assertEqual(mensual.asesor, self.asesor)
+        self.assertEqual(Cuota.objects.filter(poliza=mensual).count(), 12)
+
+        self.vehiculo.refresh_from_db()
+        self.assertEqual(self.vehiculo.soat_vencimiento_recordatorio, date(2027, 1, 15))
+
+    def test_filas_invalidas_van_al_reporte_sin_detener_la_importacion(self):
+        """Verifica que las filas rechazadas se reportan con su número y motivo."""
+        Poliza.objects.create(
+            numero_poliza='EXISTE-1', cliente=self.cliente, tipo_seguro=self.tipo_vida,
+            compania_aseguradora=self.compania, valor_prima_sin_iva=Decimal('1000'),
+            fecha_inicio=date(2026, 1, 1), fecha_fin=date(2027, 1, 1), modo_pago='CONTADO'
+        )
+
+        totales, errores = self.importar(
+            'EXISTE-1,1020304050,Sura,Vida,1000,2026-01-01,2027-01-01,CONTADO,,,',
+            'IMP-3,9999999,Sura,Vida,1000,2026-01-01,2027-01-01,CONTADO,,,',
+            'IMP-4,1020304050,Sura,Vida,1000,no-es-fecha,2027-01-01,CONTADO,,,',
+            'IMP-5,1020304050,Sura,Vida,1000,2026-01-01,2027-01-01,CONTADO,,,',
+            'IMP-5,1020304050,Sura,Vida,1000,2026-01-01,2027-01-01,CONTADO,,,',
+            tamano_lote=2,
+        )
+
+        self.assertEqual(totales, {'procesadas': 5, 'importadas': 1, 'con_error': 4})
+        self.assertEqual([fila['fila'] for fila in errores], ['2', '3', '4', '6'])
+        self.assertIn('Ya existe', errores[0]['errores'])
+        self.assertIn('cliente', errores[1]['errores'])
+        self.assertIn('fecha_inicio', errores[2]['errores'])
+        self.assertIn('Ya existe', errores[3]['errores'])
+        self.assertTrue(Poliza.objects.filter(numero_poliza='IMP-5').exists())
+
+    def test_faltan_columnas_obligatorias(self):
+        """Verifica que un archivo sin las columnas obligatorias se rechaza completo."""
+        with self.assertRaises(ErrorImportacion):
+            importar_polizas(StringIO('numero_poliza,cliente\nX,Y\n'), StringIO())
+
+    def test_simulacion_no_guarda(self):
+        """Verifica que --dry-run valida las filas sin crear pólizas."""
+        totales, errores = self.importar(
+            'IMP-6,1020304050,Sura,Vida,1000,2026-01-01,2027-01-01,CONTADO,,,', simular=True
+        )
+        self.assertEqual(totales['importadas'], 1)
+        self.assertFalse(Poliza.objects.filter(numero_poliza='IMP-6').exists())
+
+    def test_actualiza_resumen_y_busqueda_al_confirmar(self):
+        """Verifica que la señal polizas_importadas pone al día el resumen mensual y la búsqueda."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.importar('IMP-7,1020304050,Sura,SOAT,1000000,2026-03-10,2027-03-10,CONTADO,,,IMP123')
+
+        resumen = ResumenMensual.objects.get(cliente=self.cliente, mes=date(2026, 3, 1))
+        self.assertEqual(resumen.polizas_nuevas, 1)
+        self.assertEqual(resumen.primas, Decimal('1000000.00'))
+        self.assertTrue(
+            Poliza.objects.filter(numero_poliza='IMP-7', busqueda__isnull=False).exists()
+        )
+
+    def test_comando_import_polizas(self):
+        """Verifica que el comando importa el archivo y deja el reporte de errores a su lado."""
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        ruta = os.path.join(directorio, 'polizas.csv')
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            archivo.write(self.csv(
+                'IMP-8,1020304050,Sura,Vida,1000,2026-01-01,2027-01-01,CONTADO,,,',
+                'IMP-9,1020304050,NoExiste,Vida,1000,2026-01-01,2027-01-01,CONTADO,,,',
+            ).getvalue())
+
+        salida = StringIO()
+        call_command('import_polizas', ruta, stdout=salida)
+
+        self.assertIn('Importadas: 1', salida.getvalue())
+        self.assertTrue(Poliza.objects.filter(numero_poliza='IMP-8').exists())
+        with open(f'{ruta}.errores.csv', encoding='utf-8') as archivo:
+            self.assertIn('NoExiste', archivo.read())
+
+    def test_tarea_procesa_la_importacion_subida(self):
+        """Verifica que la tarea procesa el archivo subido y guarda el reporte de errores."""
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        contenido = self.csv(
+            'IMP-10,1020304050,Sura,Vida,1000,2026-01-01,2027-01-01,CONTADO,,,',
+            'IMP-11,1020304050,Sura,Vida,-5,2026-01-01,2027-01-01,SEMANAL,,,',
+        ).getvalue().encode('utf-8')
+
+        with override_settings(MEDIA_ROOT=media):
+            importacion = ImportacionPolizas.objects.create(
+                archivo=SimpleUploadedFile('polizas.csv', contenido, content_type='text/csv')
+            )
+            resultado = importar_polizas_task(importacion.pk)
+            importacion.refresh_from_db()
+
+            self.assertIn('Importadas: 1', resultado)
+            self.assertEqual(importacion.estado, 'COMPLETADA')
+            self.assertEqual(importacion.filas_con_error, 1)
+            with importacion.reporte_errores.open('r') as reporte:
+                self.assertIn('modo_pago', reporte.read())
+
+            # Una segunda entrega de la tarea no la vuelve a procesar
+            self.assertIn('no está pendiente', importar_polizas_task(importacion.pk))
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'reportes',
     'siniestros',
     'django.contrib.humanize',
+    'django.contrib.postgres',
     
 ]
 
@@ -164,6 +165,33 @@ DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL')
 EMAIL_USE_TLS = False
 EMAIL_USE_SSL = True
 
+# Envíos masivos: cuántos correos se mandan por cada send_messages() sobre la
+# misma conexión SMTP, y el máximo de mensajes por segundo de cada conexión
+# (0 = sin límite).
+EMAIL_LOTE_TAMANO = int(os.environ.get('EMAIL_LOTE_TAMANO', 50))
+EMAIL_MAX_MENSAJES_POR_SEGUNDO = float(os.environ.get('EMAIL_MAX_MENSAJES_POR_SEGUNDO', 10))
+
+# Bandeja de salida (CorreoSaliente): intentos de envío antes de dejar un
+# correo en estado FALLIDO. Entre intentos se espera 2, 4, 8... minutos.
+EMAIL_MAX_INTENTOS = int(os.environ.get('EMAIL_MAX_INTENTOS', 5))
+
+
+# --- CONFIGURACIÓN DE CACHÉ ---
+# Usamos el mismo Redis de Celery, en otra base de datos (1) para no mezclar claves.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_CACHE_URL', 'redis://localhost:6379/1'),
+        'KEY_PREFIX': 'assecol',
+    }
+}
+
+# Reportes en caché (ver reportes/cache.py): las claves se invalidan por
+# versión, así que la expiración es solo un respaldo. Los meses cerrados
+# casi nunca cambian y se guardan mucho más tiempo.
+REPORTES_CACHE_SEGUNDOS = int(os.environ.get('REPORTES_CACHE_SEGUNDOS', 60 * 60))
+REPORTES_CACHE_SEGUNDOS_MES_CERRADO = int(os.environ.get('REPORTES_CACHE_SEGUNDOS_MES_CERRADO', 60 * 60 * 24 * 30))
+
 
 # --- CONFIGURACIÓN DE CELERY ---
 CELERY_BROKER_URL = 'redis://localhost:6379/0' # Conexión a nuestro Redis local
@@ -179,13 +207,45 @@ CELERY_BEAT_SCHEDULE = {
     'enviar-recordatorios-diarios': {
         'task': 'polizas.tasks.enviar_recordatorios_vencimiento',
         # Se ejecuta todos los días a las 8:00 AM (hora del servidor)
-        'schedule': crontab(hour=8, minute=0), 
+        'schedule': crontab(hour=8, minute=0),
+    },
+    'detectar-mora-diaria': {
+        'task': 'cartera.tasks.detectar_mora_incremental',
+        # Solo revisa las cuotas que vencieron desde la ejecución anterior
+        'schedule': crontab(hour=0, minute=30),
+    },
+    'despachar-bandeja-salida': {
+        'task': 'polizas.tasks.despachar_bandeja_salida',
+        # Respaldo del despacho inmediato: recoge reintentos y correos cuyo
+        # aviso a Celery no llegó a encolarse.
+        'schedule': 60.0,
+    },
+    'precalentar-panel-reportes': {
+        'task': 'reportes.tasks.precalentar_panel_reportes',
+        # Después de la detección de mora, para que el panel ya refleje la cartera del día
+        'schedule': crontab(hour=0, minute=45),
     },
     # Aquí podrías añadir más tareas programadas en el futuro
 }
 
 ADMIN_EMAIL = os.environ.get('EMAIL_ADMIN_NOTIFICACIONES')
 
+# Cuántas pólizas procesa cada subtarea del envío de recordatorios
+RECORDATORIOS_POLIZAS_POR_SUBTAREA = int(os.environ.get('RECORDATORIOS_POLIZAS_POR_SUBTAREA', 200))
+
+# Hitos (días antes del vencimiento) en los que se envía un recordatorio.
+# Cada póliza recibe un solo aviso por hito, registrado en NotificacionEnviada.
+RECORDATORIOS_HITOS_DIAS = [30, 15, 7, 1]
+
+# El administrador recibe un solo correo de resumen por ejecución. Con True,
+# además recibe una copia de cada recordatorio (un correo por póliza).
+RECORDATORIOS_COPIA_ADMIN_POR_POLIZA = os.environ.get('RECORDATORIOS_COPIA_ADMIN_POR_POLIZA', 'False') == 'True'
+
+# Búsqueda global del dashboard: con True, las placas y números de póliza
+# también se buscan por similitud de trigramas (tolera errores de digitación).
+# Requiere la extensión pg_trgm; se crea con `manage.py actualizar_busqueda --trigramas`.
+BUSQUEDA_TRIGRAMAS = os.environ.get('BUSQUEDA_TRIGRAMAS', 'False') == 'True'
+
 
 # --- CONFIGURACIÓN DE LOGGING ---
 LOGGING = {
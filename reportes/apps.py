@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ReportesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reportes'
+
+    def ready(self):
+        # Importa las señales que mantienen el resumen mensual
+        import reportes.signals
@@ -0,0 +1,113 @@
+# reportes/cache.py
+"""
+Caché versionada de los reportes.
+
+Cada mes tiene un número de versión en la caché ('reportes:version:2025-03'),
+además de una versión global de la cartera. Las claves de los contextos
+calculados incluyen las versiones de los meses de los que dependen, así que
+invalidar un mes es solo incrementar su versión: las claves viejas dejan de
+usarse y expiran solas.
+
+Si la caché no está disponible, los reportes se calculan igual; ningún error
+de la caché debe llegar al usuario ni interrumpir el guardado de un modelo.
+"""
+import hashlib
+import logging
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger('reportes')
+
+VERSION_CARTERA = 'cartera'
+# Nombres que muestran los reportes (clientes, compañías, tipos de seguro, asesores)
+VERSION_NOMBRES = 'nombres'
+
+
+def _clave_version(nombre):
+    return f'reportes:version:{nombre}'
+
+
+def nombre_mes(fecha):
+    return f'{fecha:%Y-%m}'
+
+
+def obtener_versiones(nombres):
+    """
+    Devuelve las versiones actuales de los nombres dados, en el mismo orden.
+    Las que no existen se inicializan con un valor que no puede coincidir con
+    uno anterior (la hora en nanosegundos), por si la caché las desalojó.
+    """
+    claves = [_clave_version(nombre) for nombre in nombres]
+    versiones = cache.get_many(claves)
+    faltantes = {clave: time.time_ns() for clave in claves if clave not in versiones}
+    if faltantes:
+        cache.set_many(faltantes, timeout=None)
+        versiones.update(faltantes)
+    return [versiones[clave] for clave in claves]
+
+
+def incrementar_versiones(nombres):
+    """Invalida los contextos que dependen de los nombres dados."""
+    for nombre in set(nombres):
+        clave = _clave_version(nombre)
+        try:
+            try:
+                cache.incr(clave)
+            except ValueError:
+                # La versión no existía: cualquier valor nuevo invalida lo anterior
+                cache.set(clave, time.time_ns(), timeout=None)
+        except Exception as e:
+            logger.warning(f"No se pudo invalidar la caché de reportes '{nombre}': {e}")
+
+
+def invalidar_meses(fechas):
+    """Invalida los reportes de los meses de las fechas dadas y los de la cartera."""
+    incrementar_versiones([nombre_mes(fecha) for fecha in fechas if fecha] + [VERSION_CARTERA])
+
+
+def invalidar_cartera():
+    """Invalida los reportes que dependen del estado actual de la cartera."""
+    incrementar_versiones([VERSION_CARTERA])
+
+
+def programar_invalidacion_cartera():
+    """Invalida la cartera cuando se confirme la transacción en curso."""
+    transaction.on_commit(invalidar_cartera)
+
+
+def invalidar_nombres():
+    """Invalida los reportes que muestran nombres de clientes, compañías, tipos o asesores."""
+    incrementar_versiones([VERSION_NOMBRES])
+
+
+def programar_invalidacion_nombres():
+    transaction.on_commit(invalidar_nombres)
+
+
+def obtener_o_calcular(prefijo, dependencias, calcular, timeout=None):
+    """
+    Devuelve el valor en caché para `prefijo` y las versiones actuales de
+    `dependencias`; si no está, lo calcula con `calcular()` y lo guarda.
+    """
+    if timeout is None:
+        timeout = settings.REPORTES_CACHE_SEGUNDOS
+    try:
+        versiones = obtener_versiones(dependencias)
+        # Las versiones van resumidas: doce meses de versiones pasarían de los
+        # 250 caracteres que admite memcached en una clave
+        resumen = hashlib.sha1('.'.join(str(v) for v in versiones).encode()).hexdigest()
+        clave = f"reportes:{prefijo}:v{resumen}"
+        valor = cache.get(clave)
+    except Exception as e:
+        logger.warning(f"Caché de reportes no disponible, se calcula '{prefijo}' sin caché: {e}")
+        return calcular()
+
+    if valor is None:
+        valor = calcular()
+        try:
+            cache.set(clave, valor, timeout=timeout)
+        except Exception as e:
+            logger.warning(f"No se pudo guardar '{prefijo}' en la caché de reportes: {e}")
+    return valor
@@ -0,0 +1,101 @@
+# reportes/exposicion.py
+"""
+Exposición por cancelación: cuánto habría que devolver a los clientes y
+cuánta comisión retornarían las aseguradoras si en una fecha dada se
+cancelaran todas las pólizas de contado activas de un filtro.
+
+Es el mismo prorrateo de Poliza.calcular_prorrateo_cancelacion, calculado
+para toda la cartera con polizas.finance: una consulta values_list y
+arreglos de NumPy, sin instanciar pólizas. El resultado se guarda en la
+caché por fecha, agrupación y filtros, y se invalida con la versión de la cartera
+y la de los nombres de los grupos.
+"""
+import numpy as np
+from polizas import finance
+from polizas.models import Poliza
+from .cache import VERSION_CARTERA, VERSION_NOMBRES, obtener_o_calcular
+
+# Agrupación: (título de la columna, campo con el nombre del grupo)
+AGRUPACIONES = {
+    'compania': ('Compañía', 'compania_aseguradora__nombre'),
+    'tipo': ('Tipo de Seguro', 'tipo_seguro__nombre'),
+    'asesor': ('Asesor', 'asesor__nombre_completo'),
+}
+
+# Filtro del GET: campo de la póliza
+FILTROS_EXPOSICION = {
+    'compania': 'compania_aseguradora_id',
+    'tipo': 'tipo_seguro_id',
+    'asesor': 'asesor_id',
+}
+
+SIN_GRUPO = 'Sin asignar'
+
+
+def polizas_expuestas(fecha, filtros):
+    """Pólizas de contado activas que siguen vigentes en `fecha`."""
+    queryset = Poliza.objects.filter(estado='ACTIVA', modo_pago='CONTADO', fecha_fin__gt=fecha)
+    for clave, campo in FILTROS_EXPOSICION.items():
+        if filtros.get(clave):
+            queryset = queryset.filter(**{campo: filtros[clave]})
+    return queryset
+
+
+def calcular_exposicion(fecha, agrupar_por='compania', filtros=None):
+    """
+    Devolución al cliente y comisión a retornar si las pólizas del filtro se
+    cancelaran en `fecha`, por grupo y en total. Los montos son Decimal.
+    """
+    campo_grupo = AGRUPACIONES[agrupar_por][1]
+    columnas = finance.cargar_cartera(polizas_expuestas(fecha, filtros or {}), extras=[campo_grupo])
+
+    # Una póliza que aún no empieza se devolvería completa
+    cancelacion = np.maximum(np.datetime64(fecha, 'D'), columnas['fecha_inicio'])
+    devolucion, comision, _ = finance.calcular_prorrateo(
+        columnas['prima'], columnas['tarifa_comision'], columnas['modo_pago'],
+        columnas['fecha_inicio'], columnas['fecha_fin'], cancelacion
+    )
+
+    nombres = np.array([nombre or SIN_GRUPO for nombre in columnas[campo_grupo]], dtype=str)
+    grupos, indices = np.unique(nombres, return_inverse=True)
+    sumas = {}
+    montos_poliza = {
+        'primas': columnas['prima'],
+        'devolucion_cliente': devolucion,
+        'comision_a_devolver': comision,
+    }
+    for clave, valores in montos_poliza.items():
+        # np.add.at suma en int64: bincount pasaría por float64 y perdería centavos
+        suma = np.zeros(len(grupos), dtype=np.int64)
+        np.add.at(suma, indices, valores)
+        sumas[clave] = suma
+    cantidades = np.bincount(indices, minlength=len(grupos))
+
+    orden = np.argsort(-sumas['devolucion_cliente'], kind='stable')
+    montos = {clave: finance.a_decimales(suma[orden]) for clave, suma in sumas.items()}
+    filas = [
+        {
+            'nombre': str(grupos[posicion]),
+            'cantidad': int(cantidades[posicion]),
+            **{clave: valores[indice] for clave, valores in montos.items()},
+        }
+        for indice, posicion in enumerate(orden)
+    ]
+    totales = {
+        'cantidad': len(columnas['pk']),
+        'primas': finance.a_decimales([columnas['prima'].sum()])[0],
+        'devolucion_cliente': finance.a_decimales([devolucion.sum()])[0],
+        'comision_a_devolver': finance.a_decimales([comision.sum()])[0],
+    }
+    return {'filas': filas, 'totales': totales}
+
+
+def obtener_exposicion(fecha, agrupar_por='compania', filtros=None):
+    """calcular_exposicion() con caché por (fecha, agrupación, filtros)."""
+    filtros = filtros or {}
+    clave_filtros = ':'.join(f"{clave}={filtros.get(clave) or ''}" for clave in FILTROS_EXPOSICION)
+    return obtener_o_calcular(
+        f'exposicion:{fecha:%Y-%m-%d}:{agrupar_por}:{clave_filtros}',
+        [VERSION_CARTERA, VERSION_NOMBRES],
+        lambda: calcular_exposicion(fecha, agrupar_por, filtros)
+    )
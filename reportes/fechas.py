@@ -0,0 +1,30 @@
+# reportes/fechas.py
+"""
+Rangos de fechas para filtros mensuales.
+
+Filtrar con `fecha__year=` / `fecha__month=` obliga a Postgres a aplicar
+EXTRACT() a cada fila, así que no puede usar un índice sobre la fecha. Estos
+helpers convierten el mes en un rango `>= primer día / < primer día del mes
+siguiente`, que sí lo aprovecha.
+"""
+from datetime import date
+from dateutil.relativedelta import relativedelta
+
+
+def primer_dia_del_mes(fecha):
+    return fecha.replace(day=1)
+
+
+def rango_mes(ano, mes):
+    """Devuelve (desde, hasta) del mes: desde es inclusivo y hasta exclusivo."""
+    desde = date(ano, mes, 1)
+    return desde, desde + relativedelta(months=1)
+
+
+def filtro_mes(campo, ano, mes):
+    """
+    Kwargs de filtro para las filas de `campo` dentro del mes. Ejemplo:
+    Pago.objects.filter(**filtro_mes('fecha_pago', 2025, 3))
+    """
+    desde, hasta = rango_mes(ano, mes)
+    return {f'{campo}__gte': desde, f'{campo}__lt': hasta}
@@ -0,0 +1,26 @@
+# reportes/management/commands/reconstruir_resumen_mensual.py
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from polizas.models import Poliza
+from cartera.models import Pago
+from reportes.models import ResumenMensual
+from reportes.resumen import calcular_filas_resumen
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero la tabla ResumenMensual que usa el panel de reportes.'
+
+    def handle(self, *args, **options):
+        self.stdout.write("--- Reconstruyendo el resumen mensual ---")
+        inicio = time.perf_counter()
+
+        filas = calcular_filas_resumen(Poliza.objects.all(), Pago.objects.all())
+        with transaction.atomic():
+            borradas, _ = ResumenMensual.objects.all().delete()
+            ResumenMensual.objects.bulk_create(filas, batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Resumen reconstruido. Filas anteriores: {borradas}. Filas nuevas: {len(filas)}."
+        ))
+        self.stdout.write(f"Tiempo total: {time.perf_counter() - inicio:.3f}s")
@@ -1,3 +1,52 @@
 from django.db import models
+from django.contrib.auth.models import User
+from polizas.models import Asesor, CompaniaAseguradora, TipoSeguro
 
-# Create your models here.
+
+class ResumenMensual(models.Model):
+    """
+    Tabla de hechos del panel de reportes: una fila por mes, tipo de seguro,
+    compañía, asesor y cliente, con las primas de las pólizas que iniciaron
+    ese mes y las comisiones de los pagos registrados ese mes.
+
+    Se mantiene al día desde las señales de Poliza y Pago (ver
+    reportes/signals.py) y se puede reconstruir completa con el comando
+    reconstruir_resumen_mensual.
+    """
+    mes = models.DateField(help_text="Primer día del mes.")
+    tipo_seguro = models.ForeignKey(TipoSeguro, on_delete=models.CASCADE, related_name='+')
+    compania_aseguradora = models.ForeignKey(CompaniaAseguradora, on_delete=models.CASCADE, related_name='+')
+    asesor = models.ForeignKey(Asesor, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    cliente = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+
+    # Pólizas por fecha_inicio
+    polizas_nuevas = models.PositiveIntegerField(default=0)
+    primas = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    iva = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    # Pagos de comisión por fecha_pago
+    cantidad_pagos = models.PositiveIntegerField(default=0)
+    comisiones_pendientes = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    comisiones_liquidadas = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Resumen Mensual"
+        verbose_name_plural = "Resúmenes Mensuales"
+        ordering = ['-mes']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['mes', 'tipo_seguro', 'compania_aseguradora', 'asesor', 'cliente'],
+                name='resumen_mensual_unico'
+            ),
+        ]
+        indexes = [
+            # Sirve al recálculo incremental, que reemplaza las filas de un cliente en un mes
+            models.Index(fields=['cliente', 'mes'], name='resumen_cliente_mes_idx'),
+        ]
+
+    def __str__(self):
+        return f"Resumen {self.mes:%Y-%m} - {self.cliente_id} / {self.tipo_seguro_id} / {self.compania_aseguradora_id}"
+
+    @property
+    def total_ventas(self):
+        return self.primas + self.iva
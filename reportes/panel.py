@@ -0,0 +1,165 @@
+# reportes/panel.py
+import json
+import pandas as pd
+from decimal import Decimal
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db.models import Count, F, Sum
+from polizas.models import Poliza
+from .cache import VERSION_CARTERA, VERSION_NOMBRES, nombre_mes, obtener_o_calcular
+from .models import ResumenMensual
+
+
+def calcular_metricas_mes(ano, mes):
+    """
+    KPIs, ventas por tipo, comisiones por compañía y top de clientes del mes.
+    Todo sale de ResumenMensual (unas decenas de filas por mes) en lugar de
+    recorrer Poliza y Pago.
+    """
+    fecha_seleccionada = date(ano, mes, 1)
+    resumen_del_mes = ResumenMensual.objects.filter(mes=fecha_seleccionada)
+
+    # --- KPIs del mes ---
+    totales_mes = resumen_del_mes.aggregate(
+        ventas=Sum('primas'),
+        iva=Sum('iva'),
+        pendientes=Sum('comisiones_pendientes'),
+        liquidadas=Sum('comisiones_liquidadas'),
+        nuevas_polizas=Sum('polizas_nuevas')
+    )
+    total_ventas_con_iva = (totales_mes['ventas'] or Decimal('0')) + (totales_mes['iva'] or Decimal('0'))
+    comisiones_pendientes_mes = totales_mes['pendientes'] or Decimal('0')
+    comisiones_liquidadas_mes = totales_mes['liquidadas'] or Decimal('0')
+    nuevas_polizas_mes = totales_mes['nuevas_polizas'] or 0
+
+    # --- Análisis MoM para Nuevas Pólizas ---
+    fecha_mes_anterior = fecha_seleccionada - relativedelta(months=1)
+    nuevas_polizas_mes_anterior = ResumenMensual.objects.filter(
+        mes=fecha_mes_anterior
+    ).aggregate(total=Sum('polizas_nuevas'))['total'] or 0
+
+    polizas_mom_change = 0
+    if nuevas_polizas_mes_anterior > 0:
+        polizas_mom_change = ((nuevas_polizas_mes - nuevas_polizas_mes_anterior) / nuevas_polizas_mes_anterior) * 100
+
+    # --- Gráfico: Ventas por Tipo de Seguro ---
+    ventas_por_tipo = resumen_del_mes.filter(
+        polizas_nuevas__gt=0
+    ).values('tipo_seguro__nombre').annotate(
+        total_vendido=Sum('primas')
+    ).order_by('-total_vendido')
+
+    # --- Rendimiento por Compañía Aseguradora ---
+    comisiones_por_compania = resumen_del_mes.filter(
+        cantidad_pagos__gt=0
+    ).values('compania_aseguradora__nombre').annotate(
+        total_comision=Sum(F('comisiones_pendientes') + F('comisiones_liquidadas'))
+    ).order_by('-total_comision')
+
+    # --- Top 5 Clientes ---
+    top_clientes_qs = resumen_del_mes.filter(
+        cantidad_pagos__gt=0,
+        cliente__is_staff=False
+    ).values(
+        'cliente__username', 'cliente__first_name', 'cliente__last_name'
+    ).annotate(
+        total_comision_generada=Sum(F('comisiones_pendientes') + F('comisiones_liquidadas'))
+    ).order_by('-total_comision_generada')[:5]
+
+    return {
+        'total_ventas_con_iva': round(float(total_ventas_con_iva), 0),
+        'comisiones_pendientes_mes': round(float(comisiones_pendientes_mes), 0),
+        'comisiones_liquidadas_mes': round(float(comisiones_liquidadas_mes), 0),
+        'nuevas_polizas_mes': nuevas_polizas_mes,
+        'polizas_mom_change': round(polizas_mom_change, 1),
+        'labels_grafico_tipos': json.dumps([item['tipo_seguro__nombre'] for item in ventas_por_tipo]),
+        'data_grafico_tipos': json.dumps([float(item['total_vendido'] or 0) for item in ventas_por_tipo]),
+        'labels_companias': json.dumps([item['compania_aseguradora__nombre'] for item in comisiones_por_compania]),
+        'data_companias': json.dumps([float(item['total_comision'] or 0) for item in comisiones_por_compania]),
+        'top_clientes': [
+            {
+                'nombre': f"{c['cliente__first_name']} {c['cliente__last_name']}".strip() or c['cliente__username'],
+                'comision': round(float(c['total_comision_generada'] or 0), 2)
+            }
+            for c in top_clientes_qs
+        ],
+    }
+
+
+def meses_de_tendencia(hoy):
+    """Primer día de cada uno de los últimos 12 meses, terminando en el de `hoy`."""
+    inicio = hoy.replace(day=1) - relativedelta(months=11)
+    return [inicio + relativedelta(months=i) for i in range(12)]
+
+
+def calcular_tendencia_comisiones(hoy):
+    """Comisiones (pendientes + liquidadas) de los últimos 12 meses."""
+    comisiones_por_mes = ResumenMensual.objects.filter(
+        mes__gte=meses_de_tendencia(hoy)[0],
+        cantidad_pagos__gt=0
+    ).values('mes').annotate(
+        comision_ganada=Sum(F('comisiones_pendientes') + F('comisiones_liquidadas'))
+    ).order_by('mes')
+
+    labels_tendencia, data_tendencia = [], []
+    if comisiones_por_mes:
+        df = pd.DataFrame(list(comisiones_por_mes))
+        df['mes'] = pd.to_datetime(df['mes'])
+        df['comision_ganada'] = pd.to_numeric(df['comision_ganada'], errors='coerce').fillna(0)
+        comisiones_mensuales = df.set_index('mes')['comision_ganada'].resample('MS').sum()
+        labels_tendencia = comisiones_mensuales.index.strftime('%b %Y').tolist()
+        data_tendencia = comisiones_mensuales.values.round(2).tolist()
+
+    return {
+        'labels_tendencia': json.dumps(labels_tendencia),
+        'data_tendencia': json.dumps(data_tendencia),
+    }
+
+
+def calcular_salud_cartera():
+    """Pólizas activas por estado de cartera (estado actual, no depende del mes)."""
+    salud_cartera = Poliza.objects.filter(
+        estado='ACTIVA'
+    ).values('estado_cartera').annotate(count=Count('id'))
+
+    return {
+        'labels_salud_cartera': json.dumps([
+            item['estado_cartera'].replace('_', ' ').capitalize()
+            for item in salud_cartera
+        ]),
+        'data_salud_cartera': json.dumps([item['count'] for item in salud_cartera]),
+    }
+
+
+def construir_contexto_panel(ano, mes, hoy):
+    """
+    Contexto calculado del panel de reportes, leído de la caché por partes:
+
+    - Las métricas del mes dependen solo de ese mes y del anterior (y de los
+      nombres que muestran); los meses cerrados se guardan por
+      REPORTES_CACHE_SEGUNDOS_MES_CERRADO.
+    - La tendencia depende de los últimos 12 meses.
+    - La salud de la cartera depende del estado actual de las pólizas.
+    """
+    fecha_seleccionada = date(ano, mes, 1)
+    mes_cerrado = fecha_seleccionada < hoy.replace(day=1)
+
+    contexto = obtener_o_calcular(
+        f'panel:mes:{nombre_mes(fecha_seleccionada)}',
+        [nombre_mes(fecha_seleccionada), nombre_mes(fecha_seleccionada - relativedelta(months=1)), VERSION_NOMBRES],
+        lambda: calcular_metricas_mes(ano, mes),
+        timeout=settings.REPORTES_CACHE_SEGUNDOS_MES_CERRADO if mes_cerrado else None
+    )
+    contexto = dict(contexto)
+    contexto.update(obtener_o_calcular(
+        f'panel:tendencia:{nombre_mes(hoy)}',
+        [*(nombre_mes(fecha) for fecha in meses_de_tendencia(hoy)), VERSION_NOMBRES],
+        lambda: calcular_tendencia_comisiones(hoy)
+    ))
+    contexto.update(obtener_o_calcular(
+        'panel:salud',
+        [VERSION_CARTERA],
+        calcular_salud_cartera
+    ))
+    return contexto
@@ -0,0 +1,132 @@
+# reportes/resumen.py
+import logging
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from polizas.models import Poliza
+from cartera.models import Pago
+from .cache import invalidar_meses
+from .fechas import filtro_mes, primer_dia_del_mes, rango_mes
+from .models import ResumenMensual
+
+logger = logging.getLogger('reportes')
+
+CLAVE_RESUMEN = ('mes', 'tipo_seguro_id', 'compania_aseguradora_id', 'asesor_id', 'cliente_id')
+
+
+def calcular_filas_resumen(polizas, pagos):
+    """
+    Calcula las filas de ResumenMensual para los querysets dados con dos
+    consultas agrupadas: una sobre las pólizas (por mes de inicio) y otra
+    sobre los pagos (por mes de pago). Devuelve instancias sin guardar.
+    """
+    filas = {}
+
+    def fila(datos):
+        clave = tuple(datos[campo] for campo in CLAVE_RESUMEN)
+        if clave not in filas:
+            filas[clave] = ResumenMensual(**dict(zip(CLAVE_RESUMEN, clave)))
+        return filas[clave]
+
+    por_poliza = polizas.with_financials().values(
+        'tipo_seguro_id', 'compania_aseguradora_id', 'asesor_id', 'cliente_id',
+        mes=TruncMonth('fecha_inicio')
+    ).annotate(
+        cantidad=Count('pk'),
+        total_primas=Sum('valor_prima_sin_iva'),
+        total_iva=Sum('iva_calculado')
+    ).order_by()
+
+    for datos in por_poliza:
+        resumen = fila(datos)
+        resumen.polizas_nuevas = datos['cantidad']
+        resumen.primas = datos['total_primas'] or 0
+        resumen.iva = datos['total_iva'] or 0
+
+    por_pago = pagos.values(
+        mes=TruncMonth('fecha_pago'),
+        tipo_seguro_id=F('poliza__tipo_seguro_id'),
+        compania_aseguradora_id=F('poliza__compania_aseguradora_id'),
+        asesor_id=F('poliza__asesor_id'),
+        cliente_id=F('poliza__cliente_id')
+    ).annotate(
+        cantidad=Count('pk'),
+        pendientes=Sum('monto_pagado', filter=Q(estado_comision='PENDIENTE')),
+        liquidadas=Sum('monto_pagado', filter=Q(estado_comision='LIQUIDADA'))
+    ).order_by()
+
+    for datos in por_pago:
+        resumen = fila(datos)
+        resumen.cantidad_pagos = datos['cantidad']
+        resumen.comisiones_pendientes = datos['pendientes'] or 0
+        resumen.comisiones_liquidadas = datos['liquidadas'] or 0
+
+    return list(filas.values())
+
+
+def recalcular_resumen_cliente_mes(cliente_id, mes):
+    """
+    Reemplaza las filas del resumen de un cliente en un mes. Solo lee las
+    pólizas y pagos de ese cliente en ese mes, así que su costo no depende
+    del tamaño de la cartera.
+    """
+    desde, _ = rango_mes(mes.year, mes.month)
+
+    filas = calcular_filas_resumen(
+        Poliza.objects.filter(cliente_id=cliente_id, **filtro_mes('fecha_inicio', mes.year, mes.month)),
+        Pago.objects.filter(poliza__cliente_id=cliente_id, **filtro_mes('fecha_pago', mes.year, mes.month))
+    )
+    with transaction.atomic():
+        ResumenMensual.objects.filter(cliente_id=cliente_id, mes=desde).delete()
+        ResumenMensual.objects.bulk_create(filas)
+    return len(filas)
+
+
+def programar_recalculo(pares):
+    """
+    Recalcula el resumen de los pares (cliente_id, fecha) cuando se confirme
+    la transacción en curso (de inmediato si no hay ninguna) e invalida la
+    caché de esos meses. Un error aquí
+    no debe deshacer la operación que lo originó: se registra y el resumen
+    se puede reconstruir con el comando reconstruir_resumen_mensual.
+    """
+    pares = {(cliente_id, primer_dia_del_mes(fecha)) for cliente_id, fecha in pares if cliente_id and fecha}
+
+    def recalcular():
+        for cliente_id, mes in pares:
+            try:
+                recalcular_resumen_cliente_mes(cliente_id, mes)
+            except Exception as e:
+                logger.exception(f"Error al recalcular el resumen mensual del cliente {cliente_id} en {mes:%Y-%m}: {e}")
+        # Después de recalcular, para que nadie guarde en caché el resumen viejo con la versión nueva
+        invalidar_meses([mes for _, mes in pares])
+
+    if pares:
+        transaction.on_commit(recalcular)
+
+
+def recalcular_resumen_clientes_meses(cliente_ids, meses):
+    """
+    Reemplaza las filas del resumen de varios clientes en varios meses con
+    dos consultas agrupadas en total. Lo usa la importación masiva de
+    pólizas, que afecta a miles de pares (cliente, mes) de una vez.
+    """
+    cliente_ids = set(cliente_ids)
+    meses = {primer_dia_del_mes(mes) for mes in meses}
+    if not cliente_ids or not meses:
+        return 0
+
+    filtro_polizas, filtro_pagos = Q(), Q()
+    for mes in meses:
+        filtro_polizas |= Q(**filtro_mes('fecha_inicio', mes.year, mes.month))
+        filtro_pagos |= Q(**filtro_mes('fecha_pago', mes.year, mes.month))
+
+    filas = calcular_filas_resumen(
+        Poliza.objects.filter(filtro_polizas, cliente_id__in=cliente_ids),
+        Pago.objects.filter(filtro_pagos, poliza__cliente_id__in=cliente_ids)
+    )
+    with transaction.atomic():
+        ResumenMensual.objects.filter(cliente_id__in=cliente_ids, mes__in=meses).delete()
+        ResumenMensual.objects.bulk_create(filas, batch_size=1000)
+    invalidar_meses(meses)
+    return len(filas)
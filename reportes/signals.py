@@ -0,0 +1,186 @@
+# reportes/signals.py
+import logging
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.db import transaction
+from django.contrib.auth.models import User
+from django.dispatch import receiver
+from polizas.models import Asesor, CompaniaAseguradora, Poliza, TipoSeguro
+from polizas.signals import polizas_canceladas, polizas_importadas
+from cartera.models import Cuota, Pago
+from cartera.signals import comisiones_liquidadas_en_bloque
+from .cache import programar_invalidacion_cartera, programar_invalidacion_nombres
+from .resumen import programar_recalculo, recalcular_resumen_clientes_meses
+
+logger = logging.getLogger('reportes')
+
+# Campos de la póliza que alimentan el resumen mensual. Los de agrupación
+# también afectan a las filas de sus pagos.
+CAMPOS_AGRUPACION_POLIZA = ('cliente_id', 'tipo_seguro_id', 'compania_aseguradora_id', 'asesor_id')
+CAMPOS_RESUMEN_POLIZA = CAMPOS_AGRUPACION_POLIZA + ('fecha_inicio', 'valor_prima_sin_iva', 'porcentaje_iva')
+CAMPOS_RESUMEN_PAGO = ('poliza_id', 'fecha_pago', 'monto_pagado', 'estado_comision')
+
+# Campos de cada modelo cuyo nombre aparece en los reportes en caché
+CAMPOS_NOMBRE = {
+    User: {'first_name', 'last_name', 'username'},
+    CompaniaAseguradora: {'nombre'},
+    TipoSeguro: {'nombre'},
+    Asesor: {'nombre_completo'},
+}
+
+
+def _valores_anteriores(sender, instance, campos):
+    if instance.pk is None:
+        return None
+    return sender.objects.filter(pk=instance.pk).values(*campos).first()
+
+
+@receiver(pre_save, sender=Poliza)
+def guardar_poliza_anterior(sender, instance, **kwargs):
+    # La póliza cargada de la base ya trae sus valores originales: sin consulta extra
+    originales = instance.valores_originales()
+    if originales is not None and all(campo in originales for campo in CAMPOS_RESUMEN_POLIZA):
+        instance._resumen_anterior = {campo: originales[campo] for campo in CAMPOS_RESUMEN_POLIZA}
+    else:
+        instance._resumen_anterior = _valores_anteriores(sender, instance, CAMPOS_RESUMEN_POLIZA)
+
+
+@receiver(post_save, sender=Poliza)
+def actualizar_resumen_poliza(sender, instance, created, **kwargs):
+    """
+    Recalcula el resumen del mes de inicio de la póliza (y el anterior, si
+    cambió). Si cambió un campo de agrupación, también los meses de sus pagos.
+    Los guardados que no tocan estos campos (ej: estado_cartera) no hacen nada.
+    """
+    anterior = getattr(instance, '_resumen_anterior', None)
+    if anterior and all(anterior[campo] == getattr(instance, campo) for campo in CAMPOS_RESUMEN_POLIZA):
+        return
+
+    pares = [(instance.cliente_id, instance.fecha_inicio)]
+    if anterior:
+        pares.append((anterior['cliente_id'], anterior['fecha_inicio']))
+        if any(anterior[campo] != getattr(instance, campo) for campo in CAMPOS_AGRUPACION_POLIZA):
+            for mes in instance.pagos.dates('fecha_pago', 'month'):
+                pares += [(instance.cliente_id, mes), (anterior['cliente_id'], mes)]
+    programar_recalculo(pares)
+
+
+@receiver(pre_save, sender=Pago)
+def guardar_pago_anterior(sender, instance, **kwargs):
+    instance._resumen_anterior = _valores_anteriores(sender, instance, CAMPOS_RESUMEN_PAGO)
+
+
+@receiver(post_save, sender=Pago)
+def actualizar_resumen_pago(sender, instance, created, **kwargs):
+    anterior = getattr(instance, '_resumen_anterior', None)
+    if anterior and all(anterior[campo] == getattr(instance, campo) for campo in CAMPOS_RESUMEN_PAGO):
+        return
+
+    pares = [(instance.poliza.cliente_id, instance.fecha_pago)]
+    if anterior:
+        cliente_anterior = Poliza.objects.filter(pk=anterior['poliza_id']).values_list('cliente_id', flat=True).first()
+        pares.append((cliente_anterior, anterior['fecha_pago']))
+    programar_recalculo(pares)
+
+
+@receiver(pre_delete, sender=Poliza)
+@receiver(pre_delete, sender=Pago)
+def guardar_clave_antes_de_borrar(sender, instance, **kwargs):
+    # Al borrar en cascada, la póliza puede no existir ya cuando llega el
+    # post_delete del pago: se guarda la clave antes de borrar.
+    if sender is Poliza:
+        instance._resumen_clave = (instance.cliente_id, instance.fecha_inicio)
+    else:
+        instance._resumen_clave = (instance.poliza.cliente_id, instance.fecha_pago)
+
+
+@receiver(post_delete, sender=Poliza)
+@receiver(post_delete, sender=Pago)
+def actualizar_resumen_al_borrar(sender, instance, **kwargs):
+    clave = getattr(instance, '_resumen_clave', None)
+    if clave:
+        programar_recalculo([clave])
+
+
+@receiver(post_save, sender=Poliza)
+@receiver(post_delete, sender=Poliza)
+@receiver(post_save, sender=Cuota)
+@receiver(post_delete, sender=Cuota)
+def invalidar_cache_cartera(sender, instance, **kwargs):
+    """
+    El estado de la cartera (pólizas al día / en mora) no depende del mes:
+    cualquier cambio en pólizas o cuotas invalida los reportes que lo usan.
+    """
+    programar_invalidacion_cartera()
+
+
+@receiver(polizas_importadas)
+def actualizar_resumen_importacion(sender, polizas, pagos, **kwargs):
+    """
+    La importación masiva no dispara post_save: recalcula de una vez los
+    clientes y meses del lote cuando se confirme su transacción.
+    """
+    cliente_ids = {poliza.cliente_id for poliza in polizas}
+    meses = {poliza.fecha_inicio for poliza in polizas} | {pago.fecha_pago for pago in pagos}
+
+    def recalcular():
+        try:
+            recalcular_resumen_clientes_meses(cliente_ids, meses)
+        except Exception as e:
+            logger.exception(f"Error al recalcular el resumen mensual de un lote importado: {e}")
+
+    transaction.on_commit(recalcular)
+    programar_invalidacion_cartera()
+
+
+@receiver(comisiones_liquidadas_en_bloque)
+def actualizar_resumen_liquidacion(sender, pares, **kwargs):
+    """
+    La liquidación en bloque cambia estado_comision con un UPDATE: recalcula
+    de una vez los clientes y meses de los pagos afectados.
+    """
+    cliente_ids = {cliente_id for cliente_id, _ in pares}
+    meses = {fecha for _, fecha in pares}
+
+    def recalcular():
+        try:
+            recalcular_resumen_clientes_meses(cliente_ids, meses)
+        except Exception as e:
+            logger.exception(f"Error al recalcular el resumen mensual de una liquidación en bloque: {e}")
+
+    transaction.on_commit(recalcular)
+
+
+@receiver(polizas_canceladas)
+def actualizar_resumen_cancelacion(sender, polizas, pagos, **kwargs):
+    """
+    La cancelación en bloque ajusta los pagos de comisión con bulk_update:
+    recalcula los clientes y meses de esos pagos y, como cambió el estado de
+    las pólizas, invalida la cartera.
+    """
+    clientes_por_poliza = {poliza.pk: poliza.cliente_id for poliza in polizas}
+    cliente_ids = {clientes_por_poliza[pago.poliza_id] for pago in pagos}
+    meses = {pago.fecha_pago for pago in pagos}
+
+    def recalcular():
+        try:
+            recalcular_resumen_clientes_meses(cliente_ids, meses)
+        except Exception as e:
+            logger.exception(f"Error al recalcular el resumen mensual de una cancelación en bloque: {e}")
+
+    if pagos:
+        transaction.on_commit(recalcular)
+    programar_invalidacion_cartera()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=CompaniaAseguradora)
+@receiver(post_save, sender=TipoSeguro)
+@receiver(post_save, sender=Asesor)
+def invalidar_cache_nombres(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Un nombre editado invalida los reportes que lo muestran. Los guardados
+    que no tocan el nombre (ej: last_login al iniciar sesión) no hacen nada.
+    """
+    if created or (update_fields is not None and not CAMPOS_NOMBRE[sender] & set(update_fields)):
+        return
+    programar_invalidacion_nombres()
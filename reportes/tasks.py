@@ -0,0 +1,25 @@
+import logging
+from celery import shared_task
+from dateutil.relativedelta import relativedelta
+from django.utils import timezone
+from .panel import construir_contexto_panel
+
+logger = logging.getLogger('reportes')
+
+
+@shared_task
+def precalentar_panel_reportes():
+    """
+    Tarea de Celery que se ejecuta después de medianoche y deja en caché el
+    panel de reportes del mes actual y del anterior, para que la primera
+    visita del día no tenga que calcularlo.
+    """
+    hoy = timezone.now().date()
+    meses = [hoy, hoy - relativedelta(months=1)]
+
+    for fecha in meses:
+        construir_contexto_panel(fecha.year, fecha.month, hoy)
+
+    resultado = f"Panel de reportes precalentado para {', '.join(f'{f:%m/%Y}' for f in meses)}."
+    logger.info(resultado)
+    return resultado
@@ -1,3 +1,340 @@
-from django.test import TestCase
+# reportes/tests.py
+from io import StringIO
+from decimal import Decimal
+from datetime import date
+from unittest.mock import patch
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from polizas.models import Asesor, CompaniaAseguradora, Poliza, TipoSeguro
+from .cache import obtener_o_calcular
+from .exposicion import SIN_GRUPO, calcular_exposicion, obtener_exposicion
+from .models import ResumenMensual
+from .panel import construir_contexto_panel
+from .tasks import precalentar_panel_reportes
 
-# Create your tests here.
+
+CACHE_DE_PRUEBA = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class DatosReportesMixin:
+    """Datos y helpers compartidos por los tests de reportes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user(
+            username='cliente_resumen',
+            first_name='Laura',
+            last_name='Gómez',
+            password='testpass123'
+        )
+        cls.tipo_seguro = TipoSeguro.objects.create(
+            nombre='Seguro Resumen',
+            comision_porcentaje=Decimal('10.00'),
+            porcentaje_iva=Decimal('19.00')
+        )
+        cls.compania = CompaniaAseguradora.objects.create(nombre='Compañía Resumen')
+        cls.asesor = Asesor.objects.create(nombre_completo='Asesor Resumen')
+
+    def crear_poliza(self, numero, fecha_inicio, prima='1000000.00'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Poliza.objects.create(
+                cliente=self.cliente,
+                tipo_seguro=self.tipo_seguro,
+                compania_aseguradora=self.compania,
+                asesor=self.asesor,
+                numero_poliza=numero,
+                fecha_inicio=fecha_inicio,
+                fecha_fin=fecha_inicio.replace(year=fecha_inicio.year + 1),
+                valor_prima_sin_iva=Decimal(prima),
+                modo_pago='CONTADO'
+            )
+
+
+
+@override_settings(CACHES=CACHE_DE_PRUEBA)
+class ResumenMensualTest(DatosReportesMixin, TestCase):
+    """Tests para el mantenimiento incremental del resumen mensual."""
+
+    def filas(self):
+        return sorted(ResumenMensual.objects.values_list(
+            'mes', 'polizas_nuevas', 'primas', 'iva', 'cantidad_pagos',
+            'comisiones_pendientes', 'comisiones_liquidadas'
+        ))
+
+    def test_crear_poliza_actualiza_el_resumen(self):
+        """Verifica que crear una póliza (y su pago de comisión) actualiza el resumen del mes."""
+        self.crear_poliza('POL-RES-1', date(2025, 3, 10))
+        self.crear_poliza('POL-RES-2', date(2025, 3, 20), prima='500000.00')
+
+        self.assertEqual(self.filas(), [(
+            date(2025, 3, 1), 2, Decimal('1500000.00'), Decimal('285000.00'),
+            2, Decimal('150000.00'), Decimal('0.00')
+        )])
+
+    def test_liquidar_y_mover_pago_recalcula_ambos_meses(self):
+        """Verifica que editar un pago recalcula su mes anterior y el nuevo."""
+        poliza = self.crear_poliza('POL-RES-3', date(2025, 3, 10))
+        pago = poliza.pagos.get()
+        pago.estado_comision = 'LIQUIDADA'
+        pago.fecha_pago = date(2025, 4, 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            pago.save()
+
+        marzo, abril = ResumenMensual.objects.order_by('mes')
+        self.assertEqual((marzo.polizas_nuevas, marzo.cantidad_pagos), (1, 0))
+        self.assertEqual((abril.cantidad_pagos, abril.comisiones_liquidadas), (1, Decimal('100000.00')))
+
+    def test_guardar_sin_cambios_relevantes_no_recalcula(self):
+        """Verifica que cambiar solo el estado de cartera no recalcula el resumen mensual."""
+        poliza = self.crear_poliza('POL-RES-4', date(2025, 3, 10))
+        poliza.estado_cartera = 'EN_MORA'
+        with self.captureOnCommitCallbacks() as callbacks:
+            poliza.save()
+        # Solo se invalida la caché de la salud de la cartera
+        self.assertEqual([callback.__name__ for callback in callbacks], ['invalidar_cartera'])
+
+    def test_borrar_poliza_limpia_el_resumen(self):
+        """Verifica que borrar una póliza elimina sus filas del resumen."""
+        poliza = self.crear_poliza('POL-RES-5', date(2025, 3, 10))
+        with self.captureOnCommitCallbacks(execute=True):
+            poliza.delete()
+        self.assertFalse(ResumenMensual.objects.exists())
+
+    def test_reconstruir_coincide_con_el_incremental(self):
+        """Verifica que el comando de reconstrucción produce las mismas filas."""
+        self.crear_poliza('POL-RES-6', date(2025, 3, 10))
+        self.crear_poliza('POL-RES-7', date(2025, 5, 2), prima='250000.00')
+        incremental = self.filas()
+
+        ResumenMensual.objects.all().delete()
+        call_command('reconstruir_resumen_mensual', stdout=StringIO())
+        self.assertEqual(self.filas(), incremental)
+
+    def test_panel_lee_el_resumen(self):
+        """Verifica que el panel de reportes muestra los KPIs del resumen."""
+        self.crear_poliza('POL-RES-8', date(2025, 3, 10))
+        admin = User.objects.create_user(username='admin_reportes', password='testpass123', is_staff=True)
+        self.client.force_login(admin)
+
+        response = self.client.get(reverse('reportes:panel_reportes'), {'ano': 2025, 'mes': 3})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['nuevas_polizas_mes'], 1)
+        self.assertEqual(response.context['total_ventas_con_iva'], 1190000)
+        self.assertEqual(response.context['comisiones_pendientes_mes'], 100000)
+        self.assertEqual(response.context['top_clientes'], [{'nombre': 'Laura Gómez', 'comision': 100000.0}])
+
+
+@override_settings(CACHES=CACHE_DE_PRUEBA)
+class CachePanelReportesTest(DatosReportesMixin, TestCase):
+    """Tests para la caché versionada del panel de reportes."""
+
+    def setUp(self):
+        cache.clear()
+        self.hoy = timezone.now().date()
+
+    def test_segunda_lectura_sale_de_la_cache(self):
+        """Verifica que el panel ya calculado no vuelve a consultar la base de datos."""
+        self.crear_poliza('POL-CACHE-1', date(2025, 3, 10))
+        primero = construir_contexto_panel(2025, 3, self.hoy)
+
+        with self.assertNumQueries(0):
+            segundo = construir_contexto_panel(2025, 3, self.hoy)
+        self.assertEqual(primero, segundo)
+
+    def test_cambio_en_el_mes_invalida_solo_ese_mes(self):
+        """Verifica que un cambio en un mes invalida ese mes y no los demás."""
+        self.crear_poliza('POL-CACHE-2', date(2025, 3, 10))
+        construir_contexto_panel(2025, 3, self.hoy)
+        construir_contexto_panel(2025, 1, self.hoy)
+
+        self.crear_poliza('POL-CACHE-3', date(2025, 3, 15))
+
+        self.assertEqual(construir_contexto_panel(2025, 3, self.hoy)['nuevas_polizas_mes'], 2)
+        # Enero no depende de marzo: sus métricas siguen en caché
+        with self.assertNumQueries(0):
+            construir_contexto_panel(2025, 1, self.hoy)
+
+    def test_renombrar_tipo_invalida_el_mes_cerrado(self):
+        """Verifica que renombrar un tipo de seguro no deja la etiqueta vieja en un mes cerrado."""
+        self.crear_poliza('POL-CACHE-5', date(2025, 3, 10))
+        construir_contexto_panel(2025, 3, self.hoy)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tipo_seguro.nombre = 'Seguro Renombrado'
+            self.tipo_seguro.save()
+        self.assertIn('Seguro Renombrado', construir_contexto_panel(2025, 3, self.hoy)['labels_grafico_tipos'])
+
+    def test_sin_cache_disponible_se_calcula_igual(self):
+        """Verifica que un error de la caché no impide mostrar el panel."""
+        self.crear_poliza('POL-CACHE-4', date(2025, 3, 10))
+        with patch('reportes.cache.cache.get_many', side_effect=ConnectionError('Redis caído')):
+            contexto = construir_contexto_panel(2025, 3, self.hoy)
+        self.assertEqual(contexto['nuevas_polizas_mes'], 1)
+
+    def test_precalentar_deja_el_mes_actual_en_cache(self):
+        """Verifica que la tarea de precalentado deja listo el panel del mes actual."""
+        precalentar_panel_reportes()
+        with self.assertNumQueries(0):
+            construir_contexto_panel(self.hoy.year, self.hoy.month, self.hoy)
+
+
+@override_settings(CACHES=CACHE_DE_PRUEBA)
+class ExposicionCancelacionTest(DatosReportesMixin, TestCase):
+    """Tests para el reporte de exposición por cancelación de pólizas de contado."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.otra_compania = CompaniaAseguradora.objects.create(nombre='Compañía Exposición')
+        cls.admin = User.objects.create_user(username='admin_exposicion', password='testpass123', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.fecha = date(2025, 7, 1)
+
+    def prorrateo_del_modelo(self, polizas):
+        devolucion, comision = Decimal('0'), Decimal('0')
+        for poliza in polizas:
+            poliza.fecha_cancelacion = max(self.fecha, poliza.fecha_inicio)
+            monto_cliente, monto_comision = poliza.calcular_prorrateo_cancelacion()
+            devolucion += monto_cliente
+            comision += monto_comision
+        return devolucion, comision
+
+    def test_coincide_con_el_prorrateo_del_modelo(self):
+        """Verifica que los totales por grupo son la suma del prorrateo póliza por póliza."""
+        polizas = [
+            self.crear_poliza('EXP-1', date(2025, 1, 15), prima='1234567.89'),
+            self.crear_poliza('EXP-2', date(2025, 3, 3), prima='999999.99'),
+            self.crear_poliza('EXP-3', date(2025, 9, 1), prima='500000.00'),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            polizas[1].compania_aseguradora = self.otra_compania
+            polizas[1].save()
+
+        exposicion = calcular_exposicion(self.fecha)
+        filas = {fila['nombre']: fila for fila in exposicion['filas']}
+        self.assertEqual(set(filas), {'Compañía Resumen', 'Compañía Exposición'})
+
+        esperado = self.prorrateo_del_modelo([polizas[0], polizas[2]])
+        fila = filas['Compañía Resumen']
+        self.assertEqual(fila['cantidad'], 2)
+        self.assertEqual((fila['devolucion_cliente'], fila['comision_a_devolver']), esperado)
+        # La póliza que aún no empieza se devuelve completa
+        self.assertEqual(esperado[0] - self.prorrateo_del_modelo([polizas[0]])[0], Decimal('500000.00'))
+
+        total = self.prorrateo_del_modelo(polizas)
+        self.assertEqual(exposicion['totales']['cantidad'], 3)
+        self.assertEqual(
+            (exposicion['totales']['devolucion_cliente'], exposicion['totales']['comision_a_devolver']), total
+        )
+
+    def test_solo_polizas_de_contado_activas_y_vigentes(self):
+        """Verifica que no cuentan las pólizas mensuales, canceladas o vencidas en la fecha."""
+        self.crear_poliza('EXP-VIGENTE', date(2025, 1, 1))
+        self.crear_poliza('EXP-VENCIDA', date(2024, 6, 1))
+        mensual = self.crear_poliza('EXP-MENSUAL', date(2025, 1, 1))
+        cancelada = self.crear_poliza('EXP-CANCELADA', date(2025, 1, 1))
+        Poliza.objects.filter(pk=mensual.pk).update(modo_pago='MENSUAL')
+        Poliza.objects.filter(pk=cancelada.pk).update(estado='CANCELADA')
+
+        exposicion = calcular_exposicion(self.fecha, agrupar_por='asesor')
+        self.assertEqual(exposicion['totales']['cantidad'], 1)
+        self.assertEqual(exposicion['filas'][0]['nombre'], 'Asesor Resumen')
+
+    def test_filtros_y_grupo_sin_asignar(self):
+        """Verifica los filtros por compañía y que las pólizas sin asesor se agrupan aparte."""
+        self.crear_poliza('EXP-F1', date(2025, 1, 1))
+        sin_asesor = self.crear_poliza('EXP-F2', date(2025, 2, 1))
+        Poliza.objects.filter(pk=sin_asesor.pk).update(asesor=None, compania_aseguradora=self.otra_compania)
+
+        por_asesor = calcular_exposicion(self.fecha, agrupar_por='asesor')
+        self.assertEqual({fila['nombre'] for fila in por_asesor['filas']}, {'Asesor Resumen', SIN_GRUPO})
+
+        filtrada = calcular_exposicion(self.fecha, agrupar_por='tipo', filtros={'compania': self.otra_compania.pk})
+        self.assertEqual(filtrada['totales']['cantidad'], 1)
+        self.assertEqual(filtrada['filas'][0]['nombre'], 'Seguro Resumen')
+
+    def test_cache_por_fecha_y_filtro(self):
+        """Verifica que la exposición se guarda en caché y se invalida al cambiar la cartera."""
+        self.crear_poliza('EXP-C1', date(2025, 1, 1))
+        primero = obtener_exposicion(self.fecha)
+        with self.assertNumQueries(0):
+            self.assertEqual(obtener_exposicion(self.fecha), primero)
+
+        # Otra fecha es otra entrada de la caché
+        self.assertNotEqual(obtener_exposicion(date(2025, 10, 1)), primero)
+
+        self.crear_poliza('EXP-C2', date(2025, 2, 1))
+        self.assertEqual(obtener_exposicion(self.fecha)['totales']['cantidad'], 2)
+
+        # Renombrar una compañía invalida las etiquetas de los grupos
+        with self.captureOnCommitCallbacks(execute=True):
+            self.compania.nombre = 'Compañía Renombrada'
+            self.compania.save()
+        self.assertEqual(obtener_exposicion(self.fecha)['filas'][0]['nombre'], 'Compañía Renombrada')
+
+    def test_vista_exposicion(self):
+        """Verifica que la vista muestra la exposición agrupada para el staff."""
+        self.crear_poliza('EXP-V1', date(2025, 1, 1))
+        self.client.force_login(self.admin)
+        respuesta = self.client.get(
+            reverse('reportes:exposicion_cancelacion'), {'fecha': '2025-07-01', 'agrupar_por': 'tipo'}
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['totales']['cantidad'], 1)
+        self.assertContains(respuesta, 'Seguro Resumen')
+
+        # Fecha inválida: se usa la de hoy
+        respuesta = self.client.get(reverse('reportes:exposicion_cancelacion'), {'fecha': 'ayer'})
+        self.assertEqual(respuesta.context['fecha'], timezone.localdate())
+
+
+@override_settings(CACHES=CACHE_DE_PRUEBA)
+class CacheReporteAsesorTest(DatosReportesMixin, TestCase):
+    """Tests para la caché del reporte de rendimiento por asesor."""
+
+    def setUp(self):
+        cache.clear()
+        admin = User.objects.create_user(username='admin_asesor', password='testpass123', is_staff=True)
+        self.client.force_login(admin)
+
+    def consultar(self):
+        return self.client.get(reverse('reportes:reporte_asesor'), {'asesor_id': self.asesor.pk, 'mes': 3, 'ano': 2025})
+
+    def test_la_cache_solo_guarda_columnas(self):
+        """Verifica que en la caché no quedan instancias de modelos (ni datos del usuario)."""
+        self.crear_poliza('POL-ASESOR-1', date(2025, 3, 10))
+        respuesta = self.consultar()
+
+        self.assertContains(respuesta, 'Laura Gómez')
+        fila = respuesta.context['polizas_vendidas'][0]
+        self.assertIsInstance(fila, dict)
+        self.assertNotIn('cliente__password', fila)
+        self.assertEqual(fila['comision_calculada'], Decimal('100000.00'))
+
+    def test_cambios_de_poliza_y_de_nombres_invalidan(self):
+        """Verifica que editar el número de póliza o el nombre del cliente no deja el reporte viejo."""
+        poliza = self.crear_poliza('POL-ASESOR-2', date(2025, 3, 10))
+        self.consultar()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            poliza.numero_poliza = 'POL-ASESOR-2B'
+            poliza.save()
+        self.assertContains(self.consultar(), 'POL-ASESOR-2B')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cliente.first_name = 'Lucía'
+            self.cliente.save(update_fields=['first_name'])
+        self.assertContains(self.consultar(), 'Lucía Gómez')
+
+    def test_clave_de_cache_corta(self):
+        """Verifica que la clave no crece con la cantidad de versiones de las que depende."""
+        with patch('reportes.cache.cache.set') as set_mock:
+            obtener_o_calcular('prueba', [f'2025-{mes:02d}' for mes in range(1, 13)], lambda: 1)
+        self.assertLess(len(set_mock.call_args.args[0]), 80)
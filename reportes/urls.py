@@ -1,9 +1,10 @@
 from django.urls import path
-from .views import panel_reportes_view, reporte_asesor_view
+from .views import exposicion_cancelacion_view, panel_reportes_view, reporte_asesor_view
 
 app_name = 'reportes'
 
 urlpatterns = [
     path('', panel_reportes_view, name='panel_reportes'),
     path('rendimiento-asesor/', reporte_asesor_view, name='reporte_asesor'),
-]
\ No newline at end of file
+    path('exposicion-cancelacion/', exposicion_cancelacion_view, name='exposicion_cancelacion'),
+]
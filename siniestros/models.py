@@ -1,5 +1,7 @@
 # siniestros/models.py
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from polizas.models import Poliza
 
 # --- MODELOS NUEVOS Y REESTRUCTURADOS ---
@@ -38,9 +40,15 @@ class Siniestro(models.Model):
 
     descripcion = models.TextField("Descripción del Siniestro")
     estado = models.CharField(max_length=30, choices=ESTADO_SINIESTRO_CHOICES, default='NUEVO')
+
+    # Vector de la búsqueda global (dashboard_admin/busqueda.py); se mantiene con señales
+    busqueda = SearchVectorField(null=True, editable=False)
     
     class Meta:
         ordering = ['-fecha_siniestro']
+        indexes = [
+            GinIndex(fields=['busqueda'], name='siniestro_busqueda_gin'),
+        ]
 
     def __str__(self):
         return f"Siniestro #{self.numero_siniestro} para Póliza {self.poliza.numero_poliza}"
@@ -1,5 +1,8 @@
 # usuarios/models.py
 from django.db import models
+from django.db.models.functions import Upper
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -9,10 +12,18 @@ class PerfilCliente(models.Model):
     cedula = models.CharField('Cédula/ID', max_length=20, unique=True, blank=True, null=True)
     telefono = models.CharField('Teléfono', max_length=20, blank=True, null=True)
     direccion = models.CharField('Dirección', max_length=255, blank=True)
+    # Vector de la búsqueda global con los datos del usuario y del perfil
+    # (dashboard_admin/busqueda.py); se mantiene con señales
+    busqueda = SearchVectorField(null=True, editable=False)
 
     class Meta:
         verbose_name = 'Perfil de Cliente'
         verbose_name_plural = 'Perfiles de Clientes'
+        indexes = [
+            # Autocompletar de clientes por prefijo de cédula
+            models.Index(OpClass(Upper('cedula'), name='text_pattern_ops'), name='perfil_cedula_prefijo_idx'),
+            GinIndex(fields=['busqueda'], name='perfil_busqueda_gin'),
+        ]
 
     def __str__(self):
         return self.usuario.get_full_name() or self.usuario.username